@@ -6,9 +6,17 @@ class Team(models.Model):
     team_id = models.AutoField(primary_key=True)
     team_name = models.CharField(max_length=100)
     country = models.CharField(max_length=100)
+    # team id used by Sofascore, teams are resolved by it. Countries (player nationalities)
+    # and teams stored before it was kept have none
+    sofascore_id = models.IntegerField(null=True, blank=True, unique=True)
 
     class Meta:
-        unique_together = ('team_name', 'country')  # Ensures team_name and country combination is unique
+        constraints = [
+            # team_name and country only identify the teams without a Sofascore id, two
+            # clubs can share a name and a country
+            models.UniqueConstraint(fields=['team_name', 'country'], condition=models.Q(sofascore_id__isnull=True),
+                                    name='unique_team_without_sofascore_id'),
+        ]
     
     def __str__(self):
         return self.team_name
@@ -19,15 +27,21 @@ class Player(models.Model):
     team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='players')
     country = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='players_country')
     birth_date = models.DateField()
+    sofascore_id = models.IntegerField(null=True, blank=True, unique=True)  # player id used by Sofascore
 
     class Meta:
-        unique_together = ('player_name', 'birth_date')  # Ensure player is unique
+        constraints = [
+            # players stored before the Sofascore id was kept are unique by name and birth date
+            models.UniqueConstraint(fields=['player_name', 'birth_date'], condition=models.Q(sofascore_id__isnull=True),
+                                    name='unique_player_without_sofascore_id'),
+        ]
 
     def __str__(self):
         return self.player_name
 
 class Match(models.Model):
     match_id = models.AutoField(primary_key=True)
+    sofascore_id = models.BigIntegerField(null=True, blank=True, unique=True)  # event id used by Sofascore
     date = models.DateField(db_index=True)
     # venue = models.CharField(max_length=100)
     league = models.CharField(max_length=100)
@@ -37,16 +51,17 @@ class Match(models.Model):
     # team
     homeTeam = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='home_matches')
     awayTeam = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='away_matches')
-    yellow_cards = models.IntegerField(default=0)
-    red_cards = models.IntegerField(default=0)
+    # cards and corners are null when a lean mode scrape could not get them
+    yellow_cards = models.IntegerField(default=0, null=True)
+    red_cards = models.IntegerField(default=0, null=True)
     home_shots = models.IntegerField(default=0)
     away_shots = models.IntegerField(default=0)
     home_shots_target = models.IntegerField(default=0)
     away_shots_target = models.IntegerField(default=0)
     home_fouls = models.IntegerField(default=0)
     away_fouls = models.IntegerField(default=0)
-    home_corners = models.IntegerField(default=0)
-    away_corners = models.IntegerField(default=0)
+    home_corners = models.IntegerField(default=0, null=True)
+    away_corners = models.IntegerField(default=0, null=True)
 
 
     class Meta:
@@ -70,8 +85,8 @@ class PlayerStats(models.Model):
     player = models.ForeignKey(Player, on_delete=models.CASCADE)
     goals_scored = models.IntegerField(default=0)
     assists = models.IntegerField(default=0)
-    # yellow_cards = models.IntegerField(default=0)
-    # red_cards = models.IntegerField(default=0)
+    yellow_cards = models.IntegerField(default=0)
+    red_cards = models.IntegerField(default=0)
     shots = models.IntegerField(default=0)
     shots_target = models.IntegerField(default=0)
     fouls_committed = models.IntegerField(default=0)
@@ -82,4 +97,27 @@ class PlayerStats(models.Model):
         return f"{self.match} - {self.player.player_name}"
 
     class Meta:
-        unique_together = ('match', 'player')  # Ensure each player has stats only once per match
\ No newline at end of file
+        unique_together = ('match', 'player')  # Ensure each player has stats only once per match
+
+
+class TeamSyncState(models.Model):
+    # high-water mark of a team's newest stored match, the scraper only pages the
+    # team's past matches until it reaches this match
+    source_team_id = models.IntegerField(primary_key=True)  # team id used by the scraped website
+    last_event_id = models.BigIntegerField()                # event id used by the scraped website
+    last_start_timestamp = models.BigIntegerField()
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source_team_id} - {self.last_event_id}"
+
+
+class BackfillDate(models.Model):
+    # a past date whose finished matches were all scraped by the backfill, the backfill
+    # skips it on later runs
+    date = models.DateField(primary_key=True)
+    matches = models.IntegerField(default=0)    # matches stored for the date
+    completed = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.date} - {self.matches}"
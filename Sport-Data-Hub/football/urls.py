@@ -5,6 +5,7 @@ from . import views # This is the views file
 # This is the list of our routes
 urlpatterns = [
     path('returnScheduledMatches/<int:day>', views.returnScheduledMatches, name='returnScheduledMatches'),
-    path('returnTeamPastMatches/', views.getTeamPastMatches, name='teamPastMatches')
+    path('returnTeamPastMatches/', views.getTeamPastMatches, name='teamPastMatches'),
+    path('metrics', views.scraperMetrics, name='scraperMetrics')
 ]
 
@@ -7,7 +7,7 @@ from .serializers import TeamSerializer, PlayerSerializer, MatchSerializer, Play
 from django.shortcuts import get_object_or_404
 from django.db.models import Q  # Import Q object for complex queries
 from tool.DBHelper import DBHelper
-from tool.getScheduledMatchData import getScheduledMatchStat
+from tool.getScheduledMatchData import getScheduledMatchStat, scraper
 from datetime import datetime, timedelta
 
 import logging
@@ -72,3 +72,11 @@ def getScheduledMatches(day):
 
     
         return SCHEDULEDMATCHES[day]
+
+
+def getScraperMetrics():
+    """
+    Returns:
+        - the request metrics of the scraper in the Prometheus text format
+    """
+    return scraper.metrics.prometheus()
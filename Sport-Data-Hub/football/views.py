@@ -1,10 +1,10 @@
 from django.shortcuts import render
-from .utils import getTeamPastMatchesFromDB, getScheduledMatches
+from .utils import getTeamPastMatchesFromDB, getScheduledMatches, getScraperMetrics
 from rest_framework.decorators import api_view
 from django.shortcuts import get_object_or_404
 from rest_framework import status
 from rest_framework.response import Response
-from django.http import JsonResponse
+from django.http import JsonResponse, HttpResponse
 
 # Create your views here.
 
@@ -31,3 +31,8 @@ def getTeamPastMatches(request):
         return JsonResponse({"error": "Missing parameters"}, status=400)
 
     return Response(getTeamPastMatchesFromDB(team_name, country))
+
+
+def scraperMetrics(request):
+    # plain view, Prometheus scrapes text and not a rest framework response
+    return HttpResponse(getScraperMetrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,42 @@
+from datetime import date, datetime
+
+from tool.identity_cache import IdentityCache
+
+
+def test_least_recently_used_key_is_evicted():
+    cache = IdentityCache("teams", 2)
+    cache.update({1: 10, 2: 20})
+    cache.getMany([1])              # 2 becomes the least recently used
+    cache.update({3: 30})
+
+    found, missing = cache.getMany([1, 2, 3])
+    assert found == {1: 10, 3: 30}
+    assert missing == [2]
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] == 1
+
+
+def test_hits_and_misses_are_counted():
+    cache = IdentityCache("players", 10)
+    cache.update({1: 10})
+    cache.getMany([1, 2, 3])
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit rate"]) == (1, 2, 0.333)
+
+
+def test_warm_keeps_the_first_rows_most_recent():
+    cache = IdentityCache("teams", 2)
+    assert cache.warm([(1, 10), (2, 20), (3, 30)]) == 2
+    cache.update({4: 40})           # evicts 2, the later of the warmed rows
+
+    found, missing = cache.getMany([1, 2, 4])
+    assert found == {1: 10, 4: 40}
+    assert missing == [2]
+    assert cache.stats()["misses"] == 1    # warming is not counted
+
+
+def test_birth_dates_match_db_dates():
+    cache = IdentityCache("players", 10)
+    cache.warm([(("name", date(2000, 1, 2)), 7)])
+    key = ("name", datetime(2000, 1, 2))
+    assert cache.getMany([key]) == ({key: 7}, [])
@@ -0,0 +1,100 @@
+import logging
+import time
+
+from tool import job_queue
+from tool.job_queue import JobQueue
+
+RUN = "run"
+
+
+def makeQueue(tmp_path, lease=60, maxAttempts=2, worker="host:1"):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), logging.getLogger(__name__), lease, maxAttempts, worker)
+
+
+def test_claim_completes_and_stores_results(tmp_path):
+    queue = makeQueue(tmp_path)
+    queue.enqueue(RUN, job_queue.TEAM_PAGE, [(1, {"team": "a"}), (2, {"team": "b"})])
+    queue.enqueue(RUN, job_queue.TEAM_PAGE, [(1, {"team": "changed"})])     # already queued, kept
+
+    jobs = queue.claim(RUN, job_queue.TEAM_PAGE, 10)
+    assert [(job.key, job.payload, job.attempts) for job in jobs] == [("1", {"team": "a"}, 1), ("2", {"team": "b"}, 1)]
+    assert queue.claim(RUN, job_queue.TEAM_PAGE, 10) == []      # leased
+
+    queue.complete(jobs[0], [{"id": 10}])
+    queue.complete(jobs[1], b"raw")
+    results = queue.results(RUN, job_queue.TEAM_PAGE, decode=False)
+    assert results == {"1": b'[{"id": 10}]', "2": b"raw"}
+    assert queue.done(RUN, job_queue.TEAM_PAGE) == {"1", "2"}
+
+
+def test_results_are_decoded_from_json(tmp_path):
+    queue = makeQueue(tmp_path)
+    queue.enqueue(RUN, job_queue.TEAM_PAGE, [(1, None), (2, None)])
+    first, second = queue.claim(RUN, job_queue.TEAM_PAGE, 10)
+    queue.complete(first, [{"id": 10}])
+    queue.complete(second)
+    assert queue.results(RUN, job_queue.TEAM_PAGE) == {"1": [{"id": 10}], "2": None}
+
+
+def test_failed_job_is_retried_then_marked_failed(tmp_path):
+    queue = makeQueue(tmp_path, maxAttempts=2)
+    queue.enqueue(RUN, job_queue.EVENT_STATS, [(1, None)])
+
+    job, = queue.claim(RUN, job_queue.EVENT_STATS, 10)
+    queue.fail(job, "timeout")
+    assert queue.counts(RUN) == {job_queue.PENDING: 1}
+
+    job, = queue.claim(RUN, job_queue.EVENT_STATS, 10)
+    assert job.attempts == 2
+    queue.fail(job, "timeout")
+    assert queue.counts(RUN) == {job_queue.FAILED: 1}
+    assert queue.claim(RUN, job_queue.EVENT_STATS, 10) == []
+
+
+def test_expired_lease_is_claimable_by_another_worker(tmp_path):
+    first = makeQueue(tmp_path, lease=0.05, worker="host:1")
+    second = makeQueue(tmp_path, lease=0.05, worker="host:2")
+    first.enqueue(RUN, job_queue.EVENT_LINEUP, [(1, None)])
+
+    assert len(first.claim(RUN, job_queue.EVENT_LINEUP, 10)) == 1
+    assert second.claim(RUN, job_queue.EVENT_LINEUP, 10) == []
+    time.sleep(0.1)
+    job, = second.claim(RUN, job_queue.EVENT_LINEUP, 10)
+    assert job.attempts == 2
+
+
+def test_shards_split_the_keys(tmp_path):
+    queue = makeQueue(tmp_path)
+    queue.enqueue(RUN, job_queue.EVENT_STATS, [(key, None) for key in range(6)])
+    even = queue.claim(RUN, job_queue.EVENT_STATS, 10, shard=(0, 2))
+    odd = queue.claim(RUN, job_queue.EVENT_STATS, 10, shard=(1, 2))
+    assert [job.key for job in even] == ["0", "2", "4"]
+    assert [job.key for job in odd] == ["1", "3", "5"]
+
+
+def test_interrupted_run_is_resumed(tmp_path):
+    queue = makeQueue(tmp_path)
+    assert not queue.begin(RUN)
+    queue.enqueue(RUN, job_queue.TEAM_PAGE, [(1, None), (2, None)])
+    first, _ = queue.claim(RUN, job_queue.TEAM_PAGE, 10)
+    queue.complete(first, [])
+    queue.close()
+
+    # same worker restarted: its running job is released and the done one kept
+    queue = makeQueue(tmp_path)
+    assert queue.begin(RUN)
+    assert queue.counts(RUN) == {job_queue.DONE: 1, job_queue.PENDING: 1}
+    job, = queue.claim(RUN, job_queue.TEAM_PAGE, 10)
+    assert job.key == "2"
+    queue.complete(job, [])
+
+    # a finished run starts afresh
+    assert not queue.begin(RUN)
+    assert queue.counts(RUN) == {}
+
+
+def test_restart_clears_unfinished_run(tmp_path):
+    queue = makeQueue(tmp_path)
+    queue.enqueue(RUN, job_queue.TEAM_PAGE, [(1, None)])
+    assert not queue.begin(RUN, restart=True)
+    assert queue.counts(RUN) == {}
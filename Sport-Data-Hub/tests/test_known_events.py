@@ -0,0 +1,23 @@
+from tool.known_events import BloomFilter
+
+
+def test_added_ids_are_always_members():
+    bloom = BloomFilter(1000, 0.01)
+    ids = range(12000000, 12001000)
+    for id in ids:
+        bloom.add(id)
+    assert all(id in bloom for id in ids)
+    assert bloom.count == 1000
+
+
+def test_false_positive_rate_at_capacity():
+    bloom = BloomFilter(1000, 0.01)
+    for id in range(12000000, 12001000):
+        bloom.add(id)
+    falsePositives = sum(id in bloom for id in range(13000000, 13010000))
+    assert falsePositives < 300     # about 1% of 10000 expected
+
+
+def test_empty_filter_holds_nothing():
+    bloom = BloomFilter(100, 0.01)
+    assert not any(id in bloom for id in range(1000))
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+
+from tool.rate_limiter import AdaptiveRateLimiter
+
+
+def makeLimiter(concurrency=2, cooldown=0.05):
+    return AdaptiveRateLimiter(rate=1000, burst=1000, minRate=1, maxRate=1000, rateIncrease=1,
+                               concurrency=concurrency, minConcurrency=1, maxConcurrency=5,
+                               decreaseFactor=0.5, backoffStatuses={429}, cooldown=cooldown)
+
+
+def test_acquire_waits_for_a_free_slot():
+    limiter = makeLimiter(concurrency=1)
+    order = []
+
+    async def request(name):
+        await limiter.acquire()
+        order.append(f"{name} start")
+        await asyncio.sleep(0.02)
+        order.append(f"{name} end")
+        await limiter.release(200)
+
+    async def main():
+        await asyncio.gather(request("a"), request("b"))
+
+    asyncio.run(main())
+    assert order == ["a start", "a end", "b start", "b end"]
+    assert limiter.inFlight == 0
+
+
+def test_healthy_window_increases_concurrency():
+    limiter = makeLimiter(concurrency=2)
+
+    async def main():
+        for _ in range(2):
+            await limiter.acquire()
+            await limiter.release(200)
+
+    asyncio.run(main())
+    assert limiter.concurrency == 3
+    assert limiter.increases == 1
+
+
+def test_backoff_decreases_once_per_cooldown_and_pauses():
+    limiter = makeLimiter(concurrency=4, cooldown=0.05)
+
+    async def main():
+        await limiter.acquire()
+        await limiter.acquire()
+        await limiter.release(429)
+        await limiter.release(503)     # was in flight during the same burst, not counted again
+        start = time.monotonic()
+        await limiter.acquire()
+        waited = time.monotonic() - start
+        await limiter.release(200)
+        return waited
+
+    waited = asyncio.run(main())
+    assert limiter.concurrency == 2
+    assert limiter.bucket.rate == 500
+    assert limiter.backoffs == 1
+    assert waited >= 0.04
+
+
+def test_failed_request_counts_as_backoff():
+    limiter = makeLimiter(concurrency=4)
+
+    async def main():
+        await limiter.acquire()
+        await limiter.release(None)
+
+    asyncio.run(main())
+    assert limiter.backoffs == 1
+
+
+def test_shared_across_threads_with_their_own_loops():
+    limiter = makeLimiter(concurrency=3)
+    peak = []
+    errors = []
+
+    async def request():
+        await limiter.acquire()
+        peak.append(limiter.inFlight)
+        await asyncio.sleep(0.001)
+        await limiter.release(200)
+
+    async def many():
+        await asyncio.gather(*(request() for _ in range(30)))
+
+    def run():
+        try:
+            asyncio.run(asyncio.wait_for(many(), 10))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert limiter.inFlight == 0
+    assert max(peak) <= limiter.maxConcurrency
+
+
+def test_cancelled_acquire_gives_back_its_slot():
+    limiter = makeLimiter(concurrency=2)
+    limiter.pausedUntil = time.monotonic() + 60
+
+    async def main():
+        tasks = [asyncio.ensure_future(limiter.acquire()) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert limiter.inFlight == 2
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(main())
+    assert limiter.inFlight == 0
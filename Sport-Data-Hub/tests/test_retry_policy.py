@@ -0,0 +1,81 @@
+import time
+
+from tool.retry_policy import RetryPolicy, CircuitBreaker
+
+
+def makePolicy():
+    return RetryPolicy({"error": 2, "429": 3, "5xx": 1}, baseDelay=0.5, maxDelay=2, timeout=10)
+
+
+def test_status_class():
+    policy = makePolicy()
+    assert policy.statusClass(None) == "error"
+    assert policy.statusClass(429) == "429"
+    assert policy.statusClass(503) == "5xx"
+    assert policy.statusClass(404) == "4xx"
+
+
+def test_should_retry_follows_the_rules():
+    policy = makePolicy()
+    assert not policy.shouldRetry(200, 0)
+    assert policy.shouldRetry(None, 1)
+    assert not policy.shouldRetry(None, 2)
+    assert policy.shouldRetry(429, 2)
+    assert not policy.shouldRetry(429, 3)
+    assert policy.shouldRetry(500, 0)
+    assert not policy.shouldRetry(500, 1)
+    assert not policy.shouldRetry(404, 0)   # no rule, never retried
+
+
+def test_delay_is_bounded_and_counted():
+    policy = makePolicy()
+    for attempt in range(6):
+        assert 0 <= policy.delay(503, attempt) <= 2
+    assert policy.delay(429, 0, retryAfter=5) == 5
+    assert policy.stats() == {"5xx": 6, "429": 1}
+
+
+def test_breaker_opens_after_threshold_failures():
+    breaker = CircuitBreaker(threshold=3, openSeconds=60)
+    assert not breaker.record("host", True)
+    assert not breaker.record("host", True)
+    assert breaker.record("host", True)
+    assert breaker.remaining("host") > 0
+    assert breaker.stats() == {"trips": 1, "open_hosts": ["host"]}
+    assert breaker.remaining("other") == 0
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker(threshold=2, openSeconds=60)
+    breaker.record("host", True)
+    breaker.record("host", False)
+    assert not breaker.record("host", True)
+    assert breaker.remaining("host") == 0
+
+
+def test_failures_while_open_are_not_counted():
+    breaker = CircuitBreaker(threshold=1, openSeconds=60)
+    assert breaker.record("host", True)
+    assert not breaker.record("host", True)
+    assert breaker.trips == 1
+
+
+def test_failed_probe_reopens_the_circuit():
+    breaker = CircuitBreaker(threshold=3, openSeconds=0.01)
+    for _ in range(3):
+        breaker.record("host", True)
+    time.sleep(0.02)
+    assert breaker.remaining("host") == 0
+    # half open: a single failure of the probe is enough
+    assert breaker.record("host", True)
+    assert breaker.trips == 2
+
+
+def test_successful_probe_closes_the_circuit():
+    breaker = CircuitBreaker(threshold=2, openSeconds=0.01)
+    breaker.record("host", True)
+    breaker.record("host", True)
+    time.sleep(0.02)
+    breaker.record("host", False)
+    assert not breaker.record("host", True)
+    assert breaker.stats()["open_hosts"] == []
@@ -0,0 +1,193 @@
+"""
+Backfill the finished matches of past dates (or of whole seasons) into the db.
+
+Usage (from the Sport-Data-Hub directory):
+    python -m tool.backfill 2023-08-11 2024-05-19 [--dates 4] [--force]
+    python -m tool.backfill --season 17:52186 [--season 17:41886]
+"""
+import argparse
+import asyncio
+import time
+from datetime import date as Date, timedelta
+from requests_html import AsyncHTMLSession
+from tool import scrape_config
+from tool import getScheduledMatchData as gsmd
+from tool.single_flight import SingleFlight
+from tool.player_stats_batch import PlayerStatsBatch
+
+
+class DateScraped():
+    """
+    Put on the writer's queue once every match of a date was put on it
+    """
+    __slots__ = ("date", "listed", "known", "fetched")
+
+    def __init__(self, date, listed, known, fetched) -> None:
+        self.date       = date
+        self.listed     = listed    # matches of the date, None when they could not be listed
+        self.known      = known     # matches already stored by an earlier run, not fetched
+        self.fetched    = fetched   # matches put on the queue
+
+
+class Backfill():
+    """
+    Scrape a range of past dates into the db. A few dates are scraped at once, every
+    request going through the scraper's shared rate limiter, and their matches are
+    streamed to a single writer as they complete. The writer stores them in batches and
+    marks a date backfilled once all of its matches are written, so a later run skips it.
+    A date with a match that failed to fetch or to store is left unmarked for the next run.
+    """
+    def __init__(self, scraper, concurrentDates:int, writeBatch:int) -> None:
+        """
+        Parameters:
+            - scraper: Scraper class obj used to scrape data
+            - concurrentDates: dates scraped at once
+            - writeBatch: matches written to the db together
+        """
+        self.scraper            = scraper
+        self.concurrentDates    = concurrentDates
+        self.writeBatch         = writeBatch
+
+        self.started        = None
+        self.stored         = 0     # matches written
+        self.completed      = []    # dates marked backfilled
+        self.failed         = []    # dates whose matches could not be listed
+        self.incomplete     = []    # dates with matches that failed to fetch or to store
+        self.storeFailures  = {}    # date -> matches that failed to store
+
+    def matchesPerMinute(self):
+        return self.stored / max(time.monotonic() - self.started, 1e-9) * 60
+
+    async def scrapeDate(self, asession, date, slots, queue):
+        """
+        Put (date, MatchStats) on queue for the matches of a date as they complete, then
+        a DateScraped of the date
+        """
+        async with slots:
+            listed = None
+            known = fetched = 0
+            try:
+                pastMatchInfo = await self.scraper.getPastDateMatches(asession, date.isoformat())
+                listed = len({matchInfo["id"] for matchInfo in pastMatchInfo})
+                # the known events filter leaves out the matches stored by an earlier run
+                pastMatchInfo = await self.scraper.skipKnownEvents(pastMatchInfo)
+                known = listed - len({matchInfo["id"] for matchInfo in pastMatchInfo})
+                async for matchStats in self.scraper.iterMatchCompleteStat(pastMatchInfo, asession, SingleFlight(), PlayerStatsBatch(), skipKnown=False):
+                    await queue.put((date, matchStats))
+                    fetched += 1
+            except Exception as e:
+                gsmd.logger.error(f"failed to backfill {date}: {repr(e)}")
+                listed = None
+            await queue.put(DateScraped(date, listed, known, fetched))
+
+    def store(self, pastMatchesStats):
+        # same steps as getScheduledMatchStat, only ever run by the writer
+        gsmd.checkInDb(pastMatchesStats, "player")
+        gsmd.checkInDb(pastMatchesStats)
+        return gsmd.addDataToDB(pastMatchesStats)
+
+    async def write(self, queue):
+        """
+        Store the matches put on queue until it gets None
+        """
+        pending = []
+        while True:
+            item = await queue.get()
+            if isinstance(item, tuple):
+                pending.append(item)
+                if len(pending) < self.writeBatch:
+                    continue
+
+            if pending:
+                written = await asyncio.to_thread(self.store, [matchStats for _, matchStats in pending])
+                for date, matchStats in pending:
+                    if matchStats.event_id in written:
+                        self.stored += 1
+                    else:
+                        self.storeFailures[date] = self.storeFailures.get(date, 0) + 1
+                pending = []
+
+            if item is None:
+                return
+
+            if isinstance(item, DateScraped):
+                # the date's matches were put before it, so they are all stored by now
+                date = item.date
+                if item.listed is None:
+                    self.failed.append(date)
+                    continue
+
+                failures = item.listed - item.known - item.fetched + self.storeFailures.pop(date, 0)
+                if failures:
+                    self.incomplete.append(date)
+                    gsmd.logger.error(f"{failures} of {item.listed} matches of {date} failed, not marked backfilled")
+                    print(f"{date}: {failures} of {item.listed} matches failed, {self.stored} stored, not marked backfilled")
+                    continue
+                await asyncio.to_thread(gsmd.dbHelper.markDateBackfilled, date, item.listed)
+                self.completed.append(date)
+                print(f"{date}: {item.listed} matches, {self.stored} stored, {self.matchesPerMinute():.1f} matches/min")
+
+    async def run(self, dates):
+        """
+        Parameters:
+            - dates: list of datetime.date to backfill
+        """
+        self.started = time.monotonic()
+        asession = AsyncHTMLSession()
+        slots = asyncio.Semaphore(self.concurrentDates)
+        queue = asyncio.Queue(maxsize=4 * self.writeBatch)
+
+        writer = asyncio.ensure_future(self.write(queue))
+        await asyncio.gather(*[self.scrapeDate(asession, date, slots, queue) for date in dates])
+        await queue.put(None)
+        await writer
+        await asession.close()
+
+        print(f"backfilled {len(self.completed)} dates, {self.stored} matches in {(time.monotonic() - self.started) / 60:.1f} min, "
+              f"{self.matchesPerMinute():.1f} matches/min")
+        print(f"identity caches: {gsmd.identityCacheStats()}")
+        if self.failed:
+            print(f"failed dates (rerun to retry): {', '.join(str(date) for date in sorted(self.failed))}")
+        if self.incomplete:
+            print(f"dates with failed matches (rerun to retry): {', '.join(str(date) for date in sorted(self.incomplete))}")
+
+
+def dateRange(first, last):
+    """
+    Returns:
+        - list of the dates from first to last included, stopping before today as only
+        finished matches are backfilled
+    """
+    last = min(last, Date.today() - timedelta(days=1))
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="backfill finished matches of past dates or seasons into the db")
+    parser.add_argument("first", nargs="?", type=Date.fromisoformat, help="first date, YYYY-MM-DD")
+    parser.add_argument("last", nargs="?", type=Date.fromisoformat, help="last date included, default first")
+    parser.add_argument("--dates", type=int, default=scrape_config.BACKFILL_CONCURRENT_DATES, help="dates scraped at once")
+    parser.add_argument("--force", action="store_true", help="scrape dates already backfilled again")
+    parser.add_argument("--season", action="append", default=[], metavar="TOURNAMENT:SEASON",
+                        help="backfill a whole season of a unique tournament instead, repeatable")
+    args = parser.parse_args()
+
+    if args.season:
+        gsmd.getSeasonMatchStat([tuple(int(part) for part in season.split(":")) for season in args.season])
+        return
+    if args.first is None:
+        parser.error("a date range or --season is required")
+
+    dates = dateRange(args.first, args.last or args.first)
+    if not args.force:
+        done = gsmd.dbHelper.getBackfilledDates(dates)
+        if done:
+            print(f"skipping {len(done)} dates already backfilled")
+        dates = [date for date in dates if date not in done]
+
+    asyncio.run(Backfill(gsmd.scraper, args.dates, scrape_config.BACKFILL_WRITE_BATCH).run(dates))
+    gsmd.scraper.closeSession()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Compare the rows/sec of DBHelper.insert_stat_data (a session and commits per match)
+against DBHelper.insert_stat_data_bulk (multi-row INSERT, a commit per batch) on
+synthetic matches. The benchmark teams, players and matches are written to the
+configured db under the "benchmark" league/country and deleted afterwards.
+
+Usage (from the Sport-Data-Hub directory):
+    python -m tool.benchmark_db_writes [--matches 200] [--players 30] [--batch 200]
+"""
+import argparse
+import logging
+import random
+import time
+from datetime import datetime
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from tool import DBHelper
+from tool.match_stats import MatchStats, FULLTIME
+from tool.player_stats_batch import PlayerStatsBatch, PLAYER_STAT_FIELDS
+
+BENCHMARK = "benchmark"
+TEAMS = 20
+
+
+def createEntities(dbHelper, players):
+    """
+    Returns:
+        - (teamToIDDict, playerToIDDict) of the benchmark teams and of players per team, keyed
+        by the synthetic Sofascore ids of syntheticMatches
+    """
+    teamToIDDict = {}
+    playerToIDDict = {}
+    for team in range(TEAMS):
+        teamName = f"{BENCHMARK} team {team}"
+        teamToIDDict[team] = dbHelper.insert_team((teamName, BENCHMARK))
+    countryID = dbHelper.insert_team((BENCHMARK, BENCHMARK))
+
+    for team in range(TEAMS):
+        for player in range(players):
+            name = f"{BENCHMARK} player {team} {player}"
+            birthDate = datetime(1990, 1, 1 + player % 28)
+            playerToIDDict[team * players + player] = dbHelper.insert_player((name, teamToIDDict[team], countryID, birthDate))
+    return teamToIDDict, playerToIDDict
+
+
+def syntheticMatches(league, matches, players, firstEventID=0):
+    """
+    Returns:
+        - list of MatchStats between the benchmark teams, each with the players of both teams
+    """
+    batch = PlayerStatsBatch()
+    matchesStats = []
+    for i in range(matches):
+        home, away = random.sample(range(TEAMS), 2)
+        matchInfo = {"customId": BENCHMARK, "id": firstEventID + i, "slug": league, "home": f"{BENCHMARK} team {home}",
+                     "away": f"{BENCHMARK} team {away}", "home_country": BENCHMARK, "away_country": BENCHMARK,
+                     # one match per day so (date, league, home, away) stays unique
+                     "startTimestamp": 946684800 + i * 86400, "league": league, "home_id": home, "away_id": away}
+        matchStats = MatchStats(matchInfo)
+        matchStats.newRow(FULLTIME)
+        matchStats.player_stats = batch.addMatch(matchStats.matchID, [
+            (side, team * players + player, f"{BENCHMARK} player {team} {player}", BENCHMARK,
+             int((datetime(1990, 1, 1 + player % 28) - datetime(1970, 1, 1)).total_seconds()), player < 11,
+             {field: random.randint(0, 3) for field in PLAYER_STAT_FIELDS})
+            for side, team in (("home", home), ("away", away))
+            for player in range(players)
+        ])
+        matchesStats.append(matchStats)
+    return matchesStats
+
+
+def cleanUp(dbHelper):
+    session = Session(dbHelper.engine)
+    matches = select(dbHelper.Match.match_id).where(dbHelper.Match.league.like(f"{BENCHMARK}%"))
+    session.execute(delete(dbHelper.PlayerStats).where(dbHelper.PlayerStats.match_id.in_(matches)))
+    session.execute(delete(dbHelper.Match).where(dbHelper.Match.league.like(f"{BENCHMARK}%")))
+    session.execute(delete(dbHelper.Player).where(dbHelper.Player.player_name.like(f"{BENCHMARK} player %")))
+    session.execute(delete(dbHelper.Team).where(dbHelper.Team.country == BENCHMARK))
+    session.commit()
+    session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark per match against bulk match and player stats inserts")
+    parser.add_argument("--matches", type=int, default=200, help="matches written by each path")
+    parser.add_argument("--players", type=int, default=30, help="players per team, each match has both teams'")
+    parser.add_argument("--batch", type=int, default=200, help="matches per bulk transaction")
+    args = parser.parse_args()
+
+    dbHelper = DBHelper.DBHelper(logging.getLogger(__name__))
+    cleanUp(dbHelper)
+    try:
+        teamToIDDict, playerToIDDict = createEntities(dbHelper, args.players)
+        rows = args.matches * (1 + 2 * args.players)   # a match row and its player stats rows
+
+        print(f"{'path':<10}{'matches':>9}{'rows':>9}{'seconds':>9}{'rows/s':>10}")
+        for i, path in enumerate(("per match", "bulk")):
+            # negative event ids never clash with the stored Sofascore events
+            matchesStats = syntheticMatches(f"{BENCHMARK} {path}", args.matches, args.players, -(i + 1) * args.matches)
+            start = time.perf_counter()
+            if path == "bulk":
+                dbHelper.insert_stat_data_bulk(matchesStats, teamToIDDict, playerToIDDict, args.batch)
+            else:
+                for matchStats in matchesStats:
+                    dbHelper.insert_stat_data(matchStats, teamToIDDict, playerToIDDict)
+            elapsed = time.perf_counter() - start
+            print(f"{path:<10}{args.matches:>9}{rows:>9}{elapsed:>9.2f}{rows / elapsed:>10.0f}")
+    finally:
+        cleanUp(dbHelper)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Compare the typed payload decoding against the plain json dict path on the
+responses of a recorded cassette (see tool.benchmark_scrape).
+
+Usage (from the Sport-Data-Hub directory):
+    python -m tool.benchmark_decode matchday.jsonl.gz [--repeat 20]
+"""
+import argparse
+import base64
+import json
+import logging
+import re
+import time
+import tracemalloc
+from tool import payloads
+from tool.cassette import Cassette, REPLAY
+
+# endpoint family -> (url regex, typed decoder)
+FAMILIES = {
+    "events pages": (re.compile(r"(scheduled-events/[\d-]+(/inverse)?|events/last/\d+)$"), payloads.decodeEventsPage),
+    "event lineups": (re.compile(r"event/\d+/lineups$"), payloads.decodeLineups),
+    "event statistics": (re.compile(r"event/\d+/statistics$"), payloads.decodeEventStatistics),
+}
+
+
+def measure(decode, bodies, repeat):
+    """
+    Returns:
+        - (cpu seconds per payload, bytes retained per payload) of decoding every body
+    """
+    start = time.process_time()
+    for _ in range(repeat):
+        for body in bodies:
+            decode(body)
+    cpu = (time.process_time() - start) / (repeat * len(bodies))
+
+    # memory held by the decoded objects, as they would be while a run is in progress
+    tracemalloc.start()
+    decoded = [decode(body) for body in bodies]
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del decoded
+
+    return cpu, retained / len(bodies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark typed payload decoding against json dicts")
+    parser.add_argument("cassette", help="recorded archive, eg matchday.jsonl.gz")
+    parser.add_argument("--repeat", type=int, default=20, help="decode passes over the payloads")
+    args = parser.parse_args()
+
+    cassette = Cassette(args.cassette, REPLAY, logging.getLogger(__name__))
+
+    print(f"{'family':<18}{'payloads':>9}{'dict us':>10}{'typed us':>10}{'dict KB':>10}{'typed KB':>10}")
+    for family, (pattern, decode) in FAMILIES.items():
+        bodies = [
+            base64.b64decode(entry["body"])
+            for url, entries in cassette.entries.items() if pattern.search(url)
+            for entry in entries if entry["status"] == 200
+        ]
+        if not bodies:
+            continue
+
+        dictCPU, dictMemory = measure(json.loads, bodies, args.repeat)
+        typedCPU, typedMemory = measure(decode, bodies, args.repeat)
+        print(f"{family:<18}{len(bodies):>9}{dictCPU * 1e6:>10.1f}{typedCPU * 1e6:>10.1f}{dictMemory / 1024:>10.1f}{typedMemory / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Record a scheduled matchday once, then replay it offline through the full
+scrape -> checkInDb -> addDataToDB path to measure the pipeline.
+
+Usage (from the Sport-Data-Hub directory):
+    python -m tool.benchmark_scrape record matchday.jsonl.gz --day 1
+    python -m tool.benchmark_scrape replay matchday.jsonl.gz [--simulate-latency]
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from tool import getScheduledMatchData as gsmd
+from tool.cassette import Cassette, RECORD, REPLAY
+
+
+def scrapeEverything():
+    """
+    Turn off the team watermarks and the known events filter. Both skip what the db already
+    holds, and the recording run stores the matchday, so a replay would otherwise stop
+    every team at its watermark and scrape close to nothing. The replayed matches are then
+    written again and reported as already in the db by addDataToDB
+    """
+    gsmd.scrape_config.TEAM_WATERMARKS = False
+    gsmd.scraper.knownEvents = None
+
+
+class StageTimer():
+    """
+    Collect wall-clock time and peak traced memory of each benchmark stage
+    """
+    def __init__(self) -> None:
+        self.stages = []
+
+    def run(self, name, function, *args):
+        tracemalloc.reset_peak()
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        self.stages.append((name, elapsed, peak))
+        return result
+
+    def report(self):
+        print(f"{'stage':<28}{'seconds':>10}{'peak MB':>10}")
+        for name, elapsed, peak in self.stages:
+            print(f"{name:<28}{elapsed:>10.3f}{peak / 2**20:>10.1f}")
+        print(f"{'total':<28}{sum(stage[1] for stage in self.stages):>10.3f}{max(stage[2] for stage in self.stages) / 2**20:>10.1f}")
+
+
+def record(path, day):
+    """
+    Run a normal scheduled match scrape and capture every response into path
+    """
+    # record the same requests the replay makes
+    scrapeEverything()
+    cassette = Cassette(path, RECORD, gsmd.logger)
+    gsmd.scraper.useCassette(cassette)
+    gsmd.getScheduledMatchStat(day)
+    gsmd.scraper.useCassette(None)
+
+    date = (datetime.now() + timedelta(days=day)).date().isoformat()
+    cassette.save({"date": date, "recorded_at": datetime.now().isoformat()})
+    print(f"recorded {cassette.stats()['recorded']} responses for {date} into {path}")
+
+
+def replay(path, simulateLatency=False):
+    """
+    Replay a recorded matchday through each stage of getScheduledMatchStat and report
+    per stage timings, requests issued and peak memory
+    """
+    scrapeEverything()
+    cassette = Cassette(path, REPLAY, gsmd.logger, simulateLatency=simulateLatency)
+    gsmd.scraper.useCassette(cassette)
+
+    # the schedule url contains the date, so replay with the offset of the recorded date
+    day = (datetime.fromisoformat(cassette.meta["date"]).date() - datetime.now().date()).days
+
+    timer = StageTimer()
+    tracemalloc.start()
+
+    matchesInfos = timer.run("schedule fetch", gsmd.scraper.getScheduledMatch, day)
+    timer.run("team checkInDb", gsmd.checkInDb, matchesInfos)
+    pastMatchesStats, _ = timer.run("scrape past matches", lambda: asyncio.run(gsmd.scrapeScheduledMatchStat(gsmd.scraper, matchesInfos)))
+    timer.run("player checkInDb", gsmd.checkInDb, pastMatchesStats, "player")
+    timer.run("opponent checkInDb", gsmd.checkInDb, pastMatchesStats)
+    timer.run("addDataToDB", gsmd.addDataToDB, pastMatchesStats)
+    lineups = timer.run("scheduled lineups", lambda: asyncio.run(gsmd.getScheduledLineup(matchesInfos)))
+
+    tracemalloc.stop()
+    gsmd.scraper.useCassette(None)
+
+    timer.report()
+    print(f"scheduled matches: {len(matchesInfos)}, past matches: {len(pastMatchesStats)}, lineups: {len(lineups)}")
+    print(f"requests: {cassette.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="record or replay a scheduled matchday scrape")
+    parser.add_argument("mode", choices=[RECORD, REPLAY])
+    parser.add_argument("cassette", help="archive file, eg matchday.jsonl.gz")
+    parser.add_argument("--day", type=int, default=0, help="day offset to record, see getScheduledMatchStat")
+    parser.add_argument("--simulate-latency", action="store_true", help="sleep the recorded latency of each response")
+    args = parser.parse_args()
+
+    if args.mode == RECORD:
+        record(args.cassette, args.day)
+    else:
+        replay(args.cassette, args.simulate_latency)
+
+
+if __name__ == "__main__":
+    main()
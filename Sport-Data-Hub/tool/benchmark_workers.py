@@ -0,0 +1,178 @@
+"""
+Measure how a job queue scrape run scales with the number of worker processes against a
+local fake upstream that answers every request after a fixed latency. Every worker has a
+fixed concurrency and all of them share one file-backed global request budget.
+
+Usage (from the Sport-Data-Hub directory):
+    python -m tool.benchmark_workers [--workers 1 2 4 8] [--teams 20] [--latency 0.05] [--budget 400] [--lean]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from tool import job_queue, scrape_config, scrape_worker
+from tool import scrap_tool as st
+from tool.job_queue import JobQueue
+from tool.player_stats_batch import PlayerStatsBatch
+
+DAY = 24 * 60 * 60
+
+
+def fakeEvent(eventID, home, away, startTimestamp):
+    team = lambda teamID: {"id": teamID, "name": f"Team {teamID}", "country": {"name": "England"}}
+    return {
+        "id": eventID, "customId": f"c{eventID}", "slug": f"match-{eventID}", "startTimestamp": startTimestamp,
+        "status": {"type": "finished"}, "homeTeam": team(home), "awayTeam": team(away),
+        "tournament": {"name": "Fake League", "uniqueTournament": {"id": 1, "hasEventPlayerStatistics": True}},
+        "season": {"id": 1},
+    }
+
+
+def fakeTeamEvents(teamID, page, now):
+    events = [fakeEvent(teamID * 1000 + page * 30 + i, teamID, 10000 + i, now - DAY * (page * 30 + i + 1)) for i in range(30)]
+    return {"events": events[::-1], "hasNextPage": page < 3}
+
+
+def fakeLineups(eventID):
+    side = lambda base: {"players": [
+        {"player": {"id": base + i, "name": f"Player {base + i}", "country": {"name": "England"}, "dateOfBirthTimestamp": 600000000},
+         "statistics": {"minutesPlayed": 90, "onTargetScoringAttempt": i % 3, "shotOffTarget": 1, "goals": i % 2, "fouls": 1, "wasFouled": 2}}
+        for i in range(14)]}
+    return {"home": side(eventID * 100), "away": side(eventID * 100 + 50)}
+
+
+def fakeStatistics(eventID):
+    period = lambda name: {"period": name, "groups": [
+        {"groupName": "Match overview", "statisticsItems": [{"name": "Corner kicks", "home": 5, "away": 3}, {"name": "Fouls", "home": 12, "away": 9}]},
+        {"groupName": "Shots", "statisticsItems": [{"name": "Total shots", "home": 14, "away": 8}, {"name": "Shots on target", "home": 6, "away": 3}]},
+        {"groupName": "Goalkeeping", "statisticsItems": [{"name": "Total saves", "home": 2, "away": 4}]}]}
+    return {"statistics": [period("ALL"), period("1ST"), period("2ND")]}
+
+
+def startFakeUpstream(latency):
+    """
+    Serve team events, event lineups and event statistics on a free local port
+
+    Returns:
+        - (server, api url, request counter dict)
+    """
+    now = int(time.time())
+    counter = {"requests": 0}
+    lock = threading.Lock()
+    routes = [
+        (re.compile(r"team/(\d+)/events/last/(\d+)$"), lambda match: fakeTeamEvents(int(match[1]), int(match[2]), now)),
+        (re.compile(r"event/(\d+)/lineups$"), lambda match: fakeLineups(int(match[1]))),
+        (re.compile(r"event/(\d+)/statistics$"), lambda match: fakeStatistics(int(match[1]))),
+    ]
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with lock:
+                counter["requests"] += 1
+            time.sleep(latency)
+
+            path = self.path.split("/api/v1/")[-1]
+            for pattern, build in routes:
+                match = pattern.search(path)
+                if match:
+                    body = json.dumps(build(match)).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+
+            self.send_response(404)
+            self.end_headers()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/api/v1/", counter
+
+
+def runOnce(workers, teams, apiURL, counter, overrides, directory):
+    """
+    Scrape teams fake teams with workers processes
+
+    Returns:
+        - (fetch seconds, parse seconds, requests, matches)
+    """
+    overrides = dict(overrides, JOB_QUEUE_PATH=os.path.join(directory, f"jobs-{workers}.sqlite3"))
+    for name, value in overrides.items():
+        setattr(scrape_config, name, value)
+
+    logger = logging.getLogger(__name__)
+    queue = JobQueue.fromConfig(scrape_config, logger)
+    run = f"benchmark {workers}"
+    queue.enqueue(run, job_queue.TEAM_PAGE, ((teamID, {"team_id": teamID, "team": f"Team {teamID}", "watermark": None}) for teamID in range(1, teams + 1)))
+
+    requestsBefore = counter["requests"]
+    start = time.perf_counter()
+    scrape_worker.runWorkers(run, workers, apiURL, overrides)
+    fetchSeconds = time.perf_counter() - start
+    requests = counter["requests"] - requestsBefore
+
+    # the single writer's side: parse every stored payload
+    start = time.perf_counter()
+    matchInfos = scrape_worker.queueEventJobs(queue, run, scrape_config.LEAN_MODE)
+    matches = scrape_worker.collectMatchStats(st.Scraper(logger), queue, run, matchInfos, PlayerStatsBatch(), logger)
+    parseSeconds = time.perf_counter() - start
+
+    queue.close()
+    return fetchSeconds, parseSeconds, requests, len(matches)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="benchmark sharded scraping against a local fake upstream")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="worker counts to compare")
+    parser.add_argument("--teams", type=int, default=20, help="teams to scrape, each yields NUMOFPASTMATCHES events")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the fake upstream takes per request")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight per worker")
+    parser.add_argument("--budget", type=float, default=400, help="global requests per second for all workers")
+    parser.add_argument("--lean", action="store_true", help="derive team totals from the lineups (LEAN_MODE)")
+    args = parser.parse_args()
+
+    server, apiURL, counter = startFakeUpstream(args.latency)
+    directory = tempfile.mkdtemp(prefix="benchmark_workers_")
+    overrides = {
+        "CACHE_ENABLED": False,
+        "DELAY_RANGE": (0, 0),
+        "QUEUE_SLOTS": args.concurrency,
+        "MIN_CONCURRENCY": args.concurrency,
+        "MAX_CONCURRENCY": args.concurrency,
+        "REQUEST_RATE": 10000,
+        "MIN_REQUEST_RATE": 10000,
+        "MAX_REQUEST_RATE": 10000,
+        "REQUEST_BURST": args.concurrency,
+        "REQUEST_BUDGET_BACKEND": "file",
+        "REQUEST_BUDGET_PATH": os.path.join(directory, "budget.state"),
+        "REQUEST_BUDGET_RATE": args.budget,
+        "REQUEST_BUDGET_BURST": args.concurrency,
+        # claim about as many jobs as a worker keeps in flight so the run spreads over every worker
+        "JOB_BATCH_SIZE": args.concurrency,
+        "LEAN_MODE": args.lean,
+    }
+
+    print(f"{'workers':>8}{'requests':>10}{'matches':>9}{'fetch s':>9}{'req/s':>9}{'speedup':>9}{'parse s':>9}")
+    baseline = None
+    for workers in args.workers:
+        fetchSeconds, parseSeconds, requests, matches = runOnce(workers, args.teams, apiURL, counter, overrides, directory)
+        throughput = requests / fetchSeconds
+        baseline = baseline or throughput
+        print(f"{workers:>8}{requests:>10}{matches:>9}{fetchSeconds:>9.2f}{throughput:>9.1f}{throughput / baseline:>9.2f}{parseSeconds:>9.2f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import asyncio
+import base64
+import gzip
+import json
+import time
+import logging
+from tool.response_cache import CachedResponse
+
+RECORD = "record"
+REPLAY = "replay"
+
+
+class Cassette():
+    """
+    HTTP cassette for the Scraper. In record mode every network response is captured into a
+    gzip compressed JSON lines archive, in replay mode the captured responses are served
+    locally so a whole scrape can run without hitting the website
+    """
+    def __init__(self, path, mode:str, logger:logging.Logger, simulateLatency=False) -> None:
+        """
+        Parameters:
+            - path: archive file (.jsonl.gz)
+            - mode: RECORD or REPLAY
+            - logger: logger used to record missing responses
+            - simulateLatency: in replay mode, sleep the recorded network latency of each response
+        """
+        if mode not in (RECORD, REPLAY):
+            raise ValueError(f"unknown cassette mode {mode}")
+
+        self.path               = path
+        self.mode               = mode
+        self.logger             = logger
+        self.simulateLatency    = simulateLatency
+        self.meta               = {}
+
+        self.entries    = {}    # url -> list of recorded entries, replayed in order
+        self.positions  = {}    # url -> index of the next entry to replay
+        self.recorded   = 0
+        self.replayed   = 0
+        self.missing    = 0
+
+        if mode == REPLAY:
+            self.load()
+
+    @property
+    def recording(self):
+        return self.mode == RECORD
+
+    @property
+    def replaying(self):
+        return self.mode == REPLAY
+
+    def load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as fp:
+            for line in fp:
+                entry = json.loads(line)
+                if "meta" in entry:
+                    self.meta = entry["meta"]
+                    continue
+                self.entries.setdefault(entry["url"], []).append(entry)
+
+    def save(self, meta:dict=None):
+        """
+        Write the recorded responses to the archive
+
+        Parameters:
+            - meta (or None): extra information about the recording such as the scraped date
+        """
+        if meta:
+            self.meta.update(meta)
+
+        with gzip.open(self.path, "wt", encoding="utf-8") as fp:
+            fp.write(json.dumps({"meta": self.meta}) + "\n")
+            for entries in self.entries.values():
+                for entry in entries:
+                    fp.write(json.dumps(entry) + "\n")
+
+    def record(self, url, response, latency:float):
+        """
+        Capture a network response
+
+        Parameters:
+            - url: request url
+            - response: requests response
+            - latency: seconds spent waiting for the response
+        """
+        self.entries.setdefault(url, []).append({
+            "url": url,
+            "status": response.status_code,
+            "body": base64.b64encode(response.content).decode("ascii"),
+            "latency": latency,
+        })
+        self.recorded += 1
+
+    def lookup(self, url):
+        """
+        Get the next recorded entry for url, the last entry is repeated once all were replayed
+
+        Returns:
+            - entry (dict) or None when url was never recorded
+        """
+        entries = self.entries.get(url)
+        if not entries:
+            self.missing += 1
+            self.logger.error(f"cassette has no response for {url}")
+            return None
+
+        position = self.positions.get(url, 0)
+        self.positions[url] = position + 1
+        self.replayed += 1
+        return entries[min(position, len(entries) - 1)]
+
+    def toResponse(self, url, entry):
+        if entry is None:
+            return CachedResponse(url, b"{}", status_code=404)
+        return CachedResponse(url, base64.b64decode(entry["body"]), status_code=entry["status"])
+
+    async def replay(self, url):
+        """
+        Serve the recorded response for url
+
+        Returns:
+            - CachedResponse with the recorded status and body, 404 when url was never recorded
+        """
+        entry = self.lookup(url)
+        if entry and self.simulateLatency:
+            await asyncio.sleep(entry["latency"])
+        return self.toResponse(url, entry)
+
+    def replaySync(self, url):
+        """
+        Blocking version of replay
+        """
+        entry = self.lookup(url)
+        if entry and self.simulateLatency:
+            time.sleep(entry["latency"])
+        return self.toResponse(url, entry)
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "recorded": self.recorded,
+            "replayed": self.replayed,
+            "missing": self.missing,
+        }
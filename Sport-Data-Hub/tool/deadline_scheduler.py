@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import time
+from requests_html import AsyncHTMLSession
+from tool import scrape_config
+from tool import scrap_tool as st
+from tool.single_flight import SingleFlight
+from tool.player_stats_batch import PlayerStatsBatch
+
+# how much of a fixture was scraped when the run ended
+FULL = "full"           # both teams' histories at full depth
+PARTIAL = "partial"     # reduced depth, cut by the deadline or some matches failed
+MISSING = "missing"     # nothing scraped for the fixture before the deadline
+
+
+class FixtureProgress():
+    """
+    Scrape progress of one scheduled fixture
+    """
+    __slots__ = ("fixture", "depth", "expected", "matches", "finished")
+
+    def __init__(self, fixture:dict) -> None:
+        self.fixture    = fixture
+        self.depth      = None      # past matches per team, set when the fixture starts
+        self.expected   = 0         # past matches found on the team pages
+        self.matches    = []        # MatchStats scraped for the fixture
+        self.finished   = False
+
+    def status(self, fullDepth):
+        if self.finished and self.depth >= fullDepth and len(self.matches) >= self.expected:
+            return FULL
+        if not self.matches:
+            return MISSING
+        return PARTIAL
+
+    def report(self, fullDepth):
+        return {
+            "match id": f"{self.fixture['customId']}_{self.fixture['id']}_{self.fixture['slug']}",
+            "home": self.fixture["home"],
+            "away": self.fixture["away"],
+            "startTimestamp": self.fixture["startTimestamp"],
+            "depth": self.depth,
+            "matches": len(self.matches),
+            "status": self.status(fullDepth),
+        }
+
+
+class DeadlineScheduler():
+    """
+    Scrape the past matches of the scheduled fixtures within an overall deadline. Fixtures
+    are started in kickoff order (startTimestamp) with only a few in progress at once, so
+    the shared rate limiter serves the soonest fixtures first. Before a fixture starts, the
+    remaining time is compared with the requests it needs at the observed request rate,
+    keeping enough for the later fixtures at the minimum depth, and its history depth is
+    lowered when the deadline is at risk. Whatever is still running when the deadline hits is cancelled.
+    """
+    def __init__(self, scraper:st.Scraper, deadline:float, logger:logging.Logger,
+                 depth=None, minDepth=None, activeFixtures=None) -> None:
+        """
+        Parameters:
+            - scraper: Scraper class obj used to scrape data
+            - deadline: seconds the whole scrape may take
+            - logger: logger used to record the deadline report
+            - depth: full number of past matches per team, default NUMOFPASTMATCHES
+            - minDepth: depth never reduced below, default SCHEDULER_MIN_DEPTH
+            - activeFixtures: fixtures scraped at once, default SCHEDULER_ACTIVE_FIXTURES
+        """
+        self.scraper        = scraper
+        self.deadline       = deadline
+        self.logger         = logger
+        self.depth          = depth or scrape_config.NUMOFPASTMATCHES
+        self.minDepth       = min(self.depth, minDepth or scrape_config.SCHEDULER_MIN_DEPTH)
+        self.activeFixtures = activeFixtures or scrape_config.SCHEDULER_ACTIVE_FIXTURES
+
+        self.started    = None
+        self.requests   = 0     # requests completed, for the observed request rate
+        self.planned    = 0     # requests of the fixtures started so far
+        self.discovered = []    # match infos of the past matches found on the team pages
+
+    def requestsFor(self, depth):
+        """
+        Returns:
+            - requests one fixture needs at depth: a team page per team, then the
+            statistics and the lineups of each past match
+        """
+        return 2 * (1 + 2 * depth)
+
+    def requestRate(self):
+        """
+        Returns:
+            - requests per second observed so far, the limiter's rate until enough requests completed
+        """
+        elapsed = time.monotonic() - self.started
+        if self.requests < 10 or elapsed <= 0:
+            return self.scraper.limiter.bucket.rate
+        return self.requests / elapsed
+
+    def depthFor(self, laterFixtures):
+        """
+        Parameters:
+            - laterFixtures: fixtures kicking off after the one being started
+
+        Returns:
+            - the deepest depth for the fixture being started that still leaves time for the
+            fixtures in progress and the later fixtures at minDepth, never less than minDepth. The soonest fixtures keep
+            the full depth and the reduction falls on the later ones
+        """
+        remaining = self.started + self.deadline - time.monotonic()
+        rate = self.requestRate()
+        # requests still owed to the fixtures in progress, and the later ones at minDepth
+        reserved = max(0, self.planned - self.requests) + laterFixtures * self.requestsFor(self.minDepth)
+        for depth in range(self.depth, self.minDepth - 1, -1):
+            if (self.requestsFor(depth) + reserved) / rate <= remaining:
+                break
+        self.planned += self.requestsFor(depth)
+        return depth
+
+    async def scrapeFixture(self, asession, progress:FixtureProgress, watermarks, flights, batch):
+        """
+        Scrape both teams' histories of one fixture, matches are recorded as they complete
+        so a fixture cut by the deadline keeps what it got
+        """
+        fixture = progress.fixture
+        teamPages = await asyncio.gather(*[
+            self.scraper.getPastMatches(asession, fixture[f"{side}_id"], fixture[side], None, 0,
+                                        watermarks.get(fixture[f"{side}_id"]), progress.depth)
+            for side in ("home", "away")
+        ])
+        self.requests += 2
+
+        pastMatchInfo = [matchInfo for teamPage in teamPages for matches in teamPage.values() for matchInfo in matches]
+        self.discovered.extend(pastMatchInfo)
+        # matches already stored are not expected
+        pastMatchInfo = await self.scraper.skipKnownEvents(pastMatchInfo)
+        progress.expected = len({matchInfo["id"] for matchInfo in pastMatchInfo})
+
+        async for matchStats in self.scraper.iterMatchCompleteStat(pastMatchInfo, asession, flights, batch, skipKnown=False):
+            self.requests += 2
+            progress.matches.append(matchStats)
+
+        progress.finished = all(teamPages)
+
+    async def run(self, scheduledMatchesInfos, watermarks=None):
+        """
+        Parameters:
+            - scheduledMatchesInfos (list of dict): the scheduled fixtures
+            - watermarks (or None): dict of team id -> (event id, start timestamp) of the
+            team's newest stored match, see DBHelper.getTeamWatermarks
+
+        Returns:
+            - (pastMatchesStats, report): the scraped MatchStats (each event once) and one
+            report dict per fixture in kickoff order, see FixtureProgress.report
+        """
+        self.started = time.monotonic()
+        watermarks = watermarks or {}
+        fixtures = [FixtureProgress(fixture) for fixture in sorted(scheduledMatchesInfos, key=lambda fixture: fixture["startTimestamp"])]
+        asession = AsyncHTMLSession()
+        flights = SingleFlight()
+        batch = PlayerStatsBatch()
+        slots = asyncio.Semaphore(self.activeFixtures)
+
+        async def scheduleFixture(i, progress):
+            async with slots:
+                progress.depth = self.depthFor(len(fixtures) - i - 1)
+                if progress.depth < self.depth:
+                    self.logger.error(f"deadline at risk, scraping {progress.fixture['home']} vs {progress.fixture['away']} with depth {progress.depth}")
+                await self.scrapeFixture(asession, progress, watermarks, flights, batch)
+
+        # tasks are created in kickoff order, so they queue for the slots in that order
+        tasks = [asyncio.ensure_future(scheduleFixture(i, progress)) for i, progress in enumerate(fixtures)]
+        done, pending = await asyncio.wait(tasks, timeout=self.deadline)
+        for task in pending:
+            task.cancel()
+        flights.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        for task in done:
+            if task.exception():
+                self.logger.error(f"failed to scrape fixture: {repr(task.exception())}")
+        await asession.close()
+
+        pastMatchesStats = {}
+        for progress in fixtures:
+            for matchStats in progress.matches:
+                pastMatchesStats.setdefault(matchStats.event_id, matchStats)
+
+        report = [progress.report(self.depth) for progress in fixtures]
+        self.printReport(report, bool(pending))
+        return list(pastMatchesStats.values()), report
+
+    def printReport(self, report, deadlineHit):
+        counts = {status: sum(1 for fixture in report if fixture["status"] == status) for status in (FULL, PARTIAL, MISSING)}
+        print(f"{'deadline hit' if deadlineHit else 'finished'} after {time.monotonic() - self.started:.1f}s: {counts}")
+        for fixture in report:
+            if fixture["status"] != FULL:
+                print(f"    {fixture['status']:<8}{fixture['home']} vs {fixture['away']} (depth {fixture['depth']}, {fixture['matches']} matches)")
+        if deadlineHit:
+            self.logger.error(f"scrape deadline of {self.deadline}s hit: {counts}")
@@ -2,10 +2,19 @@ from tool import scrap_tool as st
 from requests_html import HTMLSession, AsyncHTMLSession
 import logging
 import asyncio
+import os
 from tqdm.asyncio import tqdm as async_tqdm
 import json
+import threading
 from tool import DBHelper, scrape_config
-from tqdm import tqdm
+from tool.single_flight import SingleFlight
+from tool.player_stats_batch import PlayerStatsBatch
+from tool import job_queue, scrape_worker
+from tool.job_queue import JobQueue
+from tool.deadline_scheduler import DeadlineScheduler
+from tool import identity_cache
+from tool.identity_cache import IdentityCache
+from tool.known_events import KnownEvents
 from datetime import datetime
 
 
@@ -14,22 +23,58 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(filename='messages.log', encoding='utf-8', level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 scraper = st.Scraper(logger)
 dbHelper = DBHelper.DBHelper(logger)
+jobQueue = JobQueue.fromConfig(scrape_config, logger) if scrape_config.JOB_QUEUE_ENABLED else None
 
+# events already stored are left out before their stats are fetched
+if scrape_config.KNOWN_EVENTS_FILTER:
+    scraper.knownEvents = KnownEvents.fromConfig(scrape_config, dbHelper, logger)
+    if scrape_config.KNOWN_EVENTS_BLOOM:
+        scraper.knownEvents.buildBloom()
 
-teamChecked = set() # to store the teams/countries that were checked whether they are in the db to prevent additional checkings
-playerChecked = set() #to store the players that were checked whether they are in the db to prevent additional checkings
+# db ids shared by every scrape of the process, so teams and players are not looked up again
+teamCache = IdentityCache("teams", scrape_config.IDENTITY_CACHE_TEAMS)          # Sofascore team id, or (country, country) -> team id
+playerCache = IdentityCache("players", scrape_config.IDENTITY_CACHE_PLAYERS)    # Sofascore player id -> player id
+identityCachesWarmed = False   # see ensureIdentityCachesWarm
+identityCacheLock = threading.Lock()
 
-teamNeedInfo = set() #to store the teams/countries that is not in db
-playerNeedInfo = set() #to store the players that is not in db
 
-teamToIDDict = {}
-playerToIDDict = {}
+def warmIdentityCaches(mode):
+    """
+    Fill the identity caches from the db
+
+    Parameters:
+        - mode: identity_cache.RECENT for the most recently active teams and players,
+        identity_cache.ALL for any of them, up to the caches' capacity
+    """
+    recent = mode == identity_cache.RECENT
+    teams = teamCache.warm(dbHelper.getTeamIdentities(recent, teamCache.capacity))
+    players = playerCache.warm(dbHelper.getPlayerIdentities(recent, playerCache.capacity))
+    print(f"identity caches warmed with {teams} teams and {players} players")
+
+
+def ensureIdentityCachesWarm():
+    """
+    Warm the identity caches with IDENTITY_CACHE_WARM the first time they are used, not at
+    import: Django imports this module on every start and manage.py command
+    """
+    global identityCachesWarmed
+    if identityCachesWarmed:
+        return
+    with identityCacheLock:
+        if not identityCachesWarmed:
+            if scrape_config.IDENTITY_CACHE_WARM:
+                warmIdentityCaches(scrape_config.IDENTITY_CACHE_WARM)
+            identityCachesWarmed = True
+
 
+def identityCacheStats():
+    return {cache.name: cache.stats() for cache in (teamCache, playerCache)}
 
-async def getMatchLineup(asession, match, queue):
+
+async def getMatchLineup(asession, match):
     response = {}
     try:
-        response = await scraper.getMatchLineup(asession, match["id"], queue)
+        response = await scraper.getMatchLineup(asession, match["id"])
         return response.json()
 
 
@@ -38,49 +83,83 @@ async def getMatchLineup(asession, match, queue):
         return {}
 
 
+async def prefetchSchedule(days=None):
+    """
+    Fetch the scheduled matches of a window of days in one concurrent batch, the pages
+    are stored in the response cache so the other days of the window are served from it
+
+    Parameters:
+        - days: iterable of day offsets, default the whole SCHEDULE_DAYS window
+
+    Returns:
+        - dict of day offset -> matchesInfos
+    """
+    asession = AsyncHTMLSession()
+    schedule = await scraper.getScheduledMatches(asession, days)
+    await asession.close()
+    return schedule
+
+
 async def getScheduledLineup(matchInfos):
     asession = AsyncHTMLSession()
-    # Humanize request
-    #--------------------------------------------------------
-    # Fill queue with 3 slots to control execution
-    queue = asyncio.Queue()
-    for _ in range(scrape_config.QUEUE_SLOTS):
-        queue.put_nowait(True)
-    #--------------------------------------------------------
-    tasks = [getMatchLineup(asession, match, queue) for match in matchInfos]
+    # requests are paced by the scraper's shared rate limiter
+    tasks = [getMatchLineup(asession, match) for match in matchInfos]
     responses = await async_tqdm.gather(*tasks, desc="getting past 5 matches info")
     await asession.close()
     return responses
 
 
+def teamWatermarks(scheduledMatchesInfos):
+    """
+    Returns:
+        - dict of team id -> (event id, start timestamp) of the scheduled teams' newest stored
+        match, see DBHelper.getTeamWatermarks. Empty when TEAM_WATERMARKS is off
+    """
+    if not scrape_config.TEAM_WATERMARKS:
+        return {}
+    return dbHelper.getTeamWatermarks({match[side] for match in scheduledMatchesInfos for side in ("home_id", "away_id")})
+
+
 # scrape past matches for each team, default no of matches = 5
 # read db and get data first, if not use scraper.getPast5matches
-async def scrapeScheduledMatchStat(scraper:st.Scraper, scheduledMatchesInfos):
+async def scrapeScheduledMatchStat(scraper:st.Scraper, scheduledMatchesInfos, run=None, deadline=None):
     """
     Scrape past matches for each team, default no of matches = 5
 
     Parameters:
         - scraper: Scraper class obj used to scrape data
         - scheduledMatchesInfos (list of dict): a list of dict containing match infos
+        - run (or None): job queue run name, the scrape goes through the job queue when given
+        - deadline (or None): seconds the scrape may take, see DeadlineScheduler. Each
+        fixture gets a "populated" key (full, partial or missing)
 
     Returns:
-        - pastMatchesStats: (list of dict): a list of dict containing match info,
-            match stats, and player stats  
+        - (pastMatchesStats, pastMatchInfo): match info, match stats, and player stats (list of MatchStats)
+        and the match infos of the past matches found on the team pages, see updateWatermarks
     """
+    if deadline is not None:
+        watermarks = teamWatermarks(scheduledMatchesInfos)
+        scheduler = DeadlineScheduler(scraper, deadline, logger)
+        pastMatchesStats, report = await scheduler.run(scheduledMatchesInfos, watermarks)
+        populated = {fixture["match id"]: fixture["status"] for fixture in report}
+        for match in scheduledMatchesInfos:
+            match["populated"] = populated[f"{match['customId']}_{match['id']}_{match['slug']}"]
+        return pastMatchesStats, scheduler.discovered
+
+    if run is not None and jobQueue is not None:
+        return await scrapeQueuedMatchStat(scraper, scheduledMatchesInfos, run)
+
     asession = AsyncHTMLSession()
     
-    # Humanize request
-    #--------------------------------------------------------
-    # Fill queue with 3 slots to control execution
-    queue = asyncio.Queue()
-    for _ in range(scrape_config.QUEUE_SLOTS):
-        queue.put_nowait(True)
-    #-------------------------------------------------------
+    # requests are paced by the scraper's shared rate limiter
     # get past 5 matches for each new team that has not enough data
+    # teams with a stored high-water mark only page until their newest stored match
+    watermarks = teamWatermarks(scheduledMatchesInfos)
     pageNum = 0
-    tasks = [scraper.getPastMatches(asession, match["home_id"], match["home"], pastMatchInfo=None, pageNum=pageNum, queue=queue) for match in scheduledMatchesInfos]
-    tasks.extend([scraper.getPastMatches(asession, match["away_id"], match["home"], pastMatchInfo=None, pageNum=pageNum, queue=queue) for match in scheduledMatchesInfos])
-    allPast5MatchIDs = await async_tqdm.gather(*tasks, desc="getting past 5 matches info")
+    tasks = [scraper.getPastMatches(asession, match["home_id"], match["home"], pastMatchInfo=None, pageNum=pageNum, watermark=watermarks.get(match["home_id"])) for match in scheduledMatchesInfos]
+    tasks.extend([scraper.getPastMatches(asession, match["away_id"], match["home"], pastMatchInfo=None, pageNum=pageNum, watermark=watermarks.get(match["away_id"])) for match in scheduledMatchesInfos])
+    with scraper.tracer.span("team pages", teams=len(tasks)):
+        allPast5MatchIDs = await async_tqdm.gather(*tasks, desc="getting past 5 matches info")
     # print(allPast5MatchIDs)    
 
     # combine all the matchinfo result into one list
@@ -90,7 +169,79 @@ async def scrapeScheduledMatchStat(scraper:st.Scraper, scheduledMatchesInfos):
             teamPastMatchID.extend(matchIDs)
 
     # fetch all stats for each match such as match and player stats
-    pastMatchesStats = await scraper.getAllMatchCompleteStat(teamPastMatchID, asession, queue)
+    # a match between two teams of the slate or shared by several teams' histories
+    # is fetched once per run
+    # the players of every match are collected into one columnar batch
+    flights = SingleFlight()
+    batch = PlayerStatsBatch()
+    with scraper.tracer.span("match stats", matches=len(teamPastMatchID)):
+        pastMatchesStats = await scraper.getAllMatchCompleteStat(teamPastMatchID, asession, flights, batch)
+    print(f"event fetches: {flights.summary()}")
+
+    await asession.close()
+    return pastMatchesStats, teamPastMatchID
+
+async def scrapeQueuedMatchStat(scraper:st.Scraper, scheduledMatchesInfos, run):
+    """
+    scrapeScheduledMatchStat through the job queue. Team pages, event statistics and event
+    lineups are jobs of the run whose results are stored as they complete, a rerun of an
+    interrupted run only fetches the jobs that did not finish. With SCRAPE_WORKERS > 1
+    the jobs are fetched by worker processes and this process stays the single writer
+
+    Parameters:
+        - scraper: Scraper class obj used to scrape data
+        - scheduledMatchesInfos (list of dict): a list of dict containing match infos
+        - run: job queue run name
+
+    Returns:
+        - (pastMatchesStats, pastMatchInfo): see scrapeScheduledMatchStat
+    """
+    # one team page job per scheduled team, teams with a stored high-water mark only page
+    # until their newest stored match
+    watermarks = teamWatermarks(scheduledMatchesInfos)
+    teams = {}
+    for match in scheduledMatchesInfos:
+        for side in ("home", "away"):
+            teams.setdefault(match[f"{side}_id"], {"team_id": match[f"{side}_id"], "team": match[side], "watermark": watermarks.get(match[f"{side}_id"])})
+    jobQueue.enqueue(run, job_queue.TEAM_PAGE, teams.items())
+
+    if scrape_config.SCRAPE_WORKERS > 1:
+        await asyncio.to_thread(scrape_worker.runWorkers, run, scrape_config.SCRAPE_WORKERS, scraper.APIURL,
+                                {"JOB_QUEUE_PATH": os.path.abspath(jobQueue.path), "LEAN_MODE": scraper.lean,
+                                 "KNOWN_EVENTS_FILTER": scraper.knownEvents is not None})
+        matchInfos = scrape_worker.queueEventJobs(jobQueue, run, scraper.lean, scraper.knownEvents)
+    else:
+        matchInfos = await scrape_worker.scrapeRun(scraper, jobQueue, run)
+    print(f"scrape run {run}: {jobQueue.status(run)[run]}")
+
+    # merge the stored payloads, the players of every match are collected into one columnar batch
+    pastMatchesStats = scrape_worker.collectMatchStats(scraper, jobQueue, run, matchInfos, PlayerStatsBatch(), logger)
+    return pastMatchesStats, list(matchInfos.values())
+
+async def scrapeSeasonMatchStat(scraper:st.Scraper, seasons):
+    """
+    Scrape every finished match with player stats of whole seasons. Matches are discovered
+    from the season listings (see Scraper.getSeasonMatches) rather than from each team's
+    pages, and an event is fetched once even when listed in several seasons
+
+    Parameters:
+        - scraper: Scraper class obj used to scrape data
+        - seasons (list of tuple): (unique tournament id, season id) of each season
+
+    Returns:
+        - pastMatchesStats: (list of MatchStats): match info, match stats, and player stats
+    """
+    asession = AsyncHTMLSession()
+
+    seen = set()
+    pastMatchInfo = []
+    await asyncio.gather(*[scraper.getSeasonMatches(asession, uniqueTournamentID, seasonID, pastMatchInfo, seen)
+                           for uniqueTournamentID, seasonID in seasons])
+    print(f"discovered {len(pastMatchInfo)} matches with player stats among {len(seen)} events of {len(seasons)} seasons")
+
+    flights = SingleFlight()
+    batch = PlayerStatsBatch()
+    pastMatchesStats = await scraper.getAllMatchCompleteStat(pastMatchInfo, asession, flights, batch)
 
     await asession.close()
     return pastMatchesStats
@@ -99,109 +250,208 @@ async def scrapeScheduledMatchStat(scraper:st.Scraper, scheduledMatchesInfos):
 
 # print(allPast5MatchesID)
 
+def resolveTeams(teams):
+    """
+    Get the db ids of teams from the identity cache, the missing teams are fetched or
+    inserted with one set based db call
+
+    Parameters:
+        - teams: dict of Sofascore team id (or (country, country) for a country) -> (team name, country)
+
+    Returns:
+        - dict of Sofascore team id (or (country, country)) -> team id, teams the db failed on are left out
+    """
+    ensureIdentityCachesWarm()
+    teamIDs, missing = teamCache.getMany(teams)
+    if missing:
+        created = dbHelper.getOrCreateTeams({key: teams[key] for key in missing})
+        teamCache.update(created)
+        teamIDs.update(created)
+    return teamIDs
+
+
+def resolvePlayers(players):
+    """
+    Get the db ids of players from the identity cache, the missing players (and their
+    teams) are fetched or inserted with set based db calls
+
+    Parameters:
+        - players: dict of Sofascore player id -> (name, birth date, team id, team, country), see playersOf
+
+    Returns:
+        - dict of Sofascore player id -> player id, players the db failed on are left out
+    """
+    ensureIdentityCachesWarm()
+    playerIDs, missing = playerCache.getMany(players)
+    if not missing:
+        return playerIDs
+
+    # the player's team and its country (stored as a team) are needed to insert it
+    teams = {}
+    for key in missing:
+        name, birthDate, teamID, team, country = players[key]
+        teams[teamID] = team
+        teams[(country, country)] = (country, country)
+    teamIDs = resolveTeams(teams)
+
+    playerTeams = {}
+    for key in missing:
+        name, birthDate, teamID, team, country = players[key]
+        if teamID in teamIDs and (country, country) in teamIDs:
+            playerTeams[key] = (name, birthDate, teamIDs[teamID], teamIDs[(country, country)])
+        else:
+            logger.error(f"cannot write player into db, no db id for {team[0] if teamID not in teamIDs else country}")
+
+    created = dbHelper.getOrCreatePlayers(playerTeams)
+    playerCache.update(created)
+    playerIDs.update(created)
+    return playerIDs
+
+
+def teamsOf(scrapedData):
+    """
+    Returns:
+        - dict of Sofascore team id -> (team name, country) of the home and away teams of scrapedData
+    """
+    return {match[f"{side}_id"]: (match[side], match[f"{side}_country"]) for match in scrapedData if match for side in ("home", "away")}
+
+
+def playersOf(scrapedData):
+    """
+    Returns:
+        - dict of Sofascore player id -> (name, birth date, Sofascore team id, (team name, team country),
+        country) of the players of scrapedData
+    """
+    # look at the player stats dict/section
+    # side is "home"/"away", players is dict containing all player's info
+    # for the team - with player's name as key and player info as value
+    players = {}
+    for match in scrapedData:
+        if match:
+            for side, sidePlayers in match["player_stats"].items():
+                team = (match[side], match[f"{side}_country"])
+                for name, player in sidePlayers.items():
+                    players[player["player id"]] = (name, player["birth_date"], match[f"{side}_id"], team, player["country"])
+    return players
+
+
 def checkInDb(scrapedData, checkType="team"):
     """
-    Method to check whether the scrapedData team or player exists
-    in the db
+    Method to get the db ids of the scrapedData teams or players, inserting the
+    ones that are not in the db yet
 
     Parameters:
         - scrapedData: list of dict containing matchinfos
         - checkType: the check type. Default is team
-    
-    """
 
-    # if check type is team, we check whether the team is in the db
+    Returns:
+        - dict of team or player key -> db id
+    """
     if checkType=="team":
-        for match in scrapedData:
-            if match:
-                # if team has checked already, do not check it
-                # check it if it is not checked and add to set
-                # check home team
-                if (match["home"], match["home_country"]) not in teamChecked:
-                    teamChecked.add((match["home"], match["home_country"]))
-                    
-                    # check item in db, if result is bool, then it's not in db
-                    # else, record the id as value with team's name as key
-                    result = dbHelper.checkItemInDB(table="team", team_name=match["home"], country=match["home_country"])
-                    if type(result) is bool:
-                        teamNeedInfo.add((match["home"], match["home_country"]))
-                    else:
-                        teamToIDDict[match["home"]] = result
+        return resolveTeams(teamsOf(scrapedData))
+    return resolvePlayers(playersOf(scrapedData))
 
-                # check away team
-                if (match["away"], match["away_country"]) not in teamChecked:
-                    teamChecked.add((match["away"], match["away_country"]))
 
-                    result = dbHelper.checkItemInDB(table="team", team_name=match["away"], country=match["away_country"])
-                    if type(result) is bool:
-                        teamNeedInfo.add((match["away"], match["away_country"]))
-                    else:
-                        teamToIDDict[match["away"]] = result
-
-    # if checktype is player          
-    else:
-     
-        for match in scrapedData:
-            # if player has checked already, do not check it
-            # check it if it is not checked and add to set
-            if match:
-
-                # look at the player stats dict/section
-                # team is "home"/"away", players is dict containing all player's info
-                # for the team - with player's name as key and player info as value
-                for team, players in match["player_stats"].items():
-                    for name, player in players.items():
-                        if (name, player["birth_date"]) not in playerChecked:
-                            playerChecked.add((name, player["birth_date"]))
-                            
-                            # check player in db, if result is bool, then it's not in db
-                            # else, record the id as value with player's name and birth date 
-                            # as key since problem arises when players have the same name in the 
-                            # same match
-                            result = dbHelper.checkItemInDB(teamToIDDict, teamNeedInfo, player['country'], table="player", player_name=name, birth_date=player["birth_date"])
-                            if type(result) is bool:
-                                playerNeedInfo.add((name, match[team], player['country'], player["birth_date"]))
-
-                            else:
-                                playerToIDDict[(name, player["birth_date"])] = result
-
-                    
-  
-def addDataToDB(pastMatchesStats):
+def addDataToDB(pastMatchesStats, run=None):
     """
     Add new data to db
 
     Parameters:
-        - pastMatchesStats (list of dict): a list of dict containing match info, match stats, and player stats
-    """
-
-    # add team into db and create team name -> id mapping
-    if teamNeedInfo:
-        for teamInfo in tqdm(teamNeedInfo, desc="Writing team info to db"):
-            # record its id
-            teamId = dbHelper.insert_team(teamInfo)
-            if teamId is not None:
-                teamToIDDict[teamInfo[0]] = teamId
-
-    # add player into db and create player name, birthdate -> id mapping
-    if playerNeedInfo:
-        for playerInfo in tqdm(playerNeedInfo, desc="Writing player info to db"):
-            try:
-                playerInfoForDB = (playerInfo[0], teamToIDDict[playerInfo[1]], teamToIDDict[playerInfo[2]], playerInfo[3])
-            except Exception as e:
-                logger.error(f"cannot write player into db {e}")
+        - pastMatchesStats (list of MatchStats): match info, match stats, and player stats
+        - run (or None): job queue run name, each match is then written by a db write job
+        so a rerun does not write it again
+
+    Returns:
+        - set of the event ids of pastMatchesStats now in the db, written or already stored
+    """
+
+    # ids of the matches' teams and players, written by checkInDb and usually cached
+    teamIDs = resolveTeams(teamsOf(pastMatchesStats))
+    playerIDs = resolvePlayers(playersOf(pastMatchesStats))
+
+    # insert player and match stat data, DB_WRITE_BATCH matches per transaction
+    if run is not None and jobQueue is not None:
+        matchesByEvent = {str(matchStats.event_id): matchStats for matchStats in pastMatchesStats if matchStats}
+        jobQueue.enqueue(run, job_queue.DB_WRITE, ((eventID, None) for eventID in matchesByEvent))
+        written = set()
+
+        # a match already in the db is done, other errors give the job back to the queue
+        while True:
+            jobs = jobQueue.claim(run, job_queue.DB_WRITE, scrape_config.DB_WRITE_BATCH)
+            if not jobs:
+                break
+
+            # a job claimed again after a crash that followed its commit has no match on
+            # resume, the known events filter left the stored event out of the scrape
+            missing = [job for job in jobs if job.key not in matchesByEvent]
+            if missing:
+                storedEvents = dbHelper.getStoredEvents([int(job.key) for job in missing])
+                for job in missing:
+                    if int(job.key) in storedEvents:
+                        written.add(int(job.key))
+                        jobQueue.complete(job)
+                    else:
+                        jobQueue.fail(job, "match not scraped in this attempt")
+            jobs = [job for job in jobs if job.key in matchesByEvent]
+            if not jobs:
                 continue
 
-            # insert player and record its id
-            playerID = dbHelper.insert_player(playerInfoForDB)
-            if playerID is not None:
-                playerToIDDict[(playerInfo[0], playerInfo[3])] = playerID
-            
-    # insert player and match stat data
-    for matchStats in tqdm(pastMatchesStats, desc="Writing match stat to db"):
-        if matchStats:
-            dbHelper.insert_stat_data(matchStats, teamToIDDict, playerToIDDict)
-  
+            stored, errors = dbHelper.insert_stat_data_bulk([matchesByEvent[job.key] for job in jobs], teamIDs,
+                                                       playerIDs, scrape_config.DB_WRITE_BATCH)
+            if scraper.knownEvents:
+                scraper.knownEvents.add(stored)
+            for job in jobs:
+                reason = errors.get(int(job.key))
+                if reason is None or reason == DBHelper.ALREADYSTORED:
+                    written.add(int(job.key))
+                    jobQueue.complete(job)
+                else:
+                    jobQueue.fail(job, reason)
+        return written
+
+    stored, errors = dbHelper.insert_stat_data_bulk(pastMatchesStats, teamIDs, playerIDs, scrape_config.DB_WRITE_BATCH)
+    if scraper.knownEvents:
+        scraper.knownEvents.add(stored)
+    print(f"stored {len(stored)} matches, {sum(reason == DBHelper.ALREADYSTORED for reason in errors.values())} already in the db, "
+          f"{sum(reason != DBHelper.ALREADYSTORED for reason in errors.values())} failed")
+    return set(stored) | {eventID for eventID, reason in errors.items() if reason == DBHelper.ALREADYSTORED}
+
+
+def updateWatermarks(scheduledMatchesInfos, pastMatchInfo, written):
+    """
+    Advance the high-water mark of every scheduled team to its newest match in the db that
+    has no missing match before it. A match found on the team pages but not stored (its
+    fetch or its write failed, or the deadline cut it) stops the mark below it, so the next
+    run pages back to it. Opponents are skipped since their own histories were not paged in this run
+
+    Parameters:
+        - scheduledMatchesInfos (list of dict): the scheduled matches whose teams were scraped
+        - pastMatchInfo (list of dict): the past matches found on the team pages, see scrapeScheduledMatchStat
+        - written: set of the event ids written to the db, see addDataToDB
+    """
+    scrapedTeams = {match[side] for match in scheduledMatchesInfos for side in ("home_id", "away_id")}
+
+    # matches left out of the scrape by the known events filter were stored by an earlier run
+    unwritten = {int(matchInfo["id"]) for matchInfo in pastMatchInfo} - written
+    if unwritten:
+        written = written | dbHelper.getStoredEvents(unwritten)
+
+    teamMatches = {}
+    for matchInfo in pastMatchInfo:
+        for teamID in (matchInfo["home_id"], matchInfo["away_id"]):
+            if teamID in scrapedTeams:
+                teamMatches.setdefault(teamID, {})[int(matchInfo["id"])] = matchInfo["startTimestamp"]
+
+    watermarks = {}
+    for teamID, matches in teamMatches.items():
+        # oldest first, up to the first match missing from the db
+        for eventID, startTimestamp in sorted(matches.items(), key=lambda match: match[1]):
+            if eventID not in written:
+                break
+            watermarks[teamID] = (eventID, startTimestamp)
+
+    dbHelper.updateTeamWatermarks(watermarks)
+
 
 def serialize_datetime(obj):
     """
@@ -218,43 +468,121 @@ def serialize_datetime(obj):
     raise TypeError(f"Type {type(obj)} not serializable")
 
 
-def getScheduledMatchStat(day):
+def dumpMatchStats(pastMatchesStats, path):
     """
-    To get scheduled match stat
+    Write the scraped matches to a JSON file: "matches" holds the match rows and
+    "player_stats" their players in columns (see PlayerStatsBatch.toColumns), so no
+    dict is built per player
 
     Parameters:
-        - day: the day offset with respect to today's date
+        - pastMatchesStats (list of MatchStats): match info, match stats, and player stats
+        - path: JSON file written
     """
-    matchesInfos = scraper.getScheduledMatch(day)
-    if matchesInfos:
-        checkInDb(matchesInfos)
+    matchRows = {}  # id of a batch -> (batch, match rows)
+    for matchStats in pastMatchesStats:
+        view = matchStats.player_stats
+        if hasattr(view, "batch"):
+            matchRows.setdefault(id(view.batch), (view.batch, []))[1].append(view.matchRow)
 
-        # check db for past stats before getting new data
-        
-        pastMatchesStats = asyncio.run(scrapeScheduledMatchStat(scraper, matchesInfos))
+    playerStats = {}
+    for batch, rows in matchRows.values():
+        for key, values in batch.toColumns(rows).items():
+            playerStats.setdefault(key, []).extend(values)
 
+    with open(path, "w") as fp:
+        json.dump({"matches": [matchStats.toDict(playerStats=False) for matchStats in pastMatchesStats],
+                   "player_stats": playerStats}, fp, indent = 6, default=serialize_datetime)
 
 
-        # add checkings for team and players
-        checkInDb(pastMatchesStats, "player")
-        checkInDb(pastMatchesStats)
+def getScheduledMatchStat(day, refreshCache=False, deadline=None):
+    """
+    To get scheduled match stat
 
-        fp = open("jsonData.json", "w")
-        json.dump(pastMatchesStats, fp, indent = 6, default=serialize_datetime)
+    Parameters:
+        - day: the day offset with respect to today's date
+        - refreshCache: ignore cached responses and refetch everything (forced refresh)
+        - deadline (or None): seconds the scrape may take, default SCRAPE_DEADLINE. A run with
+        a deadline scrapes the soonest fixtures first and is not kept in the job queue
+    """
+    if scraper.cache:
+        scraper.cache.refresh = refreshCache
+    if deadline is None:
+        deadline = scrape_config.SCRAPE_DEADLINE
+
+    # every stage is a span of the run's trace, see TRACE_ENABLED
+    tracer = scraper.tracer
+    with tracer.span("getScheduledMatchStat", day=day):
+        # progress of the day is kept in the job queue, an interrupted run is resumed
+        run = None
+        if jobQueue is not None and deadline is None:
+            run = f"scheduled {scraper.scheduleDates([day])[day]}"
+            jobQueue.begin(run, restart=refreshCache)
+
+        with tracer.span("schedule"):
+            if scrape_config.SCHEDULE_PREFETCH and 0 <= day < scrape_config.SCHEDULE_DAYS:
+                matchesInfos = asyncio.run(prefetchSchedule()).get(day)
+            else:
+                matchesInfos = scraper.getScheduledMatch(day)
+        if matchesInfos:
+            with tracer.span("checkInDb", checkType="team", matches=len(matchesInfos)):
+                checkInDb(matchesInfos)
+
+            # check db for past stats before getting new data
+
+            with tracer.span("past matches", fixtures=len(matchesInfos)):
+                pastMatchesStats, pastMatchInfo = asyncio.run(scrapeScheduledMatchStat(scraper, matchesInfos, run, deadline))
+
+
+
+            # add checkings for team and players
+            with tracer.span("checkInDb", checkType="player", matches=len(pastMatchesStats)):
+                checkInDb(pastMatchesStats, "player")
+            with tracer.span("checkInDb", checkType="team", matches=len(pastMatchesStats)):
+                checkInDb(pastMatchesStats)
+
+            with tracer.span("json dump"):
+                dumpMatchStats(pastMatchesStats, "jsonData.json")
+
+            # print(playerNeedInfo)
+            with tracer.span("addDataToDB", matches=len(pastMatchesStats)):
+                written = addDataToDB(pastMatchesStats, run)
+                updateWatermarks(matchesInfos, pastMatchInfo, written)
+            print(f"identity caches: {identityCacheStats()}")
+            # dbHelper.insert_player({"name":"Jordan Pickford", "team_id":"5", "country_id":"5", "birth_date": datetime.now()})
+            # dbHelper.insert_team({"team":"test club", "country": "test country"})
+            scraper.closeSession()
+
+            with tracer.span("scheduled lineups", fixtures=len(matchesInfos)):
+                lineupDatas = asyncio.run(getScheduledLineup(matchesInfos))
+
+            for i,match in enumerate(matchesInfos):
+
+                match["lineup"] = lineupDatas[i]
+
+            print(matchesInfos)
+    tracer.flush()
+    return matchesInfos
 
-        # print(playerNeedInfo)
-        addDataToDB(pastMatchesStats)
-        # dbHelper.insert_player({"name":"Jordan Pickford", "team_id":"5", "country_id":"5", "birth_date": datetime.now()})
-        # dbHelper.insert_team({"team":"test club", "country": "test country"})
-        scraper.closeSession()
+# getScheduledMatchStat(1)
 
-        lineupDatas = asyncio.run(getScheduledLineup(matchesInfos))
 
-        for i,match in enumerate(matchesInfos):
-            
-            match["lineup"] = lineupDatas[i]
+def getSeasonMatchStat(seasons, refreshCache=False):
+    """
+    Backfill whole league seasons into the db
 
-        print(matchesInfos)
-    return matchesInfos
+    Parameters:
+        - seasons: iterable of (unique tournament id, season id)
+        - refreshCache: ignore cached responses and refetch everything (forced refresh)
 
-# getScheduledMatchStat(1)
\ No newline at end of file
+    Returns:
+        - pastMatchesStats (list of MatchStats): the scraped matches
+    """
+    if scraper.cache:
+        scraper.cache.refresh = refreshCache
+
+    pastMatchesStats = asyncio.run(scrapeSeasonMatchStat(scraper, list(seasons)))
+    checkInDb(pastMatchesStats, "player")
+    checkInDb(pastMatchesStats)
+    addDataToDB(pastMatchesStats)
+    scraper.closeSession()
+    return pastMatchesStats
@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+# warm-up modes
+RECENT = "recent"   # the most recently active teams / players
+ALL = "all"         # every team / player, up to the cache capacity
+
+
+def normalizeKey(key):
+    """
+    Returns:
+        - key with datetimes reduced to dates, scraped birth dates are datetimes at midnight
+        while the db returns dates. Keys other than tuples (Sofascore ids) are returned as is
+    """
+    if not isinstance(key, tuple):
+        return key
+    return tuple(part.date() if isinstance(part, datetime) else part for part in key)
+
+
+class IdentityCache():
+    """
+    Bounded, thread-safe LRU map of a key to a db id, eg Sofascore team id -> team id or
+    (country, country) -> team id of a country. It is shared by every scrape of the
+    process, the least recently used keys are evicted once capacity is reached and hits
+    and misses are counted for the hit rate
+    """
+    def __init__(self, name:str, capacity:int) -> None:
+        """
+        Parameters:
+            - name: name used in the stats
+            - capacity: keys kept before the least recently used ones are evicted
+        """
+        self.name       = name
+        self.capacity   = capacity
+        self.ids        = OrderedDict()
+        self.lock       = threading.Lock()
+
+        self.hits       = 0
+        self.misses     = 0
+        self.evictions  = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def getMany(self, keys):
+        """
+        Parameters:
+            - keys: iterable of keys
+
+        Returns:
+            - (found, missing): dict of key -> id for the cached keys, with the keys as given,
+            and list of the keys not cached
+        """
+        found = {}
+        missing = []
+        with self.lock:
+            for key in keys:
+                cacheKey = normalizeKey(key)
+                id = self.ids.get(cacheKey)
+                if id is None:
+                    missing.append(key)
+                else:
+                    self.ids.move_to_end(cacheKey)
+                    found[key] = id
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def update(self, ids:dict):
+        """
+        Cache the ids of dict key -> id, evicting the least recently used keys past capacity
+        """
+        with self.lock:
+            for key, id in ids.items():
+                cacheKey = normalizeKey(key)
+                self.ids[cacheKey] = id
+                self.ids.move_to_end(cacheKey)
+            while len(self.ids) > self.capacity:
+                self.ids.popitem(last=False)
+                self.evictions += 1
+
+    def warm(self, rows):
+        """
+        Fill the cache with (key, id) rows read from the db, without counting them as misses.
+        Rows are given most important first, those past capacity are dropped
+
+        Returns:
+            - number of keys cached
+        """
+        rows = list(rows)[:self.capacity]
+        # the first rows become the most recently used
+        self.update(dict(reversed(rows)))
+        return len(rows)
+
+    def clear(self):
+        with self.lock:
+            self.ids.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.ids),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+            }
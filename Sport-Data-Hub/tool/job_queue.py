@@ -0,0 +1,342 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+
+# units of work of a scrape run
+TEAM_PAGE = "team page"         # past matches of a team, result: list of match info dicts
+EVENT_STATS = "event stats"     # event/{id}/statistics, result: raw response body
+EVENT_LINEUP = "event lineup"   # event/{id}/lineups, result: raw response body
+EVENT_INCIDENTS = "event incidents" # event/{id}/incidents, result: raw response body
+DB_WRITE = "db write"           # insert of one scraped match, no result
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"               # gave up after maxAttempts
+
+
+class Job():
+    """
+    A claimed unit of work
+    """
+    __slots__ = ("id", "run", "kind", "key", "payload", "attempts")
+
+    def __init__(self, id, run, kind, key, payload, attempts) -> None:
+        self.id         = id
+        self.run        = run
+        self.kind       = kind
+        self.key        = key
+        self.payload    = payload
+        self.attempts   = attempts
+
+
+class JobQueue():
+    """
+    Durable SQLite queue of the units of work of a scrape run. Every job is stored with its
+    status and result, so a run interrupted by a crash or a timeout resumes from the jobs
+    that did not finish. Jobs are claimed with a lease inside an immediate transaction so
+    several workers (threads or processes) can share one queue file; the jobs of a worker
+    that died are claimable again once their lease expired.
+    """
+    def __init__(self, path, logger:logging.Logger, lease:float, maxAttempts:int, worker=None) -> None:
+        """
+        Parameters:
+            - path: sqlite file of the queue
+            - logger: logger used to record job failures
+            - lease: seconds a claimed job stays reserved to its worker
+            - maxAttempts: attempts before a job is marked failed
+            - worker: name of this worker, default host:pid
+        """
+        self.path           = path
+        self.logger         = logger
+        self.lease          = lease
+        self.maxAttempts    = maxAttempts
+        self.worker         = worker or f"{socket.gethostname()}:{os.getpid()}"
+
+        self.lock = threading.Lock()
+        # autocommit, transactions are opened explicitly where several statements must be atomic
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                run TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                payload TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result BLOB,
+                error TEXT,
+                worker TEXT,
+                leased_until REAL,
+                updated_at REAL NOT NULL,
+                UNIQUE (run, kind, key)
+            )"""
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (run, kind, status)")
+
+    @classmethod
+    def fromConfig(cls, config, logger):
+        """
+        Build a queue from the scrape_config module
+        """
+        return cls(config.JOB_QUEUE_PATH, logger, lease=config.JOB_LEASE_SECONDS, maxAttempts=config.JOB_MAX_ATTEMPTS)
+
+    def begin(self, run, restart=False):
+        """
+        Start or resume a run. A run whose jobs all finished is cleared so it scrapes afresh
+
+        Parameters:
+            - run: run name, eg "scheduled 2024-05-01"
+            - restart: clear the run even if it did not finish
+
+        Returns:
+            - True when unfinished jobs of a previous attempt are resumed
+        """
+        self.releaseStale(run)
+        counts = self.counts(run)
+        unfinished = counts.get(PENDING, 0) + counts.get(RUNNING, 0)
+        if restart or (counts and not unfinished):
+            with self.lock:
+                self.connection.execute("DELETE FROM jobs WHERE run = ?", (run,))
+            return False
+
+        if unfinished:
+            print(f"resuming scrape run {run}: {counts}")
+        return bool(unfinished)
+
+    def releaseStale(self, run):
+        """
+        Give back the running jobs of workers of this host that are no longer alive, and the
+        ones of this worker left over by an interrupted attempt, without waiting for their lease
+        """
+        host = socket.gethostname()
+        with self.lock:
+            workers = [row[0] for row in self.connection.execute(
+                "SELECT DISTINCT worker FROM jobs WHERE run = ? AND status = ?", (run, RUNNING)
+            )]
+
+        stale = []
+        for worker in workers:
+            workerHost, _, pid = (worker or "").rpartition(":")
+            if worker == self.worker:
+                stale.append(worker)
+            elif workerHost == host and pid.isdigit():
+                try:
+                    os.kill(int(pid), 0)
+                except ProcessLookupError:
+                    stale.append(worker)
+                except PermissionError:
+                    pass
+
+        with self.lock:
+            self.connection.executemany(
+                "UPDATE jobs SET status = ?, leased_until = NULL WHERE run = ? AND status = ? AND worker = ?",
+                [(PENDING, run, RUNNING, worker) for worker in stale]
+            )
+
+    def enqueue(self, run, kind, items):
+        """
+        Add jobs, jobs already in the run (same kind and key) are kept as they are
+
+        Parameters:
+            - run: run name
+            - kind: job kind, eg TEAM_PAGE
+            - items: iterable of (key, payload), payload must be JSON serializable
+        """
+        now = time.time()
+        rows = [(run, kind, str(key), json.dumps(payload), PENDING, now) for key, payload in items]
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO jobs (run, kind, key, payload, status, updated_at) VALUES (?, ?, ?, ?, ?, ?)", rows
+                )
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+    def shardFilter(self, shard):
+        """
+        Returns:
+            - (sql condition, parameters) restricting jobs to a shard (index, count) of the
+            integer keys, an always true condition when shard is None
+        """
+        if shard is None:
+            return "1", []
+        index, count = shard
+        return "CAST(key AS INTEGER) % ? = ?", [count, index]
+
+    def claim(self, run, kind, limit, shard=None):
+        """
+        Reserve up to limit pending jobs, or running jobs whose lease expired
+
+        Parameters:
+            - shard (or None): (index, count), only claim the jobs of that shard of the keys
+
+        Returns:
+            - list of Job
+        """
+        now = time.time()
+        shardCondition, shardParameters = self.shardFilter(shard)
+        with self.lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.connection.execute(
+                    f"""SELECT id, key, payload, attempts FROM jobs
+                    WHERE run = ? AND kind = ? AND (status = ? OR (status = ? AND leased_until <= ?)) AND {shardCondition}
+                    ORDER BY id LIMIT ?""",
+                    [run, kind, PENDING, RUNNING, now, *shardParameters, limit]
+                ).fetchall()
+                self.connection.executemany(
+                    "UPDATE jobs SET status = ?, worker = ?, leased_until = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    [(RUNNING, self.worker, now + self.lease, now, row[0]) for row in rows]
+                )
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+        return [Job(id, run, kind, key, json.loads(payload), attempts + 1) for id, key, payload, attempts in rows]
+
+    def complete(self, job:Job, result=None):
+        """
+        Mark a job done and store its result (bytes, or a JSON serializable value)
+        """
+        if result is not None and not isinstance(result, bytes):
+            result = json.dumps(result).encode("utf-8")
+        body = None if result is None else zlib.compress(result)
+
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = NULL, leased_until = NULL, updated_at = ? WHERE id = ?",
+                (DONE, body, time.time(), job.id)
+            )
+
+    def fail(self, job:Job, error):
+        """
+        Give a failed job back to the queue, or mark it failed once it used maxAttempts
+        """
+        status = FAILED if job.attempts >= self.maxAttempts else PENDING
+        with self.lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, leased_until = NULL, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job.id)
+            )
+        self.logger.error(f"{job.kind} job {job.key} of {job.run} failed (attempt {job.attempts}): {error}")
+
+    def results(self, run, kind, decode=True):
+        """
+        Returns:
+            - dict of key -> result of the done jobs of a kind, results are decoded from JSON
+            unless decode is False (raw bytes)
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT key, result FROM jobs WHERE run = ? AND kind = ? AND status = ?", (run, kind, DONE)
+            ).fetchall()
+
+        results = {}
+        for key, body in rows:
+            result = None if body is None else zlib.decompress(body)
+            results[key] = json.loads(result) if decode and result is not None else result
+        return results
+
+    def done(self, run, kind):
+        """
+        Returns:
+            - set of the keys of the done jobs of a kind
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT key FROM jobs WHERE run = ? AND kind = ? AND status = ?", (run, kind, DONE)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def counts(self, run, kind=None, shard=None):
+        """
+        Returns:
+            - dict of status -> number of jobs of the run (of one kind and one shard if given)
+        """
+        shardCondition, shardParameters = self.shardFilter(shard)
+        query = f"SELECT status, COUNT(*) FROM jobs WHERE run = ? AND {shardCondition}"
+        parameters = [run, *shardParameters]
+        if kind is not None:
+            query += " AND kind = ?"
+            parameters.append(kind)
+
+        with self.lock:
+            rows = self.connection.execute(query + " GROUP BY status", parameters).fetchall()
+        return dict(rows)
+
+    def status(self, run=None):
+        """
+        Returns:
+            - dict of run -> kind -> status -> number of jobs, for one run or every run
+        """
+        query = "SELECT run, kind, status, COUNT(*) FROM jobs"
+        parameters = []
+        if run is not None:
+            query += " WHERE run = ?"
+            parameters.append(run)
+
+        summary = {}
+        with self.lock:
+            for jobRun, kind, status, count in self.connection.execute(query + " GROUP BY run, kind, status", parameters):
+                summary.setdefault(jobRun, {}).setdefault(kind, {})[status] = count
+        return summary
+
+    async def drain(self, run, kind, handler, batchSize, pollInterval=1.0, shard=None):
+        """
+        Process the jobs of a kind until none is pending. Claimed jobs are handled
+        concurrently, jobs leased by other workers are waited for so every job of
+        the kind is finished when this returns
+
+        Parameters:
+            - run: run name
+            - kind: job kind
+            - handler: async function(job) returning the job result, raising marks the job failed
+            - batchSize: jobs claimed at once
+            - pollInterval: seconds between checks while other workers hold jobs
+            - shard (or None): (index, count), only process and wait for that shard of the keys
+        """
+        async def process(job):
+            try:
+                self.complete(job, await handler(job))
+            except Exception as e:
+                self.fail(job, repr(e))
+
+        while True:
+            jobs = self.claim(run, kind, batchSize, shard)
+            if jobs:
+                await asyncio.gather(*[process(job) for job in jobs])
+                continue
+
+            counts = self.counts(run, kind, shard)
+            if not counts.get(PENDING) and not counts.get(RUNNING):
+                return
+            await asyncio.sleep(pollInterval)
+
+    def close(self):
+        self.connection.close()
+
+
+if __name__ == "__main__":
+    # python -m tool.job_queue [run], print the job status of the runs in the queue
+    from tool import scrape_config
+
+    queue = JobQueue.fromConfig(scrape_config, logging.getLogger(__name__))
+    for jobRun, kinds in queue.status(sys.argv[1] if len(sys.argv) > 1 else None).items():
+        print(jobRun)
+        for kind, counts in kinds.items():
+            print(f"    {kind:<14}{counts}")
+    queue.close()
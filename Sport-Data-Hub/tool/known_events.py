@@ -0,0 +1,137 @@
+import math
+import threading
+
+MASK64 = (1 << 64) - 1
+
+
+def mix64(value):
+    """
+    Returns:
+        - value scrambled into 64 bits (splitmix64 finalizer), event ids are sequential
+    """
+    value = (value + 0x9E3779B97F4A7C15) & MASK64
+    value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & MASK64
+    return value ^ (value >> 31)
+
+
+class BloomFilter():
+    """
+    Bloom filter of integer ids. "not in" is certain, "in" is wrong for about errorRate of
+    the ids never added as long as at most capacity ids are added
+    """
+    def __init__(self, capacity:int, errorRate:float) -> None:
+        """
+        Parameters:
+            - capacity: ids expected to be added
+            - errorRate: false positive rate at capacity
+        """
+        self.size       = max(8, int(-capacity * math.log(errorRate) / math.log(2) ** 2))  # bits
+        self.hashes     = max(1, round(self.size / capacity * math.log(2)))
+        self.bits       = bytearray((self.size + 7) // 8)
+        self.count      = 0
+
+    def positions(self, id):
+        # double hashing, the two halves of one mixed value give every position
+        mixed = mix64(id)
+        first, second = mixed & 0xFFFFFFFF, (mixed >> 32) | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
+
+    def add(self, id):
+        for position in self.positions(id):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, id):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(id))
+
+
+class KnownEvents():
+    """
+    Filter of the events already stored in the db, applied to the discovered events before
+    their statistics, lineups and incidents are fetched. The stored events among a batch are
+    found with one query on the Match Sofascore ids. With a Bloom filter of the stored ids
+    built at startup, only the events the filter may hold are queried, the others are new
+    for sure
+    """
+    def __init__(self, dbHelper, logger, bloomCapacity=None, bloomErrorRate=0.01) -> None:
+        """
+        Parameters:
+            - dbHelper: DBHelper class obj used to query the stored events
+            - logger: logger used to record failures
+            - bloomCapacity (or None): stored events the Bloom filter is sized for, None for no filter
+            - bloomErrorRate: false positive rate of the Bloom filter at capacity
+        """
+        self.dbHelper       = dbHelper
+        self.logger         = logger
+        self.bloomCapacity  = bloomCapacity
+        self.bloomErrorRate = bloomErrorRate
+        self.bloom          = None
+        self.lock           = threading.Lock()
+
+        self.checked    = 0     # events checked
+        self.skipped    = 0     # stored events not fetched
+        self.queried    = 0     # events looked up in the db
+
+    @classmethod
+    def fromConfig(cls, config, dbHelper, logger):
+        bloomCapacity = config.KNOWN_EVENTS_BLOOM_CAPACITY if config.KNOWN_EVENTS_BLOOM else None
+        return cls(dbHelper, logger, bloomCapacity, config.KNOWN_EVENTS_BLOOM_ERROR_RATE)
+
+    def buildBloom(self):
+        """
+        Build the Bloom filter from every event id stored in the db
+        """
+        bloom = BloomFilter(self.bloomCapacity, self.bloomErrorRate)
+        for eventID in self.dbHelper.iterStoredEventIDs():
+            bloom.add(eventID)
+        with self.lock:
+            self.bloom = bloom
+        if bloom.count > self.bloomCapacity:
+            self.logger.error(f"{bloom.count} stored events exceed KNOWN_EVENTS_BLOOM_CAPACITY {self.bloomCapacity}, "
+                              f"the Bloom filter lets more stored events through to the db query")
+        print(f"known events Bloom filter: {bloom.count} stored events, {len(bloom.bits) / 1e6:.1f} MB")
+
+    def add(self, eventIDs):
+        """
+        Record newly stored events in the Bloom filter
+        """
+        with self.lock:
+            if self.bloom is not None:
+                for eventID in eventIDs:
+                    self.bloom.add(eventID)
+
+    def stored(self, eventIDs):
+        """
+        Parameters:
+            - eventIDs: iterable of Sofascore event ids
+
+        Returns:
+            - set of the event ids stored in the db
+        """
+        with self.lock:
+            candidates = [eventID for eventID in eventIDs if self.bloom is None or eventID in self.bloom]
+        self.queried += len(candidates)
+        return self.dbHelper.getStoredEvents(candidates) if candidates else set()
+
+    def skipStored(self, pastMatchInfo):
+        """
+        Parameters:
+            - pastMatchInfo (list of dict): discovered matches, see Scraper.findMatchWithPlayerStat
+
+        Returns:
+            - pastMatchInfo without the matches stored in the db
+        """
+        if not pastMatchInfo:
+            return pastMatchInfo
+        stored = self.stored({int(match["id"]) for match in pastMatchInfo})
+        remaining = [match for match in pastMatchInfo if int(match["id"]) not in stored]
+
+        self.checked += len(pastMatchInfo)
+        self.skipped += len(pastMatchInfo) - len(remaining)
+        if stored:
+            print(f"skipped fetching {len(pastMatchInfo) - len(remaining)} of {len(pastMatchInfo)} events already in the db")
+        return remaining
+
+    def stats(self):
+        return {"checked": self.checked, "skipped": self.skipped, "queried": self.queried}
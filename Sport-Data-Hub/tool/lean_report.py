@@ -0,0 +1,134 @@
+"""
+Validate the lean mode on recorded data: for every event whose lineups and statistics
+were both recorded, compare the team totals summed from the lineups with the ones of
+the statistics payload, and count the events the lean mode would still fetch
+statistics for.
+
+Usage (from the Sport-Data-Hub directory):
+    python -m tool.lean_report matchday.jsonl.gz
+    python -m tool.lean_report scrape_cache.sqlite3
+"""
+import argparse
+import base64
+import logging
+import re
+import sqlite3
+import zlib
+from tool import scrap_tool as st
+from tool.cassette import Cassette, REPLAY
+from tool.match_stats import DERIVED_FIELDS, SIDES
+from tool.player_stats_batch import PlayerStatsBatch
+
+EVENTURL = re.compile(r"event/(\d+)/(lineups|statistics)$")
+
+
+def recordedPayloads(path):
+    """
+    Returns:
+        - dict of event id -> {"lineups": body, "statistics": body} of a cassette or a response cache
+    """
+    if path.endswith(".sqlite3"):
+        connection = sqlite3.connect(path)
+        responses = [(url, zlib.decompress(body)) for url, body in connection.execute("SELECT url, body FROM responses")]
+        connection.close()
+    else:
+        cassette = Cassette(path, REPLAY, logging.getLogger(__name__))
+        responses = [
+            (url, base64.b64decode(entry["body"]))
+            for url, entries in cassette.entries.items()
+            for entry in entries if entry["status"] == 200
+        ]
+
+    events = {}
+    for url, body in responses:
+        match = EVENTURL.search(url)
+        if match:
+            events.setdefault(match[1], {})[match[2]] = body
+    return events
+
+
+def matchInfoFor(eventID):
+    # only the statistics are compared, the match info is a placeholder
+    return {"customId": "", "id": eventID, "slug": "", "home": "", "away": "", "home_country": "", "away_country": "",
+            "startTimestamp": 0, "league": "", "home_id": 0, "away_id": 0}
+
+
+def compare(scraper:st.Scraper, events):
+    """
+    Returns:
+        - report dict: events compared, lean decisions and per field agreement
+    """
+    batch = PlayerStatsBatch()
+    report = {
+        "events": 0,
+        "derived": 0,           # lean mode keeps the sums, no statistics request
+        "statistics": 0,        # lean mode falls back to the statistics request
+        "undetected": 0,        # sums kept although they differ from the statistics
+        "problems": {},
+        "fields": {field: {"exact": 0, "absolute error": 0} for field in DERIVED_FIELDS},
+    }
+
+    for eventID, payloads in events.items():
+        if "lineups" not in payloads or "statistics" not in payloads:
+            continue
+
+        matchInfo = matchInfoFor(eventID)
+        try:
+            full = scraper.parseMatchStat(matchInfo, payloads["statistics"])
+            lean, problems = scraper.deriveMatchStat(matchInfo, scraper.parsePlayerMatchStat(matchInfo, payloads["lineups"], batch))
+        except Exception:
+            continue    # dropped by both modes
+        if full is None:
+            continue
+
+        report["events"] += 1
+        for problem in problems:
+            reason = problem.split(": ", 1)[1]
+            report["problems"][reason] = report["problems"].get(reason, 0) + 1
+
+        differs = False
+        for field, agreement in report["fields"].items():
+            for side in SIDES:
+                error = abs(lean.stat(field, side) - full.stat(field, side))
+                agreement["exact"] += error == 0
+                agreement["absolute error"] += error
+                differs = differs or error != 0
+
+        if scraper.needsStatistics(problems, lean):
+            report["statistics"] += 1
+        else:
+            report["derived"] += 1
+            report["undetected"] += differs
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare lean mode team totals with the statistics payloads")
+    parser.add_argument("recording", help="cassette (.jsonl.gz) or response cache (.sqlite3)")
+    args = parser.parse_args()
+
+    scraper = st.Scraper(logging.getLogger(__name__))
+    report = compare(scraper, recordedPayloads(args.recording))
+    events = report["events"]
+    if not events:
+        print("no event with both lineups and statistics recorded")
+        return
+
+    # each event costs 2 requests in the full mode, 1 (+1 on fallback) in the lean mode
+    print(f"events: {events}, derived: {report['derived']}, statistics fallback: {report['statistics']}, "
+          f"requests saved: {report['derived'] / (2 * events):.0%}")
+    print(f"derived totals kept although they differ from the statistics: {report['undetected']}")
+    if report["problems"]:
+        print("inconsistent sums (per side):")
+    for reason, count in sorted(report["problems"].items(), key=lambda item: -item[1]):
+        print(f"    {count:>6}  {reason}")
+
+    print(f"{'field':<14}{'exact':>8}{'mean abs err':>14}")
+    for field, agreement in report["fields"].items():
+        values = 2 * events     # home and away
+        print(f"{field:<14}{agreement['exact'] / values:>8.1%}{agreement['absolute error'] / values:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
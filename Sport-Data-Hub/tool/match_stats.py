@@ -0,0 +1,233 @@
+from array import array
+from datetime import datetime
+
+# (statistics group name, statistics item name) -> stat field
+# adding a new stat (eg offsides, possession) is one entry in this table
+STAT_TABLE = {
+    ("Match overview", "Corner kicks"): "corners",
+    ("Match overview", "Fouls"): "fouls",
+    ("Match overview", "Yellow cards"): "yellowCards",
+    ("Match overview", "Red cards"): "redCards",
+    ("Shots", "Total shots"): "totalShot",
+    ("Shots", "Shots on target"): "shotOnTarget",
+    ("Goalkeeping", "Total saves"): "totalSaves",
+}
+
+# groups that must be present, a match with fewer than REQUIREDINFORMATIONCOUNT of them
+# (counted over every period) is dropped
+REQUIRED_GROUPS = {"Match overview", "Shots", "Goalkeeping"}
+REQUIREDINFORMATIONCOUNT = 3
+
+# stat field -> player stat column (player_stats_batch.PLAYER_STAT_FIELDS) whose sum over a
+# side's players gives the team total, used by the lean mode. Corners are not in the lineups
+# payload and only come from the statistics payload
+DERIVED_FIELDS = {
+    "totalShot": "shots",
+    "shotOnTarget": "shotsTarget",
+    "fouls": "fouls",
+    "totalSaves": "saves",
+}
+
+# stat field -> player stat column summed the same way once the players' cards were set
+# from the incidents (PlayerStatsView.setCards)
+CARD_FIELDS = {
+    "yellowCards": "yellowCards",
+    "redCards": "redCards",
+}
+
+STAT_FIELDS = tuple(dict.fromkeys(STAT_TABLE.values()))
+SIDES = ("home", "away")
+FULLTIME = "ALL"
+
+# column of each (side, field) in a period row, home and away are interleaved
+COLUMNS = {(side, field): 2 * i + j for i, field in enumerate(STAT_FIELDS) for j, side in enumerate(SIDES)}
+ITEM_COLUMNS = {key: (COLUMNS[("home", field)], COLUMNS[("away", field)]) for key, field in STAT_TABLE.items()}
+
+# match info keys kept as attributes, legacy dict key -> attribute
+INFO_KEYS = {
+    "match id": "matchID",
+    "home": "home",
+    "away": "away",
+    "home_country": "home_country",
+    "away_country": "away_country",
+    "date": "date",
+    "league": "league",
+    "event_id": "event_id",
+    "home_id": "home_id",
+    "away_id": "away_id",
+    "startTimestamp": "startTimestamp",
+    "player_stats": "player_stats",
+}
+
+
+def checkDerivedTotals(totals, minMinutes):
+    """
+    Sanity checks of team totals summed from the lineups, a lineup missing players or
+    statistics gives sums that disagree with each other
+
+    Parameters:
+        - totals: {side: {player stat column: sum}}, see PlayerStatsView.totals
+        - minMinutes: fewest minutes played a side's players must add up to
+
+    Returns:
+        - problems: list of "<side>: <reason>" str, empty when the sums are consistent
+    """
+    problems = []
+    for side, other in zip(SIDES, reversed(SIDES)):
+        sideTotals = totals.get(side)
+        if not sideTotals:
+            problems.append(f"{side}: no players")
+            continue
+        if sideTotals["minutesPlayed"] < minMinutes:
+            problems.append(f"{side}: minutes played below {minMinutes}")
+        if sideTotals["shotsTarget"] > sideTotals["shots"]:
+            problems.append(f"{side}: shots on target exceed shots")
+        if other in totals and sideTotals["saves"] > totals[other]["shotsTarget"]:
+            problems.append(f"{side}: saves exceed the opponent's shots on target")
+    return problems
+
+
+def toNumber(value):
+    """
+    Statistics item values are numbers or strings such as "5" or "55%"
+
+    Returns:
+        - value as an int, 0 when it cannot be converted
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        return int(float(value.rstrip("%")))
+    except (AttributeError, ValueError):
+        return 0
+
+
+class MatchStats():
+    """
+    Overall statistic of one match. Each match period (ALL, 1ST, 2ND, ...) is one fixed-size
+    int row with a home and an away column per STAT_FIELDS entry. Fields in missing were not
+    scraped (lean mode) and read as None
+    """
+    __slots__ = ("matchID", "home", "away", "home_country", "away_country", "date", "league",
+                 "event_id", "home_id", "away_id", "startTimestamp", "periods", "player_stats", "missing")
+
+    def __init__(self, matchInfo:dict) -> None:
+        """
+        Parameters:
+            - matchInfo: football match info, see Scraper.findMatchWithPlayerStat
+        """
+        self.matchID        = f"{matchInfo['customId']}_{matchInfo['id']}_{matchInfo['slug']}"
+        self.home           = matchInfo["home"]
+        self.away           = matchInfo["away"]
+        self.home_country   = matchInfo["home_country"]
+        self.away_country   = matchInfo["away_country"]
+        self.date           = datetime.utcfromtimestamp(matchInfo["startTimestamp"])
+        self.league         = matchInfo["league"]
+
+        # upstream ids, used to advance the teams' high-water marks once stored
+        self.event_id       = int(matchInfo["id"])
+        self.home_id        = matchInfo["home_id"]
+        self.away_id        = matchInfo["away_id"]
+        self.startTimestamp = matchInfo["startTimestamp"]
+
+        self.periods        = {}    # period -> array row
+        self.player_stats   = {}    # PlayerStatsView once the lineup is merged
+        self.missing        = ()    # STAT_FIELDS without a value
+
+    def newRow(self, period):
+        row = array("i", bytes(4 * len(COLUMNS)))
+        self.periods[period] = row
+        return row
+
+    def fillFromStatistics(self, eventStatistics):
+        """
+        Populate the period rows from a statistics payload using STAT_TABLE
+
+        Parameters:
+            - eventStatistics: payloads.EventStatistics record
+
+        Returns:
+            - True when enough of the REQUIRED_GROUPS were present
+        """
+        requiredInformationCount = 0
+        for periodStats in eventStatistics.statistics:
+            row = self.newRow(periodStats.period)
+            for group in periodStats.groups:
+                if group.groupName in REQUIRED_GROUPS:
+                    requiredInformationCount += 1
+
+                for item in group.statisticsItems:
+                    columns = ITEM_COLUMNS.get((group.groupName, item.name))
+                    if columns:
+                        row[columns[0]] = toNumber(item.home)
+                        row[columns[1]] = toNumber(item.away)
+
+        return requiredInformationCount >= REQUIREDINFORMATIONCOUNT
+
+    def fillFromPlayerStats(self, totals, cards=False):
+        """
+        Populate the full time row with the DERIVED_FIELDS summed from the lineups, and the
+        CARD_FIELDS when the players' cards are known. The other fields are missing and
+        there are no per half rows
+
+        Parameters:
+            - totals: {side: {player stat column: sum}}, see PlayerStatsView.totals
+            - cards: the players' cards were set from the incidents
+        """
+        fields = dict(DERIVED_FIELDS, **CARD_FIELDS) if cards else DERIVED_FIELDS
+        row = self.newRow(FULLTIME)
+        for side, sideTotals in totals.items():
+            for field, column in fields.items():
+                row[COLUMNS[(side, field)]] = sideTotals[column]
+        self.missing = frozenset(STAT_FIELDS).difference(fields)
+
+    def stat(self, field, side, period=FULLTIME):
+        """
+        Parameters:
+            - field: one of STAT_FIELDS
+            - side: "home" or "away"
+            - period: match period, default full time
+
+        Returns:
+            - the stat value, 0 if the period is missing, None if the field was not scraped
+        """
+        if field in self.missing:
+            return None
+        row = self.periods.get(period)
+        return row[COLUMNS[(side, field)]] if row is not None else 0
+
+    def __getitem__(self, key):
+        """
+        Legacy dict access, eg match["home"], match["home_yellowCards"] or match["1ST_away_fouls"]
+        """
+        attribute = INFO_KEYS.get(key)
+        if attribute:
+            return getattr(self, attribute)
+
+        period = FULLTIME
+        parts = key.split("_")
+        if len(parts) == 3:
+            period = parts.pop(0)
+        if len(parts) != 2 or parts[0] not in SIDES or parts[1] not in STAT_FIELDS or period not in self.periods:
+            raise KeyError(key)
+
+        return self.stat(parts[1], parts[0], period)
+
+    def toDict(self, playerStats=True):
+        """
+        Parameters:
+            - playerStats: include the player stats, see PlayerStatsView.toDict
+
+        Returns:
+            - the legacy flat dict of match info, "<PERIOD>_<side>_<field>" stats and player stats
+        """
+        data = {key: getattr(self, attribute) for key, attribute in INFO_KEYS.items()}
+        if not playerStats:
+            del data["player_stats"]
+        elif hasattr(self.player_stats, "toDict"):
+            data["player_stats"] = self.player_stats.toDict()
+        for period, row in self.periods.items():
+            prefix = "" if period == FULLTIME else f"{period}_"
+            for (side, field), column in COLUMNS.items():
+                data[f"{prefix}{side}_{field}"] = None if field in self.missing else row[column]
+        return data
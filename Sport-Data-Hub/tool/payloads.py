@@ -0,0 +1,203 @@
+"""
+Typed records for the Sofascore payloads the scraper consumes. Only the fields we read
+are declared, msgspec skips everything else while decoding so the large lineup and
+statistics payloads never become nested dicts.
+"""
+from typing import Optional, Union
+import msgspec
+
+SENTINELBIRTHEPOCH = -2208988800 # represents 1900-01-01
+
+
+class Country(msgspec.Struct):
+    name: str = "NA"
+
+
+class TeamRef(msgspec.Struct):
+    id: int
+    name: str
+    country: Optional[Country] = None
+
+
+class Status(msgspec.Struct):
+    type: str = ""
+
+
+class UniqueTournament(msgspec.Struct):
+    id: int = 0
+    hasEventPlayerStatistics: Optional[bool] = None
+
+
+class Tournament(msgspec.Struct):
+    name: str
+    uniqueTournament: Optional[UniqueTournament] = None
+
+
+class Season(msgspec.Struct):
+    id: int = 0
+
+
+class Event(msgspec.Struct):
+    id: int
+    customId: str = ""
+    slug: str = ""
+    startTimestamp: int = 0
+    status: Optional[Status] = None
+    homeTeam: Optional[TeamRef] = None
+    awayTeam: Optional[TeamRef] = None
+    tournament: Optional[Tournament] = None
+    season: Optional[Season] = None
+    hasEventPlayerStatistics: Optional[bool] = None
+    isAwarded: Optional[bool] = None
+
+
+class EventsPage(msgspec.Struct):
+    events: list[Event] = []
+    hasNextPage: bool = False
+
+
+class RawEventsPage(msgspec.Struct):
+    # events left undecoded so each one is decoded, and skipped, on its own
+    events: list[msgspec.Raw] = []
+    hasNextPage: bool = False
+
+
+class PlayerRef(msgspec.Struct):
+    id: int
+    name: str
+    country: Optional[Country] = None
+    dateOfBirthTimestamp: int = SENTINELBIRTHEPOCH
+
+
+class PlayerStatistics(msgspec.Struct):
+    minutesPlayed: int = 0
+    blockedScoringAttempt: int = 0
+    shotOffTarget: int = 0
+    onTargetScoringAttempt: int = 0
+    goalAssist: int = 0
+    goals: int = 0
+    fouls: int = 0
+    wasFouled: int = 0
+    saves: int = 0
+
+
+class LineupPlayer(msgspec.Struct):
+    player: PlayerRef
+    statistics: Optional[PlayerStatistics] = None
+
+
+class TeamLineup(msgspec.Struct):
+    players: list[LineupPlayer] = []
+
+
+class Lineups(msgspec.Struct):
+    home: Optional[TeamLineup] = None
+    away: Optional[TeamLineup] = None
+
+
+class StatisticsItem(msgspec.Struct):
+    name: str
+    home: Union[str, int, float] = 0
+    away: Union[str, int, float] = 0
+
+
+class StatisticsGroup(msgspec.Struct):
+    groupName: str
+    statisticsItems: list[StatisticsItem] = []
+
+
+class PeriodStatistics(msgspec.Struct):
+    period: str
+    groups: list[StatisticsGroup] = []
+
+
+class EventStatistics(msgspec.Struct):
+    statistics: list[PeriodStatistics] = []
+
+
+class IncidentPlayer(msgspec.Struct):
+    id: int
+
+
+class Incident(msgspec.Struct):
+    incidentType: str
+    incidentClass: Optional[str] = None     # card: yellow, yellowRed (second yellow) or red
+    player: Optional[IncidentPlayer] = None
+
+
+class EventIncidents(msgspec.Struct):
+    incidents: list[Incident] = []
+
+
+class PlayerTeam(msgspec.Struct):
+    name: str
+    country: Country
+
+
+class PlayerProfile(msgspec.Struct):
+    name: str
+    team: PlayerTeam
+    country: Country
+    dateOfBirthTimestamp: int = SENTINELBIRTHEPOCH
+
+
+class PlayerPayload(msgspec.Struct):
+    player: PlayerProfile
+
+
+# decoders are reusable and thread safe, build them once
+rawEventsPageDecoder    = msgspec.json.Decoder(RawEventsPage)
+eventDecoder            = msgspec.json.Decoder(Event)
+lineupsDecoder          = msgspec.json.Decoder(Lineups)
+eventStatisticsDecoder  = msgspec.json.Decoder(EventStatistics)
+eventIncidentsDecoder   = msgspec.json.Decoder(EventIncidents)
+playerDecoder           = msgspec.json.Decoder(PlayerPayload)
+
+
+def decodeEventsPage(content:bytes, logger=None) -> EventsPage:
+    """
+    Decode a scheduled-events or team events/last page. Events are decoded one at a
+    time, an event that does not fit Event (eg a required field missing on a cancelled
+    match) is left out and logged instead of failing the whole page
+
+    Parameters:
+        - content: response body
+        - logger (or None): logger used to record the events left out
+    """
+    page = rawEventsPageDecoder.decode(content)
+    events = []
+    for rawEvent in page.events:
+        try:
+            events.append(eventDecoder.decode(rawEvent))
+        except msgspec.ValidationError as e:
+            if logger is not None:
+                logger.error(f"skipping event that cannot be decoded: {e}")
+    return EventsPage(events, page.hasNextPage)
+
+
+def decodeLineups(content:bytes) -> Lineups:
+    """
+    Decode an event/{id}/lineups payload
+    """
+    return lineupsDecoder.decode(content)
+
+
+def decodeEventStatistics(content:bytes) -> EventStatistics:
+    """
+    Decode an event/{id}/statistics payload
+    """
+    return eventStatisticsDecoder.decode(content)
+
+
+def decodeEventIncidents(content:bytes) -> EventIncidents:
+    """
+    Decode an event/{id}/incidents payload
+    """
+    return eventIncidentsDecoder.decode(content)
+
+
+def decodePlayer(content:bytes) -> PlayerProfile:
+    """
+    Decode a player/{id} payload
+    """
+    return playerDecoder.decode(content).player
@@ -0,0 +1,229 @@
+import sys
+from array import array
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+SIDES = ("home", "away")
+
+# column name -> legacy player stat dict key
+PLAYER_STAT_FIELDS = {
+    "minutesPlayed": "minutesPlayed",
+    "shots": "shot made",
+    "shotsTarget": "shot on target",
+    "assists": "assist",
+    "goals": "goal scored",
+    "fouls": "fouls",
+    "foulsWon": "foul won (was fouled)",
+    "saves": "shot saved",
+    "yellowCards": "yellow cards",  # from the incidents, see PlayerStatsView.setCards
+    "redCards": "red cards",
+}
+
+
+class PlayerStatsBatch():
+    """
+    Columnar store of the player stats of every match scraped in a run. Each player of a
+    match is one row across array-backed columns, names and countries are interned and
+    match ids are stored once per match instead of once per player
+    """
+    def __init__(self) -> None:
+        self.matchIDs   = []            # match row -> match id ("customId_id_slug")
+        self.spans      = []            # match row -> (first player row, last player row + 1)
+
+        self.matchRow   = array("I")
+        self.side       = array("b")    # index into SIDES
+        self.playerID   = array("q")
+        self.starting   = array("b")
+        self.birthDay   = array("i")    # days since 1970-01-01, negative before
+        self.names      = []
+        self.countries  = []
+        self.stats      = {field: array("i") for field in PLAYER_STAT_FIELDS}
+
+    def __len__(self):
+        return len(self.playerID)
+
+    def addMatch(self, matchID, players):
+        """
+        Append every player of a match at once so a match's rows are contiguous
+
+        Parameters:
+            - matchID: match id string
+            - players: list of (side, player id, name, country, birth timestamp, is starting, stats dict)
+            with stats keyed by PLAYER_STAT_FIELDS
+
+        Returns:
+            - PlayerStatsView of the match
+        """
+        row = len(self.matchIDs)
+        start = len(self.playerID)
+        self.matchIDs.append(matchID)
+
+        for side, playerID, name, country, birthTimestamp, starting, stats in players:
+            self.matchRow.append(row)
+            self.side.append(SIDES.index(side))
+            self.playerID.append(playerID)
+            self.starting.append(starting)
+            self.birthDay.append(birthTimestamp // 86400)
+            self.names.append(sys.intern(name))
+            self.countries.append(sys.intern(country))
+            for field, column in self.stats.items():
+                column.append(stats[field])
+
+        self.spans.append((start, len(self.playerID)))
+        return PlayerStatsView(self, row)
+
+    def birthDate(self, i):
+        """
+        Returns:
+            - birth date of player row i as a datetime at midnight, as used for the player id mapping
+        """
+        return EPOCH + timedelta(days=self.birthDay[i])
+
+    def legacyDict(self, i):
+        """
+        Returns:
+            - the player stat dict of row i as built by the scraper before the batch existed
+        """
+        player = {
+            "match id": self.matchIDs[self.matchRow[i]],
+            "player id": self.playerID[i],
+            "is starting player": bool(self.starting[i]),
+            "country": self.countries[i],
+            "birth_date": self.birthDate(i),
+        }
+        for field, key in PLAYER_STAT_FIELDS.items():
+            player[key] = self.stats[field][i]
+        return player
+
+    def toDBRows(self, matchRow, matchDBID, playerToIDDict):
+        """
+        Build the PlayerStats rows of one match for a bulk insert
+
+        Parameters:
+            - matchRow: match row in the batch
+            - matchDBID: db ID of the inserted match
+            - playerToIDDict: mapping dict of Sofascore player id to its db ID
+
+        Returns:
+            - rows: list of dict keyed by PlayerStats column name
+        """
+        start, end = self.spans[matchRow]
+        stats = self.stats
+        return [
+            {
+                "match_id": matchDBID,
+                "player_id": playerToIDDict[self.playerID[i]],
+                "goals_scored": stats["goals"][i],
+                "assists": stats["assists"][i],
+                "shots": stats["shots"][i],
+                "shots_target": stats["shotsTarget"][i],
+                "fouls_committed": stats["fouls"][i],
+                "fouls_won": stats["foulsWon"][i],
+                "yellow_cards": stats["yellowCards"][i],
+                "red_cards": stats["redCards"][i],
+            }
+            for i in range(start, end)
+        ]
+
+    def toColumns(self, matchRows=None):
+        """
+        Parameters:
+            - matchRows (or None): match rows whose players are included, default every match
+
+        Returns:
+            - dict of column name -> list, the players in a JSON friendly columnar layout
+        """
+        if matchRows is None:
+            rows = range(len(self))
+        else:
+            rows = [i for matchRow in matchRows for i in range(*self.spans[matchRow])]
+
+        columns = {
+            "match id": [self.matchIDs[self.matchRow[i]] for i in rows],
+            "side": [SIDES[self.side[i]] for i in rows],
+            "player id": [self.playerID[i] for i in rows],
+            "player name": [self.names[i] for i in rows],
+            "country": [self.countries[i] for i in rows],
+            "birth_date": [self.birthDate(i).isoformat() for i in rows],
+            "is starting player": [bool(self.starting[i]) for i in rows],
+        }
+        for field, key in PLAYER_STAT_FIELDS.items():
+            column = self.stats[field]
+            columns[key] = [column[i] for i in rows]
+        return columns
+
+
+class PlayerStatsView():
+    """
+    Read-only view of one match's players in a PlayerStatsBatch. Iterates like the legacy
+    {"home"/"away": {player name: player stat dict}} mapping without storing those dicts
+    """
+    __slots__ = ("batch", "matchRow")
+
+    def __init__(self, batch:PlayerStatsBatch, matchRow:int) -> None:
+        self.batch      = batch
+        self.matchRow   = matchRow
+
+    def __len__(self):
+        start, end = self.batch.spans[self.matchRow]
+        return end - start
+
+    def __getitem__(self, side):
+        """
+        Legacy dict access, eg match["player_stats"]["home"]
+        """
+        players = dict(self.items()).get(side)
+        if players is None:
+            raise KeyError(side)
+        return players
+
+    def items(self):
+        """
+        Yields:
+            - (side, {player name: player stat dict}) for the home then the away team
+        """
+        start, end = self.batch.spans[self.matchRow]
+        for sideIndex, side in enumerate(SIDES):
+            players = {
+                self.batch.names[i]: self.batch.legacyDict(i)
+                for i in range(start, end) if self.batch.side[i] == sideIndex
+            }
+            if players:
+                yield side, players
+
+    def toDict(self):
+        return dict(self.items())
+
+    def setCards(self, cards):
+        """
+        Record the cards of the match's players
+
+        Parameters:
+            - cards: dict of player id -> (yellow cards, red cards), see Scraper.parseMatchCards
+        """
+        start, end = self.batch.spans[self.matchRow]
+        yellowCards = self.batch.stats["yellowCards"]
+        redCards = self.batch.stats["redCards"]
+        for i in range(start, end):
+            yellow, red = cards.get(self.batch.playerID[i], (0, 0))
+            yellowCards[i] = yellow
+            redCards[i] = red
+
+    def totals(self):
+        """
+        Returns:
+            - {side: {stat column: sum over the side's players}}, sides without players are left out
+        """
+        start, end = self.batch.spans[self.matchRow]
+        totals = {}
+        for i in range(start, end):
+            sideTotals = totals.setdefault(SIDES[self.batch.side[i]], dict.fromkeys(PLAYER_STAT_FIELDS, 0))
+            for field, column in self.batch.stats.items():
+                sideTotals[field] += column[i]
+        return totals
+
+    def toDBRows(self, matchDBID, playerToIDDict):
+        """
+        See PlayerStatsBatch.toDBRows
+        """
+        return self.batch.toDBRows(self.matchRow, matchDBID, playerToIDDict)
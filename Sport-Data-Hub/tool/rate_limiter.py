@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+from tool import request_budget
+
+
+class TokenBucket():
+    """
+    Token bucket limiting the request rate. take() reserves a token and returns how long
+    the caller has to wait for it, so concurrent callers are served in arrival order.
+    """
+    def __init__(self, rate:float, burst:int) -> None:
+        """
+        Parameters:
+            - rate: tokens (requests) added per second
+            - burst: maximum number of tokens the bucket holds
+        """
+        self.rate       = rate
+        self.burst      = burst
+        self.tokens     = float(burst)
+        self.updated    = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        """
+        Reserve one token
+
+        Returns:
+            - wait: seconds to wait before the reserved token is available
+        """
+        self.refill()
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    def setRate(self, rate:float):
+        self.refill()
+        self.rate = rate
+
+
+class AdaptiveRateLimiter():
+    """
+    Shared limiter for every scraper request: a token bucket for the request rate plus an
+    adaptive concurrency limit using additive increase / multiplicative decrease. Healthy
+    responses slowly raise the concurrency and the rate, blocking responses (403/429/5xx)
+    cut both and pause new requests for a cooldown. One limiter is shared by the event
+    loops of several threads (each Django request thread runs its own asyncio.run), so its
+    state is guarded by a threading lock and waiting for a slot polls instead of relying
+    on asyncio primitives bound to one loop.
+    """
+    def __init__(self, rate:float, burst:int, minRate:float, maxRate:float, rateIncrease:float,
+                 concurrency:int, minConcurrency:int, maxConcurrency:int,
+                 decreaseFactor:float, backoffStatuses:set, cooldown:float, budget=None, pollInterval=0.01) -> None:
+        """
+        Parameters:
+            - rate: initial requests per second
+            - burst: token bucket size
+            - minRate/maxRate: bounds of the adaptive request rate
+            - rateIncrease: requests per second added after every healthy window
+            - concurrency: initial number of requests allowed in flight
+            - minConcurrency/maxConcurrency: bounds of the adaptive concurrency
+            - decreaseFactor: multiplier applied to rate and concurrency on backoff
+            - backoffStatuses: status codes (besides 5xx) treated as the upstream pushing back
+            - cooldown: seconds new requests are paused after a backoff
+            - budget (or None): global request budget shared with other processes, see request_budget
+            - pollInterval: seconds between two tries for a concurrency slot
+        """
+        self.bucket             = TokenBucket(rate, burst)
+        self.minRate            = minRate
+        self.maxRate            = maxRate
+        self.rateIncrease       = rateIncrease
+        self.concurrency        = concurrency
+        self.minConcurrency     = minConcurrency
+        self.maxConcurrency     = maxConcurrency
+        self.decreaseFactor     = decreaseFactor
+        self.backoffStatuses    = backoffStatuses
+        self.cooldown           = cooldown
+        self.budget             = budget
+        self.pollInterval       = pollInterval
+
+        self.inFlight       = 0
+        self.healthyStreak  = 0         # healthy responses since the last adjustment
+        self.pausedUntil    = 0.0       # monotonic time before which no request may start
+        self.backoffs       = 0
+        self.increases      = 0
+        self.lock           = threading.Lock()
+
+    @classmethod
+    def fromConfig(cls, config):
+        """
+        Build a limiter from the scrape_config module
+        """
+        return cls(
+            rate=config.REQUEST_RATE,
+            burst=config.REQUEST_BURST,
+            minRate=config.MIN_REQUEST_RATE,
+            maxRate=config.MAX_REQUEST_RATE,
+            rateIncrease=config.REQUEST_RATE_INCREASE,
+            concurrency=config.QUEUE_SLOTS,
+            minConcurrency=config.MIN_CONCURRENCY,
+            maxConcurrency=config.MAX_CONCURRENCY,
+            decreaseFactor=config.BACKOFF_FACTOR,
+            backoffStatuses=set(config.BACKOFF_STATUSES),
+            cooldown=config.BACKOFF_COOLDOWN,
+            budget=request_budget.fromConfig(config),
+        )
+
+    def tryEnter(self):
+        """
+        Returns:
+            - True when a concurrency slot was taken
+        """
+        with self.lock:
+            if self.inFlight < self.concurrency:
+                self.inFlight += 1
+                return True
+        return False
+
+    async def acquire(self):
+        """
+        Wait for a concurrency slot, a rate token and a token of the global budget.
+        Must be paired with release()
+        """
+        while not self.tryEnter():
+            await asyncio.sleep(self.pollInterval)
+
+        # the slot is taken before waiting, give it back if the caller is cancelled meanwhile
+        try:
+            while True:
+                pause = self.pausedUntil - time.monotonic()
+                if pause <= 0:
+                    break
+                await asyncio.sleep(pause)
+
+            with self.lock:
+                wait = self.bucket.take()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            # the adaptive rate is this process' share, the global budget caps every process together
+            if self.budget is not None:
+                wait = self.budget.take()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+        except BaseException:
+            with self.lock:
+                self.inFlight = max(0, self.inFlight - 1)
+            raise
+
+    async def release(self, statusCode=None, retryAfter=None):
+        """
+        Give back the concurrency slot and adapt to the response
+
+        Parameters:
+            - statusCode: response status code, None when the request raised
+            - retryAfter: seconds requested by the upstream Retry-After header, if any
+        """
+        with self.lock:
+            if self.isBackoff(statusCode):
+                self.backoff(retryAfter)
+            else:
+                self.healthy()
+            self.inFlight = max(0, self.inFlight - 1)
+
+    def isBackoff(self, statusCode):
+        return statusCode is None or statusCode in self.backoffStatuses or statusCode >= 500
+
+    def healthy(self):
+        """
+        Additive increase once a full window (current concurrency) of healthy responses
+        arrived, called with the lock held
+        """
+        self.healthyStreak += 1
+        if self.healthyStreak >= self.concurrency:
+            self.healthyStreak = 0
+            self.concurrency = min(self.maxConcurrency, self.concurrency + 1)
+            self.bucket.setRate(min(self.maxRate, self.bucket.rate + self.rateIncrease))
+            self.increases += 1
+
+    def backoff(self, retryAfter=None):
+        """
+        Multiplicative decrease, at most once per cooldown so a burst of failures from
+        requests already in flight only counts once, called with the lock held
+        """
+        self.healthyStreak = 0
+        now = time.monotonic()
+        if now < self.pausedUntil:
+            return
+
+        self.concurrency = max(self.minConcurrency, int(self.concurrency * self.decreaseFactor))
+        self.bucket.setRate(max(self.minRate, self.bucket.rate * self.decreaseFactor))
+        self.pausedUntil = now + max(self.cooldown, retryAfter or 0)
+        self.backoffs += 1
+
+    def stats(self):
+        """
+        Returns:
+            - dict of the current limiter state and counters
+        """
+        return {
+            "rate": round(self.bucket.rate, 3),
+            "concurrency": self.concurrency,
+            "in_flight": self.inFlight,
+            "backoffs": self.backoffs,
+            "increases": self.increases,
+        }
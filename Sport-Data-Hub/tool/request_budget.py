@@ -0,0 +1,130 @@
+"""
+Global request budget shared by every scraper process, a token bucket whose state lives
+outside the process so several workers (or machines) stay within one request rate
+against the upstream. Each backend has the same take() as rate_limiter.TokenBucket.
+"""
+import os
+import struct
+import time
+
+LOCAL = "local"     # no shared budget, each process only has its own limiter
+FILE = "file"       # processes of one machine, state in a locked file
+REDIS = "redis"     # any Redis-compatible server, for workers on several machines
+
+
+class FileBudget():
+    """
+    Token bucket stored in a small file and updated under an exclusive flock, so every
+    process of the machine that opens the same path draws from the same tokens
+    """
+    STATE = struct.Struct("dd")     # tokens, updated (unix time)
+
+    def __init__(self, path, rate:float, burst:int) -> None:
+        """
+        Parameters:
+            - path: state file shared by the processes
+            - rate: requests per second allowed for all processes together
+            - burst: maximum number of tokens the bucket holds
+        """
+        import fcntl    # not available on Windows
+        self.fcntl  = fcntl
+        self.path   = path
+        self.rate   = rate
+        self.burst  = burst
+        self.fd     = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def take(self):
+        """
+        Reserve one token
+
+        Returns:
+            - wait: seconds to wait before the reserved token is available
+        """
+        self.fcntl.flock(self.fd, self.fcntl.LOCK_EX)
+        try:
+            now = time.time()
+            data = os.pread(self.fd, self.STATE.size, 0)
+            tokens, updated = self.STATE.unpack(data) if len(data) == self.STATE.size else (float(self.burst), now)
+
+            tokens = min(self.burst, tokens + max(0.0, now - updated) * self.rate) - 1
+            os.pwrite(self.fd, self.STATE.pack(tokens, now), 0)
+        finally:
+            self.fcntl.flock(self.fd, self.fcntl.LOCK_UN)
+
+        return 0.0 if tokens >= 0 else -tokens / self.rate
+
+    def close(self):
+        os.close(self.fd)
+
+
+class RedisBudget():
+    """
+    Token bucket kept in a Redis hash and updated by a Lua script, so the reservation is
+    atomic for every worker using the same key. The server clock is used so workers on
+    different machines agree on the refill
+    """
+    SCRIPT = """
+        local rate = tonumber(ARGV[1])
+        local burst = tonumber(ARGV[2])
+        local clock = redis.call('TIME')
+        local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+        local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+        local tokens = tonumber(state[1]) or burst
+        local updated = tonumber(state[2]) or now
+        tokens = math.min(burst, tokens + math.max(0, now - updated) * rate) - 1
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+        redis.call('EXPIRE', KEYS[1], 3600)
+        if tokens >= 0 then
+            return '0'
+        end
+        return tostring(-tokens / rate)
+    """
+
+    def __init__(self, url, key, rate:float, burst:int) -> None:
+        """
+        Parameters:
+            - url: server url, eg redis://localhost:6379/0
+            - key: hash holding the bucket, workers sharing a budget use the same key
+            - rate: requests per second allowed for all workers together
+            - burst: maximum number of tokens the bucket holds
+        """
+        try:
+            import redis
+        except ImportError as e:
+            raise ImportError("the redis request budget needs the redis package (pip install redis)") from e
+
+        self.key    = key
+        self.rate   = rate
+        self.burst  = burst
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self):
+        """
+        Reserve one token
+
+        Returns:
+            - wait: seconds to wait before the reserved token is available
+        """
+        return float(self.script(keys=[self.key], args=[self.rate, self.burst]))
+
+    def close(self):
+        self.client.close()
+
+
+def fromConfig(config):
+    """
+    Build the budget selected by REQUEST_BUDGET_BACKEND in the scrape_config module
+
+    Returns:
+        - FileBudget, RedisBudget, or None for the local backend
+    """
+    backend = config.REQUEST_BUDGET_BACKEND
+    if backend == LOCAL:
+        return None
+    if backend == FILE:
+        return FileBudget(config.REQUEST_BUDGET_PATH, config.REQUEST_BUDGET_RATE, config.REQUEST_BUDGET_BURST)
+    if backend == REDIS:
+        return RedisBudget(config.REQUEST_BUDGET_REDIS_URL, config.REQUEST_BUDGET_KEY,
+                           config.REQUEST_BUDGET_RATE, config.REQUEST_BUDGET_BURST)
+    raise ValueError(f"unknown request budget backend {backend}")
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import zlib
+import logging
+
+
+class CachedResponse():
+    """
+    Minimal stand-in for a requests response that is served from the
+    local response cache instead of the network
+    """
+    def __init__(self, url, content:bytes, status_code=200) -> None:
+        self.url            = url
+        self.content        = content
+        self.status_code    = status_code
+        self.headers        = {}
+        self.from_cache     = True
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ResponseCache():
+    """
+    Persistent SQLite store for raw API responses keyed by the sha256 of the
+    request URL. Each URL family has its own freshness rule so finished match
+    payloads are kept forever while schedule and team history pages expire quickly.
+    """
+    def __init__(self, path, maxBytes:int, freshnessRules:list, logger:logging.Logger, refresh=False) -> None:
+        """
+        Parameters:
+            - path: sqlite file used to store the responses
+            - maxBytes: maximum size of the stored (compressed) bodies before evicting
+            - freshnessRules: list of (url regex, finished ttl, default ttl), ttl in seconds,
+            None means never expires and 0 means never cache
+            - logger: logger used to record cache failures
+            - refresh: when True, reads are bypassed but fresh responses are still stored
+        """
+        self.path       = path
+        self.maxBytes   = maxBytes
+        self.rules      = [(re.compile(pattern), finishedTTL, defaultTTL) for pattern, finishedTTL, defaultTTL in freshnessRules]
+        self.logger     = logger
+        self.refresh    = refresh
+
+        # counters for the end of run summary
+        self.hits       = 0
+        self.misses     = 0
+        self.bypassed   = 0
+        self.stores     = 0
+        self.evictions  = 0
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                expires_at REAL,
+                accessed_at REAL NOT NULL
+            )"""
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self.connection.commit()
+        self.totalBytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def freshnessFor(self, url, finished=False):
+        """
+        Look up how long a response for url stays fresh
+
+        Parameters:
+            - url: request url
+            - finished: whether the url belongs to an event that has finished
+
+        Returns:
+            - ttl in seconds, None for never expires, 0 when the url should not be cached
+        """
+        for pattern, finishedTTL, defaultTTL in self.rules:
+            if pattern.search(url):
+                return finishedTTL if finished else defaultTTL
+        return 0
+
+    def get(self, url, finished=False):
+        """
+        Get the stored response body for url
+
+        Parameters:
+            - url: request url
+            - finished: whether the url belongs to an event that has finished
+
+        Returns:
+            - body (bytes) when there is a fresh entry, None otherwise
+        """
+        if self.freshnessFor(url, finished) == 0:
+            return None
+
+        if self.refresh:
+            self.bypassed += 1
+            return None
+
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        now = time.time()
+        try:
+            with self.lock:
+                row = self.connection.execute(
+                    "SELECT body, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+
+                if row is None or (row[1] is not None and row[1] <= now):
+                    self.misses += 1
+                    return None
+
+                self.connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                self.connection.commit()
+                self.hits += 1
+
+            return zlib.decompress(row[0])
+
+        except Exception as e:
+            self.logger.error(f"failed to read response cache for {url}: {repr(e)}")
+            self.misses += 1
+            return None
+
+    def put(self, url, content:bytes, finished=False):
+        """
+        Store a successful response body for url if its freshness rule allows it
+
+        Parameters:
+            - url: request url
+            - content: raw response body
+            - finished: whether the url belongs to an event that has finished
+        """
+        ttl = self.freshnessFor(url, finished)
+        if ttl == 0:
+            return
+
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        now = time.time()
+        expiresAt = None if ttl is None else now + ttl
+        body = zlib.compress(content)
+
+        try:
+            with self.lock:
+                previous = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                if previous:
+                    self.totalBytes -= previous[0]
+
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, url, body, size, stored_at, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, url, body, len(body), now, expiresAt, now)
+                )
+                self.totalBytes += len(body)
+                self.stores += 1
+
+                if self.totalBytes > self.maxBytes:
+                    self.evict()
+
+                self.connection.commit()
+
+        except Exception as e:
+            self.logger.error(f"failed to write response cache for {url}: {repr(e)}")
+
+    def evict(self):
+        """
+        Drop expired entries first, then the least recently used entries until the
+        store is back under 90% of maxBytes. Caller must hold self.lock
+        """
+        now = time.time()
+        expired = self.connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+        ).fetchone()
+        self.connection.execute("DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        self.evictions += expired[0]
+        self.totalBytes -= expired[1]
+
+        target = int(self.maxBytes * 0.9)
+        if self.totalBytes <= target:
+            return
+
+        removeKeys = []
+        for key, size in self.connection.execute("SELECT key, size FROM responses ORDER BY accessed_at"):
+            if self.totalBytes <= target:
+                break
+            removeKeys.append((key,))
+            self.totalBytes -= size
+
+        self.connection.executemany("DELETE FROM responses WHERE key = ?", removeKeys)
+        self.evictions += len(removeKeys)
+
+    def stats(self):
+        """
+        Returns:
+            - dict of the cache counters
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": self.totalBytes,
+        }
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
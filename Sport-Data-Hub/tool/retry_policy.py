@@ -0,0 +1,182 @@
+import asyncio
+import random
+import time
+
+
+class RetryPolicy():
+    """
+    Decide whether a failed request is retried and how long to wait before the retry.
+    Rules are per status class ("error" for connection errors and timeouts, "429", "5xx",
+    ...), waits grow exponentially with full jitter so retries of concurrent requests do
+    not arrive together.
+    """
+    def __init__(self, rules:dict, baseDelay:float, maxDelay:float, timeout:float) -> None:
+        """
+        Parameters:
+            - rules: status class -> number of retries allowed
+            - baseDelay: upper bound of the first retry wait in seconds, doubled on every attempt
+            - maxDelay: upper bound of a single retry wait
+            - timeout: per request timeout in seconds
+        """
+        self.rules      = rules
+        self.baseDelay  = baseDelay
+        self.maxDelay   = maxDelay
+        self.timeout    = timeout
+
+        self.retries    = {}    # status class -> retries done
+
+    @classmethod
+    def fromConfig(cls, config):
+        """
+        Build a policy from the scrape_config module
+        """
+        return cls(
+            rules=dict(config.RETRY_RULES),
+            baseDelay=config.RETRY_BASE_DELAY,
+            maxDelay=config.RETRY_MAX_DELAY,
+            timeout=config.REQUEST_TIMEOUT,
+        )
+
+    def statusClass(self, statusCode):
+        """
+        Returns:
+            - the rule key of statusCode: "error" when None, the exact code when it has its own
+            rule, otherwise its class such as "5xx"
+        """
+        if statusCode is None:
+            return "error"
+        if str(statusCode) in self.rules:
+            return str(statusCode)
+        return f"{statusCode // 100}xx"
+
+    def shouldRetry(self, statusCode, attempt):
+        """
+        Parameters:
+            - statusCode: response status code, None when the request raised
+            - attempt: number of retries already done for the request
+
+        Returns:
+            - True when the request should be sent again
+        """
+        if statusCode is not None and statusCode < 400:
+            return False
+        return attempt < self.rules.get(self.statusClass(statusCode), 0)
+
+    def delay(self, statusCode, attempt, retryAfter=None):
+        """
+        Wait before retry number attempt + 1 and count the retry
+
+        Parameters:
+            - statusCode: status code that failed
+            - attempt: number of retries already done for the request
+            - retryAfter: seconds requested by the upstream Retry-After header, if any
+
+        Returns:
+            - seconds to wait
+        """
+        statusClass = self.statusClass(statusCode)
+        self.retries[statusClass] = self.retries.get(statusClass, 0) + 1
+
+        delay = random.uniform(0, min(self.maxDelay, self.baseDelay * 2 ** attempt))
+        return max(delay, retryAfter or 0)
+
+    def stats(self):
+        """
+        Returns:
+            - dict of retries done per status class
+        """
+        return dict(self.retries)
+
+
+class CircuitBreaker():
+    """
+    Host level circuit breaker. After threshold consecutive blocking responses from a host
+    its circuit opens and every request to it waits, pausing the pipeline instead of
+    hammering an upstream that blocks us. Once the open period ends a request is let
+    through as a probe, a single further failure opens the circuit again.
+    """
+    def __init__(self, threshold:int, openSeconds:float) -> None:
+        """
+        Parameters:
+            - threshold: consecutive failures that open the circuit of a host
+            - openSeconds: how long the circuit stays open
+        """
+        self.threshold      = threshold
+        self.openSeconds    = openSeconds
+
+        self.failures   = {}    # host -> consecutive failures
+        self.openUntil  = {}    # host -> monotonic time the circuit closes to a probe
+        self.trips      = 0
+
+    @classmethod
+    def fromConfig(cls, config):
+        """
+        Build a breaker from the scrape_config module
+        """
+        return cls(threshold=config.CIRCUIT_THRESHOLD, openSeconds=config.CIRCUIT_OPEN_SECONDS)
+
+    def remaining(self, host):
+        """
+        Returns:
+            - seconds the circuit of host stays open, 0 when requests may go through
+        """
+        return max(0.0, self.openUntil.get(host, 0.0) - time.monotonic())
+
+    async def wait(self, host):
+        """
+        Wait while the circuit of host is open
+        """
+        while True:
+            pause = self.remaining(host)
+            if pause <= 0:
+                return
+            await asyncio.sleep(pause)
+
+    def waitSync(self, host):
+        """
+        Blocking version of wait
+        """
+        while True:
+            pause = self.remaining(host)
+            if pause <= 0:
+                return
+            time.sleep(pause)
+
+    def record(self, host, failed):
+        """
+        Record the outcome of a request to host
+
+        Parameters:
+            - host: request host
+            - failed: whether the upstream pushed back (blocking status, 5xx or connection error)
+
+        Returns:
+            - True when this outcome opened the circuit
+        """
+        if not failed:
+            self.failures[host] = 0
+            return False
+
+        # failures of requests that were in flight while the circuit opened are not counted
+        if self.remaining(host) > 0:
+            return False
+
+        self.failures[host] = self.failures.get(host, 0) + 1
+        if self.failures[host] < self.threshold:
+            return False
+
+        self.openUntil[host] = time.monotonic() + self.openSeconds
+        # half open: the probe after the open period reopens the circuit on failure
+        self.failures[host] = self.threshold - 1
+        self.trips += 1
+        return True
+
+    def stats(self):
+        """
+        Returns:
+            - dict of the breaker counters
+        """
+        return {
+            "trips": self.trips,
+            "open_hosts": [host for host in self.openUntil if self.remaining(host) > 0],
+        }
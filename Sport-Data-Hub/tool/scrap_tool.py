@@ -1,7 +1,8 @@
 from http.client import HTTPException
+from bisect import bisect_right
 import re
+from urllib.parse import urlsplit
 from datetime import datetime, timedelta
-from time import localtime, strftime
 import json
 import os
 from requests_html import HTMLSession, AsyncHTMLSession
@@ -10,7 +11,17 @@ import asyncio
 import webbrowser
 import logging
 from tool import scrape_config
+from tool.response_cache import ResponseCache, CachedResponse
+from tool.rate_limiter import AdaptiveRateLimiter
+from tool.retry_policy import RetryPolicy, CircuitBreaker
+from tool.scrape_metrics import ScrapeMetrics
+from tool.tracing import Tracer
+from tool import payloads
+from tool.payloads import SENTINELBIRTHEPOCH
+from tool.match_stats import MatchStats, checkDerivedTotals
+from tool.player_stats_batch import PlayerStatsBatch
 import random
+import time
 
 # Dictionary mapping status codes to messages
 STATUS_MESSAGES = {
@@ -27,28 +38,274 @@ STATUS_MESSAGES = {
     503: "Service Unavailable",
 }
 MAXSTARTINGPLAYER = 11
-SENTINELBIRTHEPOCH = -2208988800 # represents 1900-01-01
 
 class Scraper():
     """
     Scraper class used to scrape soccer data
     """
-    def __init__(self, logger:logging.Logger) -> None:
+    def __init__(self, logger:logging.Logger, refreshCache=False) -> None:
+        """
+        Parameters:
+            - logger: logger used to record scraping failures
+            - refreshCache: when True, cached responses are ignored and refetched (forced refresh)
+        """
         self.session            = HTMLSession()
-        self.APIURL             = "https://www.sofascore.com/api/v1/"
+        self.setAPIURL("https://www.sofascore.com/api/v1/")
+        self.logger = logger
+
+        # shared by every request made by this scraper
+        self.limiter = AdaptiveRateLimiter.fromConfig(scrape_config)
+        self.retryPolicy = RetryPolicy.fromConfig(scrape_config)
+        self.breaker = CircuitBreaker.fromConfig(scrape_config)
+        self.metrics = ScrapeMetrics()
+        self.tracer = Tracer.fromConfig(scrape_config, logger)
+
+        self.cache = None
+        if scrape_config.CACHE_ENABLED:
+            self.cache = ResponseCache(scrape_config.CACHE_PATH, scrape_config.CACHE_MAX_BYTES,
+                                       scrape_config.CACHE_FRESHNESS, logger, refresh=refreshCache)
+
+        self.cassette = None
+
+        # KnownEvents set by the caller, events already stored in the db are not fetched
+        self.knownEvents = None
+
+        # lean mode: team totals are summed from the lineups, event statistics are only
+        # fetched for the matches that need them
+        self.lean = scrape_config.LEAN_MODE
+        self.leanCounts = {"derived": 0, "statistics": 0}
+
+    def setAPIURL(self, apiURL):
+        """
+        Point every endpoint at apiURL, eg a local fake upstream for benchmarks
+        """
+        self.APIURL             = apiURL
         self.SCHEDULEMATCHURL   = f"{self.APIURL}sport/football/scheduled-events/"
         self.EVENTURL           = f"{self.APIURL}event/"
         self.TEAMURL            = f"{self.APIURL}team/"
         self.PLAYERURL          = f"{self.APIURL}player/"
-        self.logger = logger
+        self.TOURNAMENTURL      = f"{self.APIURL}unique-tournament/"
+
+    def useCassette(self, cassette):
+        """
+        Record every network response into cassette, or serve every request from it
+        when it is in replay mode (no network, no rate limiting or humanizing delay)
+
+        Parameters:
+            - cassette: tool.cassette.Cassette, None to go back to normal requests
+        """
+        self.cassette = cassette
+
+    def cacheEnabled(self):
+        # recording bypasses the cache so every response ends up in the cassette
+        return self.cache is not None and self.cassette is None
+
+    async def fetchURL(self, asession, url, finished=False, humanize=True, headers=None):
+        """
+        Request url with the async session, serving it from the response cache when
+        a fresh copy exists. Network requests are paced by the shared rate limiter,
+        failures are retried following the retry policy and requests to a host wait
+        while its circuit is open.
+
+        Parameters:
+            - asession: a AsyncHTMLSession
+            - url: request url
+            - finished: whether the url belongs to a finished event (immutable payload)
+            - humanize: add a random DELAY_RANGE jitter once the rate limiter grants the request
+            - headers: request headers, default scrape_config.HEADERS
+
+        Returns:
+            - response: requests response or CachedResponse
+        """
+        if self.cassette and self.cassette.replaying:
+            return await self.cassette.replay(url)
+
+        if self.cacheEnabled():
+            content = self.cache.get(url, finished)
+            if content is not None:
+                self.metrics.recordCacheHit(url)
+                return CachedResponse(url, content)
+
+        host = urlsplit(url).netloc
+        with self.tracer.span("GET", url=url) as span:
+            attempt = 0
+            while True:
+                waitStart = time.perf_counter()
+                await self.breaker.wait(host)
+                await self.limiter.acquire()
+                self.metrics.recordWait(url, time.perf_counter() - waitStart)
+                response = None
+                error = None
+                statusCode = None
+                retryAfter = None
+                requestStart = time.perf_counter()
+                try:
+                    if humanize:
+                        delay = random.uniform(scrape_config.DELAY_RANGE[0],scrape_config.DELAY_RANGE[1])
+                        await asyncio.sleep(delay)
+                        self.metrics.recordDelay(url, delay)
+
+                    requestStart = time.perf_counter()
+                    response = await asession.get(url, stream=True, headers=scrape_config.HEADERS if headers is None else headers,
+                                                  timeout=self.retryPolicy.timeout)
+                    latency = time.perf_counter() - requestStart
+                    statusCode = response.status_code
+                    retryAfter = self.retryAfter(response)
+                    self.metrics.recordRequest(url, statusCode, latency, len(response.content))
+
+                # connection errors and timeouts go through the retry policy as status None
+                except Exception as e:
+                    error = e
+                    self.metrics.recordRequest(url, None, time.perf_counter() - requestStart, 0)
+
+                finally:
+                    await self.limiter.release(statusCode, retryAfter)
+
+                if not self.retryRequest(url, host, statusCode, attempt):
+                    span.set("status", statusCode)
+                    span.set("attempts", attempt + 1)
+                    break
+                await asyncio.sleep(self.retryPolicy.delay(statusCode, attempt, retryAfter))
+                attempt += 1
+
+        if response is None:
+            raise error
+
+        if self.cassette:
+            self.cassette.record(url, response, latency)
+
+        if self.cacheEnabled() and response.status_code == 200:
+            self.cache.put(url, response.content, finished)
+
+        return response
+
+    def fetchURLSync(self, url, finished=False):
+        """
+        Blocking version of fetchURL using the HTMLSession, without humanizing delay or
+        rate limiting, with the same retries and circuit breaker
+
+        Parameters:
+            - url: request url
+            - finished: whether the url belongs to a finished event (immutable payload)
+
+        Returns:
+            - response: requests response or CachedResponse
+        """
+        if self.cassette and self.cassette.replaying:
+            return self.cassette.replaySync(url)
+
+        if self.cacheEnabled():
+            content = self.cache.get(url, finished)
+            if content is not None:
+                self.metrics.recordCacheHit(url)
+                return CachedResponse(url, content)
+
+        host = urlsplit(url).netloc
+        with self.tracer.span("GET", url=url) as span:
+            attempt = 0
+            while True:
+                waitStart = time.perf_counter()
+                self.breaker.waitSync(host)
+                self.metrics.recordWait(url, time.perf_counter() - waitStart)
+                response = None
+                error = None
+                statusCode = None
+                retryAfter = None
+                requestStart = time.perf_counter()
+                try:
+                    response = self.session.get(url, timeout=self.retryPolicy.timeout)
+                    latency = time.perf_counter() - requestStart
+                    statusCode = response.status_code
+                    retryAfter = self.retryAfter(response)
+                    self.metrics.recordRequest(url, statusCode, latency, len(response.content))
+                except Exception as e:
+                    error = e
+                    self.metrics.recordRequest(url, None, time.perf_counter() - requestStart, 0)
+
+                if not self.retryRequest(url, host, statusCode, attempt):
+                    span.set("status", statusCode)
+                    span.set("attempts", attempt + 1)
+                    break
+                time.sleep(self.retryPolicy.delay(statusCode, attempt, retryAfter))
+                attempt += 1
+
+        if response is None:
+            raise error
+
+        if self.cassette:
+            self.cassette.record(url, response, latency)
+
+        if self.cacheEnabled() and response.status_code == 200:
+            self.cache.put(url, response.content, finished)
+
+        return response
+
+    def retryAfter(self, response):
+        """
+        Returns:
+            - seconds requested by the Retry-After header of response, None if absent
+        """
+        retryAfter = response.headers.get("Retry-After")
+        return float(retryAfter) if retryAfter and retryAfter.isdigit() else None
+
+    def retryRequest(self, url, host, statusCode, attempt):
+        """
+        Feed the outcome of a request to the circuit breaker and ask the retry policy
+        whether it should be sent again
+
+        Parameters:
+            - url: request url
+            - host: host of url
+            - statusCode: response status code, None when the request raised
+            - attempt: number of retries already done for the request
+
+        Returns:
+            - True when the request should be retried
+        """
+        if self.breaker.record(host, self.limiter.isBackoff(statusCode)):
+            self.logger.error(f"circuit opened for {host} after repeated blocking responses, pausing requests for {self.breaker.openSeconds}s")
+
+        if not self.retryPolicy.shouldRetry(statusCode, attempt):
+            return False
+
+        self.logger.warning(f"retrying {url} after {statusCode or 'connection error'} (retry {attempt + 1})")
+        return True
+
+    def cacheSummary(self):
+        """
+        Returns:
+            - dict of response cache counters, {} when the cache is disabled
+        """
+        return self.cache.stats() if self.cache else {}
 
     def getLatestFinishedMatch(self, teamID):
         """
         Returns the latest finished match information for database check.
+
+        Parameters:
+            - teamID: team ID used by website being scraped
+
+        Returns:
+            - (event id, start timestamp) of the team's latest finished match
+            - None: no finished match or request failed
         """
         pastMatchURL = self.TEAMURL + str(teamID) + "/events/last/0"
 
-        pass
+        try:
+            response = self.fetchURLSync(pastMatchURL)
+            if response.status_code != 200:
+                self.logger.error(f"failed to obtain latest finished match for team {teamID}: {response.status_code}")
+                return None
+
+            # latest result is at the end of page 0
+            for match in reversed(payloads.decodeEventsPage(response.content, self.logger).events):
+                if match.status and match.status.type == "finished":
+                    return (match.id, match.startTimestamp)
+
+        except Exception as e:
+            self.logger.error(f"failed to obtain latest finished match for team {teamID}: {repr(e)}")
+
+        return None
 
     def findMatchWithPlayerStat(self, matchJsonData, pastMatchInfo, teamName=None, numberOfMatchesWithData=None):
         """
@@ -57,7 +314,7 @@ class Scraper():
         regarding the match will be appended into pastMatchInfo
 
         Parameters:
-            - matchJsonData: JSON data containing information regarding the match
+            - matchJsonData: payloads.Event record of the match
             - pastMatchInfo (1): dict of list of dict, team name as key and list of match info as its value
             - pastMatchInfo (2): list of matchinfo dict - if teamName is None 
             - teamName (or None): the football team name
@@ -69,33 +326,34 @@ class Scraper():
         try:
 
             # make sure the match is finished and not awarded
-            if matchJsonData["status"]["type"] == "finished" and "isAwarded" not in matchJsonData.keys():
+            if matchJsonData.status.type == "finished" and matchJsonData.isAwarded is None:
 
-                # store match info
+                # store match info, a missing team/country/tournament raises AttributeError
+                # and the match is skipped
                 matchInfo = {
-                    'customId': matchJsonData['customId'], 
-                    'id': str(matchJsonData['id']), 
-                    'slug': matchJsonData["slug"], 
-                    'home': matchJsonData['homeTeam']['name'], 
-                    'away': matchJsonData['awayTeam']['name'],
-                    'home_id':matchJsonData['homeTeam']['id'], 
-                    'away_id':matchJsonData['awayTeam']['id'],
-                    'startTimestamp': matchJsonData["startTimestamp"],
-                    'league': matchJsonData["tournament"]["name"],
-                    "home_country": matchJsonData['homeTeam']['country']['name'],
-                    "away_country": matchJsonData['awayTeam']['country']['name']
+                    'customId': matchJsonData.customId, 
+                    'id': str(matchJsonData.id), 
+                    'slug': matchJsonData.slug, 
+                    'home': matchJsonData.homeTeam.name, 
+                    'away': matchJsonData.awayTeam.name,
+                    'home_id':matchJsonData.homeTeam.id, 
+                    'away_id':matchJsonData.awayTeam.id,
+                    'startTimestamp': matchJsonData.startTimestamp,
+                    'league': matchJsonData.tournament.name,
+                    "home_country": matchJsonData.homeTeam.country.name,
+                    "away_country": matchJsonData.awayTeam.country.name
 
                 }
 
                 # look for hasEventPlayerStatistics keyword as it normally has
                 # player statistic if the keyword exists.
-                if "hasEventPlayerStatistics" in matchJsonData.keys():
-                    if matchJsonData["hasEventPlayerStatistics"] == True:
+                if matchJsonData.hasEventPlayerStatistics is not None:
+                    if matchJsonData.hasEventPlayerStatistics == True:
                         matchInfo["hasPlayerStats"] = True
                     else:
                         matchInfo["hasPlayerStats"] = False
                     
-                elif matchJsonData['tournament']['uniqueTournament']['hasEventPlayerStatistics'] == True:
+                elif matchJsonData.tournament.uniqueTournament.hasEventPlayerStatistics == True:
                     matchInfo["hasPlayerStats"] = True
 
                 # if not, then we don't have player stats available and therefore
@@ -117,21 +375,23 @@ class Scraper():
         except KeyError as e:
             # print(e, "Player stat is not available")  
             # don't append the current match info into pastMatchInfo
-            self.logger.error(f"matchID : {matchJsonData['id']}, KeyError: {e}")
+            self.logger.error(f"matchID : {matchJsonData.id}, KeyError: {e}")
 
             return numberOfMatchesWithData 
 
         except Exception as e:
             # log instead
-            self.logger.error(f"matchID : {matchJsonData['id']}, {e}")
+            self.logger.error(f"matchID : {matchJsonData.id}, {e}")
             # don't append the current match info into pastMatchInfo
             return numberOfMatchesWithData
 
 
-    async def getPastMatches(self, asession, teamID, teamName, pastMatchInfo, pageNum, queue):
+    async def getPastMatches(self, asession, teamID, teamName, pastMatchInfo, pageNum, watermark=None, depth=None, raiseErrors=False):
         """
         If database doesn't have the latest H2H match, it will need to call this function to
-        get the latest NUMOFPASTMATCHES matches data for the team teamName
+        get the latest NUMOFPASTMATCHES matches data for the team teamName. When the team has
+        a stored high-water mark, paging stops at it so only matches newer than the newest
+        stored match are returned
         
         Parameters:
             - asession: a AsyncHTMLSession
@@ -139,31 +399,26 @@ class Scraper():
             - teamName: team name
             - pastMatchInfo: dict with teamName as key and list of match info dict as value
             - pageNum: the current page number of the scraped api for the team's matches
+            - watermark (or None): (event id, start timestamp) of the team's newest stored match
+            - depth (or None): number of past matches wanted, default NUMOFPASTMATCHES
+            - raiseErrors: raise when any page fails instead of logging it and returning what
+            was found so far, used by the job queue so a failed team page is retried
 
         Returns:
             - pastMatchInfo: dict of team name as key with list of dict containing match infos as value
         
         """
+        if depth is None:
+            depth = scrape_config.NUMOFPASTMATCHES
+
         try:
-            # humanize the requests
-            #--------------------------------------------------------------------------
-            used_queue_slot = False  # Track whether we acquired a queue slot
-            if pageNum == 0: # Only acquire queue slot for the first request, not for recursion
-                await queue.get()
-                used_queue_slot = True
-            delay = random.uniform(scrape_config.DELAY_RANGE[0],scrape_config.DELAY_RANGE[1])
-            await asyncio.sleep(delay)
-            headers = scrape_config.HEADERS
-            
-            #------------------------------------------------------------------------------
-            
             # init dict to store result
             if pastMatchInfo is None:
                 pastMatchInfo = {teamName:[]}
 
             # request for data
             pastMatchURL = self.TEAMURL + str(teamID) + f"/events/last/{pageNum}"
-            response = await asession.get(pastMatchURL, stream=True, headers=headers)
+            response = await self.fetchURL(asession, pastMatchURL)
             # check for request status
             if response.status_code != 200:
                 # log instead!
@@ -172,44 +427,44 @@ class Scraper():
                 except:
                     self.logger.error(f"failed to obtain past 5 matches data for team {pastMatchURL}: {response.status_code}")
 
+                if raiseErrors:
+                    raise HTTPException(f"failed to obtain past matches of team {teamID}: {response.status_code}")
                 return {}
-            dataJson = response.json()
+            dataJson = payloads.decodeEventsPage(response.content, self.logger)
             
-            numberOfMatchesWithData = 0 # used to track the number of matches with stats, we use it as a counter to stop recursive function
+            # used to track the number of matches with stats, we use it as a counter to stop recursive function
+            # matches found on the previous pages count towards it
+            numberOfMatchesWithData = len(pastMatchInfo[teamName])
+            reachedWatermark = False    # older matches are already in the db
             
-            if len(dataJson["events"]) >= scrape_config.NUMOFPASTMATCHES:
+            if len(dataJson.events) >= depth:
                 # -6 since we want 5 results as range stops at target-1
                 # latest result is at page 0 and at the end
-                for i in range(len(dataJson["events"])-1, -1, -1):
-                    match = dataJson["events"][i]
-                    if "status" in match.keys():
+                for i in range(len(dataJson.events)-1, -1, -1):
+                    match = dataJson.events[i]
+                    if watermark and (match.id == watermark[0] or match.startTimestamp <= watermark[1]):
+                        reachedWatermark = True
+                        break
+
+                    if match.status is not None:
                         numberOfMatchesWithData = self.findMatchWithPlayerStat(match, pastMatchInfo, teamName, numberOfMatchesWithData)
                     
-                    if numberOfMatchesWithData >= scrape_config.NUMOFPASTMATCHES:
+                    if numberOfMatchesWithData >= depth:
                         
                         break #stop loop if we got at least 5 data
 
 
             
             # go to the next page and get more data if possible
-            if numberOfMatchesWithData < scrape_config.NUMOFPASTMATCHES and dataJson.get("hasNextPage", False):
+            if not reachedWatermark and numberOfMatchesWithData < depth and dataJson.hasNextPage:
                 pageNum += 1
-                await self.getPastMatches(asession, teamID, teamName, pastMatchInfo, pageNum, queue)
+                await self.getPastMatches(asession, teamID, teamName, pastMatchInfo, pageNum, watermark, depth, raiseErrors)
         
         except Exception as e:
+            if raiseErrors:
+                raise
             self.logger.error(f"failed to obtain past 5 matches data for team: {repr(e)}")
 
-        finally:
-            if used_queue_slot:  # Only release queue slot if `queue.get()` was used
-                queue.task_done()
-            
-                # Refill slot
-                if queue.empty():
-                    for _ in range(scrape_config.QUEUE_SLOTS):
-                        queue.put_nowait(True)
-                # print(queue.qsize())
-
-
         return pastMatchInfo
 
 
@@ -218,40 +473,95 @@ class Scraper():
         filter scheduled matches with player stats
 
         Parameters:
-            - matchJsonData: JSON data containing information regarding the match
+            - matchJsonData: payloads.Event record of the match
             - matchesInfos: list of dict - to store the a match information such as home, away, start time, etc (see matchInfo below)
         """
         try:
             # filter for match not started
-            if "status" in matchJsonData.keys():
-                if matchJsonData["status"]["type"] == "notstarted" and "isAwarded" not in matchJsonData.keys():
+            if matchJsonData.status is not None:
+                if matchJsonData.status.type == "notstarted" and matchJsonData.isAwarded is None:
 
                     # when there is hasEventPlayerStatistics key word and it's true, it normally has player stats
-                    if matchJsonData['tournament']['uniqueTournament']['hasEventPlayerStatistics'] == True:
+                    if matchJsonData.tournament.uniqueTournament.hasEventPlayerStatistics == True:
+                        homeCountry = matchJsonData.homeTeam.country
+                        awayCountry = matchJsonData.awayTeam.country
                         matchInfo = {
-                            'customId': matchJsonData['customId'], 
-                            'id': str(matchJsonData['id']), 
-                            'slug': matchJsonData["slug"], 
-                            'home': matchJsonData['homeTeam']['name'], 
-                            'away': matchJsonData['awayTeam']['name'], 
-                            'home_id':matchJsonData['homeTeam']['id'], 
-                            'away_id':matchJsonData['awayTeam']['id'],
-                            'startTimestamp': matchJsonData["startTimestamp"],
-                            'league': matchJsonData["tournament"]["name"],
-
-                            'home_country':matchJsonData['homeTeam']['country'].get('name', 'NA'),
-                            'away_country':matchJsonData['awayTeam']['country'].get('name', 'NA')
+                            'customId': matchJsonData.customId, 
+                            'id': str(matchJsonData.id), 
+                            'slug': matchJsonData.slug, 
+                            'home': matchJsonData.homeTeam.name, 
+                            'away': matchJsonData.awayTeam.name, 
+                            'home_id':matchJsonData.homeTeam.id, 
+                            'away_id':matchJsonData.awayTeam.id,
+                            'startTimestamp': matchJsonData.startTimestamp,
+                            'league': matchJsonData.tournament.name,
+
+                            'home_country':homeCountry.name if homeCountry else 'NA',
+                            'away_country':awayCountry.name if awayCountry else 'NA'
                         }
                         matchesInfos.append(matchInfo)
         except Exception as e:
-            customID = matchJsonData["customId"]
-            id = matchJsonData["id"]
-            slug = matchJsonData["slug"]
+            customID = matchJsonData.customId
+            id = matchJsonData.id
+            slug = matchJsonData.slug
             identifier = f"{customID}_{id}_{slug}"
             self.logger.error(f"failed to filter current scheduled match ({identifier}) for player stats : {repr(e)}" )
         
 
 
+    def scheduleDates(self, days):
+        """
+        Parameters:
+            - days: iterable of day offsets with respect to todays date
+
+        Returns:
+            - dates: dict of day offset -> "%Y-%m-%d" date string, in the order of the offsets
+        """
+        today = datetime.now().date()
+        return {day: (today + timedelta(days=day)).isoformat() for day in sorted(set(days))}
+
+    def dayBounds(self, date):
+        """
+        Returns:
+            - (start, end): unix timestamps of the local midnights starting and ending the
+            "%Y-%m-%d" date string
+        """
+        start = datetime.combine(datetime.fromisoformat(date).date(), datetime.min.time())
+        return start.timestamp(), (start + timedelta(days=1)).timestamp()
+
+    def bucketScheduledEvents(self, pages, dates):
+        """
+        Split the events of scheduled-events pages into per day buckets. Every day is
+        bounded by its local midnight timestamps, computed once, and each event is placed
+        by a binary search on its startTimestamp. An event listed on several pages is kept once
+
+        Parameters:
+            - pages: list of payloads.EventsPage
+            - dates: dict of day offset -> date string, see scheduleDates
+
+        Returns:
+            - buckets: dict of day offset -> matchesInfos, see findScheduledMatchWithPlayerStats
+        """
+        days = list(dates)
+        starts = []
+        ends = []
+        for date in dates.values():
+            start, end = self.dayBounds(date)
+            starts.append(start)
+            ends.append(end)
+
+        buckets = {day: [] for day in days}
+        seen = set()
+        for page in pages:
+            for match in page.events:
+                i = bisect_right(starts, match.startTimestamp) - 1
+                if i < 0 or match.startTimestamp >= ends[i] or match.id in seen:
+                    continue
+                seen.add(match.id)
+                self.findScheduledMatchWithPlayerStats(match, buckets[days[i]])
+
+        return buckets
+
     def getScheduledMatch(self, days):
         """
         Get scheduled matches with respect to todays date with days as the offset
@@ -267,35 +577,18 @@ class Scraper():
             self.logger.error("days parameter should not exceed 2 as the scheduled match may not be accurate. Aborting get scheduled match...")
             return None
         else:
-            # get todays date for comparison later
-            date = datetime.now() + timedelta(days=days)
-            date = date.strftime("%Y-%m-%d")
-            requestURL      = self.SCHEDULEMATCHURL + date
+            dates = self.scheduleDates([days])
+            requestURL      = self.SCHEDULEMATCHURL + dates[days]
 
             try:
-                response = self.session.get(requestURL)
-                dictData = response.json()
-
-                matchesInfos = []
-
-                # filter for today's match and filter matches with player stats
-                # then store it into matchesInfos
-                for match in dictData['events']:
-                    dateStr = strftime('%Y-%m-%d', localtime(match["startTimestamp"]))
-                    if dateStr == date:
-                        self.findScheduledMatchWithPlayerStats(match, matchesInfos)
-
-                # continue to fetch for more matches
-                requestURL = requestURL + "/inverse"
-                response = self.session.get(requestURL)
-                moreData = response.json()
-
-                # filter for today's match and filter matches with player stats
-                # then store it into matchesInfos
-                for match in moreData['events']:
-                    dateStr = strftime('%Y-%m-%d', localtime(match["startTimestamp"]))
-                    if dateStr == date:
-                        self.findScheduledMatchWithPlayerStats(match, matchesInfos)
+                # the day page and the inverse page (to fetch for more matches)
+                pages = []
+                for url in (requestURL, requestURL + "/inverse"):
+                    response = self.fetchURLSync(url)
+                    pages.append(payloads.decodeEventsPage(response.content, self.logger))
+
+                # filter for the day's matches with player stats
+                matchesInfos = self.bucketScheduledEvents(pages, dates)[days]
 
                 print(len(matchesInfos))
                 return matchesInfos
@@ -305,7 +598,95 @@ class Scraper():
                 self.logger.error(f"Cannot obtain scheduled matches: {repr(e)}")
                 return []
 
+    async def getScheduledMatches(self, asession, days=None):
+        """
+        Async multi-day version of getScheduledMatch. The day and inverse pages of every
+        day are requested concurrently under the shared rate limiter
+
+        Parameters:
+            - asession: a AsyncHTMLSession
+            - days: iterable of day offsets (0 to SCHEDULE_DAYS - 1), default the whole window
+
+        Returns:
+            - buckets: dict of day offset -> matchesInfos
+        """
+        if days is None:
+            days = range(scrape_config.SCHEDULE_DAYS)
+        dates = self.scheduleDates(day for day in days if 0 <= day < scrape_config.SCHEDULE_DAYS)
+
+        urls = []
+        for date in dates.values():
+            urls.append(self.SCHEDULEMATCHURL + date)
+            urls.append(self.SCHEDULEMATCHURL + date + "/inverse")
 
+        async def fetchPage(url):
+            try:
+                response = await self.fetchURL(asession, url)
+                if response.status_code != 200:
+                    raise HTTPException(f"{response.status_code}")
+                return payloads.decodeEventsPage(response.content, self.logger)
+            except Exception as e:
+                self.logger.error(f"Cannot obtain scheduled matches from {url}: {repr(e)}")
+                return None
+
+        pages = await asyncio.gather(*[fetchPage(url) for url in urls])
+        return self.bucketScheduledEvents([page for page in pages if page is not None], dates)
+
+
+
+    async def getSeasonMatches(self, asession, uniqueTournamentID, seasonID, pastMatchInfo=None, seen=None):
+        """
+        Discover the finished matches with player statistics of one season of a unique
+        tournament from its events listing. Every match is listed once per season, where
+        paging each team's events finds it twice. SEASON_PAGE_WINDOW pages are requested
+        at a time until the last page
+
+        Parameters:
+            - asession: a AsyncHTMLSession
+            - uniqueTournamentID: unique tournament ID, eg 17 for the Premier League
+            - seasonID: season ID of the unique tournament
+            - pastMatchInfo (or None): list the match infos are appended to
+            - seen (or None): set of event ids already discovered, share it between calls
+            so an event listed in several seasons or tournaments is kept once
+
+        Returns:
+            - pastMatchInfo: list of match info dict, see findMatchWithPlayerStat
+        """
+        if pastMatchInfo is None:
+            pastMatchInfo = []
+        if seen is None:
+            seen = set()
+
+        seasonURL = f"{self.TOURNAMENTURL}{uniqueTournamentID}/season/{seasonID}/events/last/"
+        window = scrape_config.SEASON_PAGE_WINDOW
+        pageNum = 0
+        while True:
+            responses = await asyncio.gather(*[self.fetchURL(asession, f"{seasonURL}{pageNum + i}") for i in range(window)],
+                                             return_exceptions=True)
+
+            for i, response in enumerate(responses):
+                try:
+                    if isinstance(response, Exception):
+                        raise response
+                    if response.status_code != 200:
+                        raise HTTPException(f"{response.status_code}")
+                    eventsPage = payloads.decodeEventsPage(response.content, self.logger)
+                except Exception as e:
+                    self.logger.error(f"failed to obtain page {pageNum + i} of season {seasonID} of tournament {uniqueTournamentID}: {repr(e)}")
+                    return pastMatchInfo
+
+                for match in eventsPage.events:
+                    if match.id in seen:
+                        continue
+                    seen.add(match.id)
+                    if match.status is not None:
+                        self.findMatchWithPlayerStat(match, pastMatchInfo)
+
+                # the pages requested past the last one are not read
+                if not eventsPage.hasNextPage:
+                    return pastMatchInfo
+
+            pageNum += window
 
     async def getPlayerInformation(self, asession, playerID):
         """
@@ -320,7 +701,7 @@ class Scraper():
             {} if not valid
         """
         playerURL = f"{self.PLAYERURL}{playerID}"
-        response = await asession.get(playerURL, stream=True)
+        response = await self.fetchURL(asession, playerURL, humanize=False, headers={})
 
         # check for request status
         if response.status_code != 200:
@@ -334,15 +715,15 @@ class Scraper():
 
         playersInfo = {}
 
-        response = response.json()["player"]
-
         # store data such as player name, player's team, player's country, and player's birthdate
         try:
-            playersInfo["player_name"] = response["name"]
-            playersInfo["team"] = {"name":response["team"]["name"], "country": response["team"]["country"]["name"]}
+            response = payloads.decodePlayer(response.content)
+
+            playersInfo["player_name"] = response.name
+            playersInfo["team"] = {"name":response.team.name, "country": response.team.country.name}
             
-            playersInfo["country"] = response["country"]["name"]
-            birthdate = datetime.utcfromtimestamp(response.get('dateOfBirthTimestamp',SENTINELBIRTHEPOCH)).date()
+            playersInfo["country"] = response.country.name
+            birthdate = datetime.utcfromtimestamp(response.dateOfBirthTimestamp).date()
             birthdate = datetime.combine(birthdate, datetime.min.time()) # convert back to datetime obj
 
             playersInfo["birth_date"] = birthdate
@@ -353,25 +734,46 @@ class Scraper():
             return {}
         
 
-    async def getMatchLineup(self, asession, matchID, queue, identifier=""):
-        # humanize the requests
-        #--------------------------------------------------------------------------
-        await queue.get()
+    async def getMatchLineup(self, asession, matchID, identifier="", finished=False):
+        """
+        Get the lineup response of a match
+
+        Parameters:
+            - matchID: match ID used by website being scraped
+            - finished: whether the match has finished, finished lineups are served from the cache
 
-        delay = random.uniform(scrape_config.DELAY_RANGE[0],scrape_config.DELAY_RANGE[1])
-        await asyncio.sleep(delay)   
-        headers = scrape_config.HEADERS
-        #------------------------------------------------------------------------------
+        Returns:
+            - response: the lineup response, raise HTTPException if request failed
+        """
         lineupPart = matchID + "/lineups"
         lineupURL = self.EVENTURL + lineupPart
-        response = await asession.get(lineupURL, stream=True, headers=headers)
+        response = await self.fetchURL(asession, lineupURL, finished=finished)
 
-        queue.task_done()
+        # check for request status
+        if response.status_code != 200:
+            try:
+                exceptionMessage = f"{response.status_code} {STATUS_MESSAGES[response.status_code]}"
+            except:
+                exceptionMessage = f"{response.status_code}"
+
+            raise HTTPException(exceptionMessage)
         
-        # Refill slot
-        if queue.empty():
-            for _ in range(scrape_config.QUEUE_SLOTS):
-                queue.put_nowait(True)
+        return response
+
+    async def getMatchStatistics(self, asession, matchID, finished=False):
+        """
+        Get the statistics response of a match
+
+        Parameters:
+            - matchID: match ID used by website being scraped
+            - finished: whether the match has finished, finished statistics are served from the cache
+
+        Returns:
+            - response: the statistics response, raise HTTPException if request failed
+        """
+        statPart = matchID + "/statistics"
+        statURL = self.EVENTURL + statPart
+        response = await self.fetchURL(asession, statURL, finished=finished)
 
         # check for request status
         if response.status_code != 200:
@@ -381,101 +783,119 @@ class Scraper():
                 exceptionMessage = f"{response.status_code}"
 
             raise HTTPException(exceptionMessage)
-        
+
+        return response
+
+    async def getMatchIncidents(self, asession, matchID, finished=False):
+        """
+        Get the incidents (goals, cards, substitutions) response of a match
+
+        Parameters:
+            - matchID: match ID used by website being scraped
+            - finished: whether the match has finished, finished incidents are served from the cache
+
+        Returns:
+            - response: the incidents response, raise HTTPException if request failed
+        """
+        incidentsURL = self.EVENTURL + matchID + "/incidents"
+        response = await self.fetchURL(asession, incidentsURL, finished=finished)
+
+        # check for request status
+        if response.status_code != 200:
+            try:
+                exceptionMessage = f"{response.status_code} {STATUS_MESSAGES[response.status_code]}"
+            except:
+                exceptionMessage = f"{response.status_code}"
+
+            raise HTTPException(exceptionMessage)
+
         return response
 
-    async def getPlayerMatchStat(self, asession, matchInfo, queue):
+    def parsePlayerMatchStat(self, matchInfo, content, batch):
+        """
+        Add the players of a lineups payload to batch
+
+        Parameters:
+            - matchInfo: football match info
+            - content: raw event/{id}/lineups response body
+            - batch: PlayerStatsBatch collecting the players of the run
+
+        Returns:
+            - all_player_stats (PlayerStatsView): the match's rows in the batch,
+            raise KeyError when a player has no statistics
+        """
+        allPlayersStats = payloads.decodeLineups(content)
+        players = []                        # to store players stat for the match
+        customID = matchInfo["customId"]
+        id = matchInfo["id"]
+        slug = matchInfo["slug"]
+        
+        # loop through home and away team
+        for team in ("home", "away"):
+            teamLineup = getattr(allPlayersStats, team)
+            if teamLineup is None:
+                continue
+
+            # loop through each player
+            for i, player in enumerate(teamLineup.players):
+
+                # if statistics key doesn't exist, raise error
+                # if key doesn't exist, it means 0
+                statistics = player.statistics
+                if statistics is None:
+                    raise KeyError("no player statistic keyword")
+
+                players.append((
+                    team,
+                    player.player.id,
+                    player.player.name,
+                    player.player.country.name,
+                    player.player.dateOfBirthTimestamp,
+                    i < MAXSTARTINGPLAYER,      # starting player if it is the first 11 players
+                    {
+                        "minutesPlayed": statistics.minutesPlayed,
+                        "shots": statistics.blockedScoringAttempt + statistics.shotOffTarget + statistics.onTargetScoringAttempt,
+                        "shotsTarget": statistics.onTargetScoringAttempt,
+                        "assists": statistics.goalAssist,
+                        "goals": statistics.goals,
+                        "fouls": statistics.fouls,
+                        "foulsWon": statistics.wasFouled,
+                        "saves": statistics.saves,
+                        "yellowCards": 0,       # set from the incidents
+                        "redCards": 0,
+                    },
+                ))
+
+        # players are only added once the whole lineup parsed, so a failed match leaves no rows behind
+        return batch.addMatch(f"{customID}_{id}_{slug}", players)
+
+    async def getPlayerMatchStat(self, asession, matchInfo, batch=None):
         """
         Get player statistic such as shot made, shot on target, assist, goal scored, fouls, was fouled, shot saved if available
         
         Parameters:
             - matchInfo: football match info
+            - batch (or None): PlayerStatsBatch collecting the players of the run, a new one is used if None
 
         Returns:
-            - all_player_stats (dict of dict of dict): a dictionary containing home/away as key, item = dict containing
-            player names as key, and a dictionary containing the player stats as value
+            - all_player_stats (PlayerStatsView): the match's rows in the batch, iterates as a dictionary
+            containing home/away as key, item = dict containing player names as key, and a dictionary
+            containing the player stats as value
             {player:{playerid, matchInfo, shot on target, assist, goal scored, fouls, was fouled, shot saved if available}, ...}
-            {} if not valid
+            None if not valid
         """
-        
+        if batch is None:
+            batch = PlayerStatsBatch()
 
         # check for link validity, league such as Champions League Qualification
         # will not have players stats, but after qualification, they will have it
         try:
             
-            response = await self.getMatchLineup(asession, matchInfo["id"], queue)
+            # only finished matches reach here, see findMatchWithPlayerStat
+            response = await self.getMatchLineup(asession, matchInfo["id"], finished=True)
+            all_player_stats = self.parsePlayerMatchStat(matchInfo, response.content, batch)
 
-
-            allPlayersStats = response.json()
-            all_player_stats = {}               # to store players stat for the match
-            customID = matchInfo["customId"]
-            id = matchInfo["id"]
-            slug = matchInfo["slug"]
-            
-            # loop through home and away team
-            for team in allPlayersStats.keys():
-
-                # make sure key word is either home or away
-                if team != "confirmed" and (team == "home" or team == "away"):
-                    all_player_stats[team] = {} # init home/away dict to store player
-
-                    # loop through each player
-                    for i, player in enumerate(allPlayersStats[team]["players"]):
-                        
-                        # init dict
-                        player_dict = {}
-                       
-                        player_dict["match id"] = f"{customID}_{id}_{slug}"
-                        player_dict["player id"] = player["player"]["id"]
-
-                        # starting player if it is the first 11 players
-                        player_dict["is starting player"] = True if i < MAXSTARTINGPLAYER else False
-                        
-
-                        player_dict["country"] = player['player']["country"].get("name", "NA")
-
-                        # get birthdate and convert into datetime obj with date data only
-                        birthdate = datetime.utcfromtimestamp(player['player'].get('dateOfBirthTimestamp',SENTINELBIRTHEPOCH)).date()
-                        birthdate = datetime.combine(birthdate, datetime.min.time()) # convert back to datetime obj     
-                        player_dict["birth_date"] = birthdate
-
-                        # if statistics key doesn't exist, raise error
-                        # if key doesn't exist, it means 0
-                        if "statistics" in player.keys():
-                            minutesPlayed = player["statistics"].get("minutesPlayed", 0)
-                            player_dict["minutesPlayed"] = minutesPlayed
-
-                            # get shots related data
-                            blockedShots    = player["statistics"].get("blockedScoringAttempt", 0)
-                            shotOffTargets  = player["statistics"].get("shotOffTarget", 0)
-                            shotOnTargets   = player["statistics"].get("onTargetScoringAttempt", 0)
-                            player_dict["shot made"] = blockedShots + shotOffTargets + shotOnTargets
-                            player_dict["shot on target"] = shotOnTargets
-
-                            # get goal related data
-                            goalAssist = player["statistics"].get("goalAssist", 0)
-                            player_dict["assist"] = goalAssist
-                            goals = player["statistics"].get("goals", 0)
-                            player_dict["goal scored"] = goals
-
-                            # get foul related data
-                            fouls = player["statistics"].get("fouls", 0)
-                            player_dict["fouls"] = fouls
-                            foulWon = player["statistics"].get("wasFouled", 0)
-                            player_dict["foul won (was fouled)"] = foulWon
-
-                            # get shot saved data
-                            saves = player["statistics"].get("saves", 0)
-                            player_dict["shot saved"] = saves
-                        
-                        # when player doesn't have the statistics keyword
-                        else:
-                            raise KeyError("no player statistic keyword")
-
-                        # add to match player dict
-                        all_player_stats[team][player["player"]["name"]] = player_dict
-
-        # return empty dict if failed to fetch player stats
+        # return None if failed to fetch player stats
         # so the match will get removed later on
         except Exception as e:
             customID = matchInfo["customId"]
@@ -484,258 +904,374 @@ class Scraper():
             identifier = f"{customID}_{id}_{slug}"
 
             self.logger.error(f"failed to fetch player stats {repr(e)}, removing the match {identifier}...")
-            all_player_stats = {}
+            all_player_stats = None
 
         
         return all_player_stats
 
-    async def getMatchStat(self, asession, matchInfo, queue):
+    def parseMatchStat(self, matchInfo, content):
         """
-        Get overall match statistic such as team shot made, team shot on target, corner, offside, fouls, yellow/red cards, 
-        for the whole match, 1st half, and 2nd half
+        Build the MatchStats of a statistics payload
 
         Parameters:
             - matchInfo: football match info
+            - content: raw event/{id}/statistics response body
 
         Returns:
-            - match_stats (dict): a dictionary containing the match id and the overall match statistic as described above as value
-            {match id: {stats}, ...}
+            - match_stats (MatchStats): None if there are not enough information
         """
+        match_stats = MatchStats(matchInfo)
 
-        # humanize the requests
-        #--------------------------------------------------------------------------
+        # if there are not enough information, drop the match
+        if not match_stats.fillFromStatistics(payloads.decodeEventStatistics(content)):
+            return None
 
-        await queue.get()
+        return match_stats
 
-        delay = random.uniform(scrape_config.DELAY_RANGE[0],scrape_config.DELAY_RANGE[1])
-        await asyncio.sleep(delay)
-        headers = scrape_config.HEADERS
-        
-        #------------------------------------------------------------------------------
+    async def getMatchStat(self, asession, matchInfo):
+        """
+        Get overall match statistic such as team shot made, team shot on target, corner, fouls, yellow/red cards, 
+        for the whole match, 1st half, and 2nd half. The extracted stats are declared in match_stats.STAT_TABLE
+
+        Parameters:
+            - matchInfo: football match info
+
+        Returns:
+            - match_stats (MatchStats): the match info and the overall match statistic per period
+            None if not valid
+        """
 
         try:
-            # fetch data
-            statPart = matchInfo["id"] + "/statistics"
-            lineupURL = self.EVENTURL + statPart
-            response = await asession.get(lineupURL, stream=True, headers=headers)
-
-            # init and populate match stat dict
-            match_stats = {}
-            match_stats["home"] = matchInfo["home"]
-            match_stats["away"] = matchInfo["away"]
-            match_stats["home_country"] = matchInfo["home_country"]
-            match_stats["away_country"] = matchInfo["away_country"]
-            match_stats["date"] =  datetime.utcfromtimestamp(matchInfo["startTimestamp"])
-            match_stats["league"] = matchInfo["league"]
-
-            requiredInformationCount = 0            # to keep count of information required
-
-            # if request is successful
-            if response.status_code == 200:
-                allMatchStats = response.json()
-                customID = matchInfo["customId"]
-                id = matchInfo["id"]
-                slug = matchInfo["slug"]
-                matchID = f"{customID}_{id}_{slug}"
-
-                periodPrefix = ""                   # to store the prefix 1ST/2ND/etc (match period)
-                match_stats["match id"] = matchID
-                
-                # loop through the match time period (eg 1st half/2nd half/etc)
-                for matchStats in allMatchStats["statistics"]:
-                    if matchStats["period"] != "ALL":
-                        periodPrefix = matchStats["period"] + "_"
+            # fetch data, only finished matches reach here so the payload can be cached
+            response = await self.getMatchStatistics(asession, matchInfo["id"], finished=True)
+            match_stats = self.parseMatchStat(matchInfo, response.content)
 
-                    else:
-                        periodPrefix = ""           # do not add prefix if it is ALL, which means full time
-                        
-                    homePrefix = periodPrefix + "home_"
-                    awayPrefix = periodPrefix + "away_"
-
-                    # init required stats
-                    match_stats[f"{homePrefix}corners"] = 0
-                    match_stats[f"{awayPrefix}corners"] = 0
-                    match_stats[f"{homePrefix}fouls"] = 0
-                    match_stats[f"{awayPrefix}fouls"] = 0
-                    match_stats[f"{homePrefix}yellowCards"] = 0
-                    match_stats[f"{awayPrefix}yellowCards"] = 0
-                    match_stats[f"{homePrefix}redCards"] = 0
-                    match_stats[f"{awayPrefix}redCards"] = 0
-                    match_stats[f"{homePrefix}totalShot"] = 0
-                    match_stats[f"{awayPrefix}totalShot"] = 0
-                    match_stats[f"{homePrefix}shotOnTarget"] = 0
-                    match_stats[f"{awayPrefix}shotOnTarget"] = 0
-                    match_stats[f"{homePrefix}totalSaves"] = 0
-                    match_stats[f"{awayPrefix}totalSaves"] = 0
-
-                    # update each stat type if exists
-                    for statsType in matchStats["groups"]:
-                        if statsType["groupName"] == "Match overview":
-                            requiredInformationCount += 1
-
-                            # go though each stats under the Match Overview category
-                            # we only want corner kicks and fouls from this category
-                            for statItem in statsType["statisticsItems"]:
-                                if statItem["name"] == "Corner kicks":
-                                    
-                                    match_stats[f"{homePrefix}corners"] = statItem.get("home", 0)
-                                    match_stats[f"{awayPrefix}corners"] = statItem.get("away", 0)
-
-                                elif statItem["name"] == "Fouls":
-                                    match_stats[f"{homePrefix}fouls"] = statItem.get("home", 0)
-                                    match_stats[f"{awayPrefix}fouls"] = statItem.get("away", 0)
-
-                                elif statItem["name"] == "Yellow cards":
-                                    match_stats[f"{homePrefix}yellowCards"] = statItem.get("home", 0)
-                                    match_stats[f"{awayPrefix}yellowCards"] = statItem.get("away", 0)
-                            
-                                elif statItem["name"] == "Red cards":
-                                    match_stats[f"{homePrefix}redCards"] = statItem.get("home", 0)
-                                    match_stats[f"{awayPrefix}redCards"] = statItem.get("away", 0)
-
-                        elif statsType["groupName"] == "Shots":
-                            requiredInformationCount += 1
-
-                            # go though each stats under the Shots category
-                            # we only want total shots and shots on target from this category
-                            for statItem in statsType["statisticsItems"]:
-                                if statItem["name"] == "Total shots":
-                                    match_stats[f"{homePrefix}totalShot"] = statItem.get("home", 0)
-                                    match_stats[f"{awayPrefix}totalShot"] = statItem.get("away", 0)
-                                
-                                elif statItem["name"] == "Shots on target":
-                                    match_stats[f"{homePrefix}shotOnTarget"] = statItem.get("home", 0)
-                                    match_stats[f"{awayPrefix}shotOnTarget"] = statItem.get("away", 0)
-
-
-                        elif statsType["groupName"] == "Goalkeeping":
-                            requiredInformationCount += 1
-
-                            # go though each stats under the Goalkeeping category
-                            # we only want total saves from this category
-                            for statItem in statsType["statisticsItems"]:
-                                if statItem["name"] == "Total saves":
-                                    match_stats[f"{homePrefix}totalSaves"] = statItem.get("home", 0)
-                                    match_stats[f"{awayPrefix}totalSaves"] = statItem.get("away", 0)
-                                    break #exit the loop as we got the required stat already
-
-            # if request are not successful, we set stat dict as empty and log it
-            else:
-                match_stats = {}
-                customID = matchInfo["customId"]
-                id = matchInfo["id"]
-                slug = matchInfo["slug"]
-                matchID = f"{customID}_{id}_{slug}"
-                self.logger.error(f"Failed to fetch match statistic data for match {matchID}, removing it...")
-
-            # if there are not enough information, set dict as empty
-            if requiredInformationCount < 3:
-                match_stats = {}
-                
+        # if request are not successful, we drop the match and log it
         except Exception as e:
             self.logger.error(f"failed to obtain match data: {e}")
-            match_stats = {}
-        finally:
-            queue.task_done()
-            
-            # Refill slot
-            if queue.empty():
-                for _ in range(scrape_config.QUEUE_SLOTS):
-                    queue.put_nowait(True)
-            # print(queue.qsize())
-
+            return None
 
-            return match_stats
+        return match_stats
                     
 
 
-    async def getAllMatchCompleteStat(self, pastMatchInfo, asession, queue):
+    def deriveMatchStat(self, matchInfo, playerStats, cards=None):
         """
-        Get overall match stat and player stat
+        Build the MatchStats of a match from the sums of its players' statistics (lean mode),
+        see match_stats.DERIVED_FIELDS and CARD_FIELDS
 
         Parameters:
-            - pastMatchInfo (list of dict): list of dict containing information such as
-            customId, id, and slug. All of these are IDs of each match
+            - matchInfo: football match info
+            - playerStats: PlayerStatsView of the match
+            - cards (or None): the players' cards of the incidents, see parseMatchCards. The
+            card totals are missing without them
 
         Returns:
-            - updated_past_match_stat (list of dict): a list of dict containing match info,
-            match stats, and player stats     
+            - (match_stats, problems): problems lists why the sums cannot be trusted, empty
+            when they are consistent
         """
+        if cards is not None:
+            playerStats.setCards(cards)
+        totals = playerStats.totals()
+        match_stats = MatchStats(matchInfo)
+        match_stats.fillFromPlayerStats(totals, cards is not None)
+        return match_stats, checkDerivedTotals(totals, scrape_config.LEAN_MIN_SIDE_MINUTES)
+
+    def needsStatistics(self, problems, matchStats):
+        """
+        Parameters:
+            - problems: see deriveMatchStat
+            - matchStats: MatchStats built by deriveMatchStat
 
-        # create a list of asynchronous task to execute
-        tasks = [self.getPlayerMatchStat(asession, match, queue) for match in pastMatchInfo]
+        Returns:
+            - True when a lean match still has to fetch its event statistics, because the
+            derived sums are inconsistent or LEAN_STATISTICS_FIELDS asks for a field the
+            lineups and the incidents did not give
+        """
+        return bool(problems) or any(field in matchStats.missing for field in scrape_config.LEAN_STATISTICS_FIELDS)
 
-        
+    async def getLeanMatchCompleteStat(self, asession, matchInfo, batch=None):
+        """
+        getMatchCompleteStat in lean mode: the lineups (and the incidents) are fetched first
+        and the event statistics only when needsStatistics
+        """
+        # without the statistics there is no card count to skip the incidents on
+        if scrape_config.INCIDENTS_ENABLED:
+            playerStats, cards = await asyncio.gather(self.getPlayerMatchStat(asession, matchInfo, batch),
+                                                      self.getMatchCards(asession, matchInfo))
+        else:
+            playerStats, cards = await self.getPlayerMatchStat(asession, matchInfo, batch), None
+        if not playerStats:
+            return None
 
-        # executes in the order of the awaits in the list
-        # the result is an aggregate list of returned values
-        playerStats = await async_tqdm.gather(*tasks, desc="getting player stats")
+        matchStats, problems = self.deriveMatchStat(matchInfo, playerStats, cards)
+        if self.needsStatistics(problems, matchStats):
+            self.leanCounts["statistics"] += 1
+            matchStats = await self.getMatchStat(asession, matchInfo)
+            if not matchStats:
+                return None
+        else:
+            self.leanCounts["derived"] += 1
 
-        tasks = [self.getMatchStat(asession, match, queue) for match in pastMatchInfo]
-        past_match_stat = await async_tqdm.gather(*tasks, desc="getting stats for each match")
-        
-        # go through in the order of past match info list
-        # if both match stat and player stats are not empty, then append it 
-        # into updated_past_match_stat
-        updated_past_match_stat = []
-        for i , match in enumerate(pastMatchInfo):
-            if past_match_stat[i]:
-                if playerStats[i]:
-                    past_match_stat[i]["player_stats"] = playerStats[i]
-                    updated_past_match_stat.append(past_match_stat[i])
-                else:
-                    continue
+        matchStats.player_stats = playerStats
+        return matchStats
 
-        return updated_past_match_stat
+    def hasCards(self, matchStats):
+        """
+        Returns:
+            - True when the match statistics show a yellow or a red card
+        """
+        return any(matchStats.stat(field, side) for field in ("yellowCards", "redCards") for side in ("home", "away"))
 
-        
+    def parseMatchCards(self, content):
+        """
+        Count the cards of each player of an incidents payload. A second yellow
+        (yellowRed) counts as a red card, its first yellow is an incident of its own
 
-    def getPastDateMatchStat(self, date:datetime):
+        Parameters:
+            - content: raw event/{id}/incidents response body
+
+        Returns:
+            - cards: dict of player id -> (yellow cards, red cards)
         """
-        Get finished matches complete stats for a particular past date
+        cards = {}
+        for incident in payloads.decodeEventIncidents(content).incidents:
+            if incident.incidentType != "card" or incident.player is None:
+                continue
+            yellow, red = cards.get(incident.player.id, (0, 0))
+            if incident.incidentClass == "yellow":
+                yellow += 1
+            elif incident.incidentClass in ("yellowRed", "red"):
+                red += 1
+            cards[incident.player.id] = (yellow, red)
+        return cards
+
+    async def getMatchCards(self, asession, matchInfo):
+        """
+        Get the cards of each player of a match from its incidents
 
         Parameters:
-            date: past datetime obj
+            - matchInfo: football match info
 
         Returns:
-            pastMatchesStats (dict of dict): a dictionary containing match ID as key, with dictionary containing 
-            player statistic and overall match statistic as value
+            - cards: dict of player id -> (yellow cards, red cards), None if the request failed
         """
-        date = date.strftime("%Y-%m-%d")
-        requestURL      = self.SCHEDULEMATCHURL + date
-        response = self.session.get(requestURL)
-        dictData = response.json()
-        
+        try:
+            response = await self.getMatchIncidents(asession, matchInfo["id"], finished=True)
+            return self.parseMatchCards(response.content)
+
+        except Exception as e:
+            self.logger.error(f"failed to obtain incidents of match {matchInfo['id']}: {repr(e)}")
+            return None
+
+    async def getMatchStatAndCards(self, asession, matchInfo):
+        """
+        getMatchStat followed by getMatchCards when INCIDENTS_ENABLED and the statistics show
+        a card, so the incidents request overlaps the lineups request still in flight
+
+        Returns:
+            - (match_stats, cards): cards is None when skipped or failed
+        """
+        matchStats = await self.getMatchStat(asession, matchInfo)
+        if matchStats and scrape_config.INCIDENTS_ENABLED and self.hasCards(matchStats):
+            return matchStats, await self.getMatchCards(asession, matchInfo)
+        return matchStats, None
+
+    async def getMatchCompleteStat(self, asession, matchInfo, batch=None):
+        """
+        Fetch the lineups and the statistics of one match together and merge them
+
+        Parameters:
+            - matchInfo: football match info
+            - batch (or None): PlayerStatsBatch collecting the players of the run
+
+        Returns:
+            - match_stats (MatchStats): match info and match stats with the player stats in player_stats,
+            None if either part failed
+        """
+        if self.lean:
+            return await self.getLeanMatchCompleteStat(asession, matchInfo, batch)
+
+        playerStats, (matchStats, cards) = await asyncio.gather(self.getPlayerMatchStat(asession, matchInfo, batch),
+                                                                self.getMatchStatAndCards(asession, matchInfo))
+
+        if matchStats and playerStats:
+            if cards:
+                playerStats.setCards(cards)
+            matchStats.player_stats = playerStats
+            return matchStats
+
+        return None
+
+
+    async def skipKnownEvents(self, pastMatchInfo):
+        """
+        Returns:
+            - pastMatchInfo without the matches already stored in the db, unchanged without knownEvents
+        """
+        if self.knownEvents is None:
+            return pastMatchInfo
+        return await asyncio.to_thread(self.knownEvents.skipStored, pastMatchInfo)
+
+    async def iterMatchCompleteStat(self, pastMatchInfo, asession, flights=None, batch=None, skipKnown=True):
+        """
+        Async generator of overall match stat and player stat. Every match is its own
+        pipeline and is yielded as soon as both of its parts arrived, so callers can
+        consume completed matches while the rest are still being fetched
+
+        Parameters:
+            - pastMatchInfo (list of dict): list of dict containing information such as
+            customId, id, and slug. All of these are IDs of each match
+            - flights (or None): SingleFlight of the run, shares the fetch of an event ID
+            between repeated and concurrent requests
+            - batch (or None): PlayerStatsBatch collecting the players of the run
+            - skipKnown: leave out the matches already stored in the db, see skipKnownEvents
+
+        Yields:
+            - match_stats (MatchStats): match info, match stats, and player stats of a completed
+            match, matches that failed are skipped
+        """
+        if batch is None:
+            batch = PlayerStatsBatch()
+        if skipKnown:
+            pastMatchInfo = await self.skipKnownEvents(pastMatchInfo)
+
+        if flights is None:
+            pending = {asyncio.ensure_future(self.getMatchCompleteStat(asession, match, batch)) for match in pastMatchInfo}
+        else:
+            pending = {
+                asyncio.ensure_future(flights.do(match["id"], lambda match=match: self.getMatchCompleteStat(asession, match, batch)))
+                for match in flights.unique(pastMatchInfo, key=lambda match: match["id"])
+            }
+        progress = async_tqdm(total=len(pending), desc="getting complete stats for each match")
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    progress.update(1)
+                    matchStats = task.result()
+                    if matchStats:
+                        yield matchStats
+
+        finally:
+            # consumer stopped early, do not leave requests running
+            for task in pending:
+                task.cancel()
+            progress.close()
+
+
+    async def getAllMatchCompleteStat(self, pastMatchInfo, asession, flights=None, batch=None):
+        """
+        Get overall match stat and player stat
+
+        Parameters:
+            - pastMatchInfo (list of dict): list of dict containing information such as
+            customId, id, and slug. All of these are IDs of each match
+            - flights (or None): SingleFlight of the run, see iterMatchCompleteStat
+            - batch (or None): PlayerStatsBatch collecting the players of the run
+
+        Returns:
+            - updated_past_match_stat (list of MatchStats): match info, match stats, and
+            player stats in completion order
+        """
+        return [matchStats async for matchStats in self.iterMatchCompleteStat(pastMatchInfo, asession, flights, batch)]
+
         
-       
+
+    async def getPastDateMatches(self, asession, date):
+        """
+        Get the finished matches with player stats of a past date. The day page and the
+        inverse page are requested together under the shared rate limiter
+
+        Parameters:
+            - asession: a AsyncHTMLSession
+            - date: "%Y-%m-%d" date string
+
+        Returns:
+            - pastMatchInfo: list of match info dict, see findMatchWithPlayerStat. Raise
+            HTTPException when a page cannot be fetched
+        """
+        requestURL = self.SCHEDULEMATCHURL + date
+        responses = await asyncio.gather(self.fetchURL(asession, requestURL), self.fetchURL(asession, requestURL + "/inverse"))
+
         pastMatchInfo = []
+        seen = set()
+        for response in responses:
+            if response.status_code != 200:
+                raise HTTPException(f"failed to obtain matches of {date}: {response.status_code}")
+            self.filterMatchesWithPlayerStat(date, payloads.decodeEventsPage(response.content, self.logger), pastMatchInfo, seen)
 
-        self.filterMatchesWithPlayerStat(date,dictData,pastMatchInfo)
+        return pastMatchInfo
 
-        requestURL = requestURL + "/inverse"
-        response = self.session.get(requestURL)
-        moreData = response.json()
-        self.filterMatchesWithPlayerStat(date,moreData,pastMatchInfo)
+    async def iterPastDateMatchStat(self, asession, date, flights=None, batch=None):
+        """
+        Async generator of the complete stats of the finished matches of a past date,
+        see getPastDateMatches and iterMatchCompleteStat
 
-        print(f"number Of Matches = {len(pastMatchInfo)}")
+        Parameters:
+            - asession: a AsyncHTMLSession
+            - date: past datetime obj or "%Y-%m-%d" date string
+            - flights (or None): SingleFlight of the run
+            - batch (or None): PlayerStatsBatch collecting the players of the run
 
-        pastMatchesStats = asyncio.run(self.getAllMatchCompleteStat(pastMatchInfo))
+        Yields:
+            - match_stats (MatchStats): match info, match stats, and player stats of a completed match
+        """
+        if isinstance(date, datetime):
+            date = date.strftime("%Y-%m-%d")
 
-        return pastMatchesStats
+        pastMatchInfo = await self.getPastDateMatches(asession, date)
+        async for matchStats in self.iterMatchCompleteStat(pastMatchInfo, asession, flights, batch):
+            yield matchStats
 
+    async def getPastDateMatchStat(self, asession, date, flights=None, batch=None):
+        """
+        Get finished matches complete stats for a particular past date
 
+        Parameters:
+            - asession: a AsyncHTMLSession
+            - date: past datetime obj or "%Y-%m-%d" date string
+            - flights (or None): SingleFlight of the run
+            - batch (or None): PlayerStatsBatch collecting the players of the run
+
+        Returns:
+            - pastMatchesStats (list of MatchStats): match info, match stats, and player stats
+        """
+        return [matchStats async for matchStats in self.iterPastDateMatchStat(asession, date, flights, batch)]
 
-    def filterMatchesWithPlayerStat(self, date, matchJSON:dict, pastMatchInfo:list):
-        for match in matchJSON['events']:
-            dateStr = strftime('%Y-%m-%d', localtime(match["startTimestamp"]))
-            if dateStr == date:
-                if "status" in match.keys():
-                    self.findMatchWithPlayerStat(match,pastMatchInfo)
+    def filterMatchesWithPlayerStat(self, date, matchJSON:payloads.EventsPage, pastMatchInfo:list, seen=None):
+        """
+        Append the finished matches with player stats of matchJSON starting on the local day date
+
+        Parameters:
+            - date: "%Y-%m-%d" date string
+            - matchJSON: payloads.EventsPage of the date
+            - pastMatchInfo: list the match infos are appended to
+            - seen (or None): set of the event ids already appended, an event on several pages is kept once
+        """
+        start, end = self.dayBounds(date)
+        for match in matchJSON.events:
+            if start <= match.startTimestamp < end and match.status is not None:
+                if seen is not None:
+                    if match.id in seen:
+                        continue
+                    seen.add(match.id)
+                self.findMatchWithPlayerStat(match, pastMatchInfo)
 
 
     def closeSession(self):
         """
-        Close the browser
+        Close the browser and the response cache
         """
         self.session.close()
+        if self.cache:
+            print(f"response cache: {self.cacheSummary()}")
+        print(f"rate limiter: {self.limiter.stats()}")
+        print(f"retries: {self.retryPolicy.stats()}, circuit breaker: {self.breaker.stats()}")
+        if self.lean:
+            print(f"lean mode: {self.leanCounts}")
+        if self.knownEvents:
+            print(f"known events: {self.knownEvents.stats()}")
+        print(f"requests per endpoint family:\n{self.metrics.summary()}")
 
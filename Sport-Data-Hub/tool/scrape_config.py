@@ -12,7 +12,7 @@ USER_AGENTS = [
     "Mozilla/5.0 (Linux; Android 12; Pixel 7 Pro) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Mobile Safari/537.36"
 ]
 
-DELAY_RANGE = (2, 20)  # Randomized delay range in seconds
+DELAY_RANGE = (0, 2)  # Randomized humanizing jitter in seconds, added after the rate limiter grants a request
 
 # Mimic common headers seen in real browser requests
 HEADERS = {
@@ -32,6 +32,124 @@ HEADERS = {
     "TE": "trailers"
 }
 
-QUEUE_SLOTS = 3
+QUEUE_SLOTS = 3  # initial number of concurrent requests, adapted by the rate limiter
 
-NUMOFPASTMATCHES = 10
\ No newline at end of file
+# Rate limiter shared by every scraper request
+#--------------------------------------------------------
+REQUEST_RATE = 0.5              # initial requests per second
+REQUEST_BURST = 3               # token bucket size
+MIN_REQUEST_RATE = 0.05
+MAX_REQUEST_RATE = 4.0
+REQUEST_RATE_INCREASE = 0.05    # added to the rate after every window of healthy responses
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 10
+BACKOFF_FACTOR = 0.5            # multiplicative decrease of rate and concurrency
+BACKOFF_STATUSES = (403, 429)   # along with every 5xx and connection errors
+BACKOFF_COOLDOWN = 30           # seconds without new requests after a backoff
+
+# Global request budget shared by every scraper process, see tool/request_budget.py
+# "local" = none, "file" = processes of this machine, "redis" = workers on several machines
+REQUEST_BUDGET_BACKEND = "local"
+REQUEST_BUDGET_RATE = 2.0       # requests per second for all workers together
+REQUEST_BUDGET_BURST = 5
+REQUEST_BUDGET_PATH = "request_budget.state"
+REQUEST_BUDGET_REDIS_URL = "redis://localhost:6379/0"
+REQUEST_BUDGET_KEY = "sport-data-hub:request-budget"
+
+# Retries and circuit breaker
+#--------------------------------------------------------
+REQUEST_TIMEOUT = 20            # seconds before a single request is abandoned
+RETRY_BASE_DELAY = 1.0          # first retry waits up to this long, doubled on every attempt
+RETRY_MAX_DELAY = 60.0          # upper bound of a single retry wait
+# status class -> retries allowed, exact codes win over their class
+# "error" covers connection errors and timeouts, classes missing here are never retried
+RETRY_RULES = {
+    "error": 4,
+    "429": 5,
+    "403": 2,
+    "5xx": 3,
+}
+CIRCUIT_THRESHOLD = 8           # consecutive blocking responses from a host that open its circuit
+CIRCUIT_OPEN_SECONDS = 300      # requests to an open host wait this long before a probe is let through
+
+NUMOFPASTMATCHES = 10
+TEAM_WATERMARKS = True  # team histories are only paged until the team's newest stored match
+
+# Tracing, nested spans per pipeline stage and per upstream request, see tool.tracing
+#--------------------------------------------------------
+TRACE_ENABLED = False
+TRACE_PATH = "scrape_trace.json"    # Chrome trace of the last run, open it in chrome://tracing or ui.perfetto.dev
+TRACE_OTLP_ENDPOINT = None          # e.g. "http://localhost:4318/v1/traces", needs opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http
+
+# Player cards from event/{id}/incidents, fetched once the statistics show a card
+#--------------------------------------------------------
+INCIDENTS_ENABLED = True
+
+# Season discovery, past matches listed per unique tournament season instead of per team
+#--------------------------------------------------------
+SEASON_PAGE_WINDOW = 2          # season event pages requested at once, pages past the last one are wasted
+
+# Identity cache, db ids of teams and players shared by the scrapes of a process
+#--------------------------------------------------------
+IDENTITY_CACHE_TEAMS = 20000        # teams (and countries) kept, least recently used evicted first
+IDENTITY_CACHE_PLAYERS = 200000     # players kept
+IDENTITY_CACHE_WARM = "recent"      # filled from the db on first use: "recent" (most recently active), "all" or None
+
+# Known events, discovered events already stored in the db are not fetched again
+#--------------------------------------------------------
+KNOWN_EVENTS_FILTER = True
+KNOWN_EVENTS_BLOOM = False              # Bloom filter of the stored event ids built at startup, only its hits are queried
+KNOWN_EVENTS_BLOOM_CAPACITY = 1000000   # stored events the filter is sized for
+KNOWN_EVENTS_BLOOM_ERROR_RATE = 0.01    # share of new events still queried at capacity
+
+# Db writes
+#--------------------------------------------------------
+DB_WRITE_BATCH = 200            # matches (and their player stats) inserted and committed together
+
+# Backfill of past dates, see tool.backfill
+#--------------------------------------------------------
+BACKFILL_CONCURRENT_DATES = 4   # dates scraped at once, their requests share the rate limiter
+BACKFILL_WRITE_BATCH = 50       # matches written to the db together
+
+# Lean mode, team totals summed from the lineups instead of one more request per match
+#--------------------------------------------------------
+LEAN_MODE = False
+LEAN_STATISTICS_FIELDS = ()     # fields the lineups and incidents did not give ("corners", cards without incidents) still fetched from event statistics, others are stored as NULL
+LEAN_MIN_SIDE_MINUTES = 900     # a side's players adding up to fewer minutes is an incomplete lineup, its statistics are fetched
+
+# Scheduled matches
+#--------------------------------------------------------
+SCHEDULE_DAYS = 8               # day offsets 0-7 accepted by the schedule endpoint
+SCHEDULE_PREFETCH = True        # fetch the whole window concurrently, later days are then served from the cache
+
+# Deadline scheduling, soonest fixtures first and shallower histories when time runs out
+#--------------------------------------------------------
+SCRAPE_DEADLINE = None          # seconds a scheduled day may take, None scrapes everything through the job queue
+SCHEDULER_MIN_DEPTH = 3         # past matches per team never dropped below
+SCHEDULER_ACTIVE_FIXTURES = 2   # fixtures scraped at once, the rest wait in kickoff order
+
+# Job queue, progress of a scrape run is persisted so a rerun resumes it
+#--------------------------------------------------------
+JOB_QUEUE_ENABLED = True
+JOB_QUEUE_PATH = "scrape_jobs.sqlite3"
+JOB_LEASE_SECONDS = 15 * 60     # a claimed job is given to another worker after this long
+JOB_MAX_ATTEMPTS = 3            # attempts before a job is marked failed
+JOB_BATCH_SIZE = 50             # jobs a worker claims at once
+JOB_POLL_SECONDS = 0.25        # wait between checks while other workers hold the remaining jobs
+SCRAPE_WORKERS = 1              # worker processes fetching the jobs of a run, this process writes to the db
+
+# Response cache
+#--------------------------------------------------------
+CACHE_ENABLED = True
+CACHE_PATH = "scrape_cache.sqlite3"
+CACHE_MAX_BYTES = 512 * 1024 * 1024  # compressed size before least recently used entries are evicted
+
+# (url regex, ttl when the event is finished, ttl otherwise) in seconds
+# None = never expires, 0 = never cached. First matching rule wins.
+CACHE_FRESHNESS = [
+    (r"event/\d+/(lineups|statistics|incidents)$", None, 0),   # finished match payloads never change
+    (r"scheduled-events/\d{4}-\d{2}-\d{2}(/inverse)?$", 10 * 60, 10 * 60),
+    (r"team/\d+/events/last/\d+$", 60 * 60, 60 * 60),
+    (r"unique-tournament/\d+/season/\d+/events/last/\d+$", 60 * 60, 60 * 60),
+    (r"player/\d+$", 24 * 60 * 60, 24 * 60 * 60),
+]
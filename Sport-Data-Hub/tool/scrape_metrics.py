@@ -0,0 +1,167 @@
+import re
+import threading
+
+# endpoint family -> url regex, first match wins
+FAMILIES = {
+    "scheduled-events": re.compile(r"scheduled-events/[\d-]+(/inverse)?$"),
+    "team events": re.compile(r"team/\d+/events/last/\d+$"),
+    "season events": re.compile(r"unique-tournament/\d+/season/\d+/events/last/\d+$"),
+    "event lineups": re.compile(r"event/\d+/lineups$"),
+    "event statistics": re.compile(r"event/\d+/statistics$"),
+    "event incidents": re.compile(r"event/\d+/incidents$"),
+    "player": re.compile(r"player/\d+$"),
+}
+OTHER = "other"
+
+# upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+
+class FamilyMetrics():
+    """
+    Counters of one endpoint family
+    """
+    __slots__ = ("statuses", "buckets", "latencySum", "bytes", "delay", "wait", "cacheHits")
+
+    def __init__(self) -> None:
+        self.statuses   = {}    # status code (or "error") -> requests
+        self.buckets    = [0] * (len(LATENCY_BUCKETS) + 1)  # last bucket is +Inf, not cumulative
+        self.latencySum = 0.0   # seconds on the network
+        self.bytes      = 0     # response bodies
+        self.delay      = 0.0   # seconds slept by the humanizing delay
+        self.wait       = 0.0   # seconds waited for the circuit breaker and the rate limiter
+        self.cacheHits  = 0
+
+    @property
+    def requests(self):
+        return sum(self.statuses.values())
+
+    def quantile(self, q):
+        """
+        Returns:
+            - upper bound of the latency bucket holding the q quantile, None without requests
+        """
+        total = sum(self.buckets)
+        if not total:
+            return None
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), self.buckets):
+            seen += count
+            if seen >= q * total:
+                return bound
+
+
+class ScrapeMetrics():
+    """
+    Per endpoint family metrics of the requests made by a Scraper: requests by status,
+    a latency histogram, bytes received, time in humanizing delays, in rate limiting
+    and on the network, and cache hits. Read them as Prometheus text or as an end of
+    run summary
+    """
+    def __init__(self) -> None:
+        self.lock       = threading.Lock()
+        self.families   = {}    # family -> FamilyMetrics
+
+    def family(self, url):
+        for name, pattern in FAMILIES.items():
+            if pattern.search(url):
+                return name
+        return OTHER
+
+    def metricsFor(self, url):
+        family = self.family(url)
+        metrics = self.families.get(family)
+        if metrics is None:
+            metrics = self.families[family] = FamilyMetrics()
+        return metrics
+
+    def recordRequest(self, url, statusCode, latency, size):
+        """
+        Record one network request
+
+        Parameters:
+            - url: request url
+            - statusCode: response status code, None when the request raised
+            - latency: seconds on the network
+            - size: bytes of the response body
+        """
+        status = "error" if statusCode is None else str(statusCode)
+        i = 0
+        while i < len(LATENCY_BUCKETS) and latency > LATENCY_BUCKETS[i]:
+            i += 1
+
+        with self.lock:
+            metrics = self.metricsFor(url)
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+            metrics.buckets[i] += 1
+            metrics.latencySum += latency
+            metrics.bytes += size
+
+    def recordDelay(self, url, seconds):
+        with self.lock:
+            self.metricsFor(url).delay += seconds
+
+    def recordWait(self, url, seconds):
+        with self.lock:
+            self.metricsFor(url).wait += seconds
+
+    def recordCacheHit(self, url):
+        with self.lock:
+            self.metricsFor(url).cacheHits += 1
+
+    def prometheus(self):
+        """
+        Returns:
+            - the metrics in the Prometheus text exposition format
+        """
+        lines = [
+            "# HELP scraper_requests_total Upstream requests by endpoint family and status.",
+            "# TYPE scraper_requests_total counter",
+        ]
+        with self.lock:
+            families = sorted(self.families.items())
+            for family, metrics in families:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f'scraper_requests_total{{family="{family}",status="{status}"}} {count}')
+
+            lines += [
+                "# HELP scraper_request_duration_seconds Network time of upstream requests.",
+                "# TYPE scraper_request_duration_seconds histogram",
+            ]
+            for family, metrics in families:
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, metrics.buckets):
+                    cumulative += count
+                    lines.append(f'scraper_request_duration_seconds_bucket{{family="{family}",le="{bound}"}} {cumulative}')
+                lines.append(f'scraper_request_duration_seconds_bucket{{family="{family}",le="+Inf"}} {metrics.requests}')
+                lines.append(f'scraper_request_duration_seconds_sum{{family="{family}"}} {metrics.latencySum}')
+                lines.append(f'scraper_request_duration_seconds_count{{family="{family}"}} {metrics.requests}')
+
+            for name, help, attribute in (
+                ("scraper_response_bytes_total", "Bytes of upstream response bodies.", "bytes"),
+                ("scraper_humanize_delay_seconds_total", "Seconds slept by the humanizing delay (DELAY_RANGE).", "delay"),
+                ("scraper_limiter_wait_seconds_total", "Seconds waited for the circuit breaker and the rate limiter.", "wait"),
+                ("scraper_cache_hits_total", "Requests answered by the response cache.", "cacheHits"),
+            ):
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} counter"]
+                for family, metrics in families:
+                    lines.append(f'{name}{{family="{family}"}} {getattr(metrics, attribute)}')
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        Returns:
+            - one line per endpoint family: requests by status, cache hits, bytes, latency and
+            where the time went
+        """
+        lines = [f"{'family':<18}{'requests':>9}{'cached':>8}{'MB':>8}{'mean ms':>9}{'p95 ms':>8}{'net s':>8}{'delay s':>9}{'wait s':>8}  statuses"]
+        with self.lock:
+            for family, metrics in sorted(self.families.items()):
+                requests = metrics.requests
+                mean = metrics.latencySum / requests * 1000 if requests else 0
+                p95 = metrics.quantile(0.95)
+                p95 = "-" if p95 is None else ">20000" if p95 == float("inf") else f"{p95 * 1000:.0f}"
+                lines.append(f"{family:<18}{requests:>9}{metrics.cacheHits:>8}{metrics.bytes / 1e6:>8.1f}{mean:>9.0f}{p95:>8}"
+                             f"{metrics.latencySum:>8.1f}{metrics.delay:>9.1f}{metrics.wait:>8.1f}  {metrics.statuses}")
+        return "\n".join(lines)
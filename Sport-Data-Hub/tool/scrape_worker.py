@@ -0,0 +1,250 @@
+"""
+Fetch side of a job queue scrape run. Workers only do I/O: they drain the team page and
+event jobs of a run and store the raw payloads in the queue. Parsing and the db writes
+are left to the single writer (getScheduledMatchData) once every worker finished, so
+several worker processes can share a run without writing to the db. Workers only read
+it to leave out the events already stored, see KNOWN_EVENTS_FILTER.
+"""
+import asyncio
+import logging
+import multiprocessing
+from requests_html import AsyncHTMLSession
+from tool import scrape_config, job_queue, DBHelper
+from tool import scrap_tool as st
+from tool.job_queue import JobQueue
+from tool.known_events import KnownEvents
+from tool.player_stats_batch import PlayerStatsBatch
+
+
+async def drainTeamPages(scraper:st.Scraper, asession, queue:JobQueue, run, shard=None):
+    """
+    Fetch the past matches of every queued team, see Scraper.getPastMatches
+    """
+    async def fetchTeamPage(job):
+        # a failed page fails the job instead of storing the matches of the pages before it
+        teamInfo = job.payload
+        pastMatchInfo = await scraper.getPastMatches(asession, teamInfo["team_id"], teamInfo["team"], None, 0, teamInfo["watermark"],
+                                                     raiseErrors=True)
+        return pastMatchInfo[teamInfo["team"]]
+
+    await queue.drain(run, job_queue.TEAM_PAGE, fetchTeamPage, scrape_config.JOB_BATCH_SIZE, scrape_config.JOB_POLL_SECONDS, shard)
+
+
+def queueEventJobs(queue:JobQueue, run, lean=False, knownEvents=None):
+    """
+    Queue one statistics and one lineup job per event found in the team pages, an event
+    shared by several teams' histories is queued once
+
+    Parameters:
+        - lean: only queue the lineups, see queueLeanStatistics
+        - knownEvents (or None): KnownEvents, the events already stored in the db are not queued
+
+    Returns:
+        - matchInfos: dict of event id -> match info
+    """
+    matchInfos = {}
+    for pastMatches in queue.results(run, job_queue.TEAM_PAGE).values():
+        for matchInfo in pastMatches:
+            matchInfos.setdefault(matchInfo["id"], matchInfo)
+    if knownEvents is not None:
+        matchInfos = {matchInfo["id"]: matchInfo for matchInfo in knownEvents.skipStored(list(matchInfos.values()))}
+
+    if not lean:
+        queue.enqueue(run, job_queue.EVENT_STATS, matchInfos.items())
+    queue.enqueue(run, job_queue.EVENT_LINEUP, matchInfos.items())
+    return matchInfos
+
+
+def queueLeanStatistics(scraper:st.Scraper, queue:JobQueue, run, matchInfos):
+    """
+    Lean mode: queue a statistics job for the events whose fetched lineups cannot give
+    the team totals, see Scraper.needsStatistics
+    """
+    batch = PlayerStatsBatch()
+    incidents = queue.results(run, job_queue.EVENT_INCIDENTS, decode=False)
+    needed = []
+    for eventID, content in queue.results(run, job_queue.EVENT_LINEUP, decode=False).items():
+        try:
+            cards = scraper.parseMatchCards(incidents[eventID]) if eventID in incidents else None
+            matchStats, problems = scraper.deriveMatchStat(matchInfos[eventID], scraper.parsePlayerMatchStat(matchInfos[eventID], content, batch), cards)
+        except Exception:
+            continue    # the match is dropped when its lineups cannot be parsed
+
+        if scraper.needsStatistics(problems, matchStats):
+            needed.append((eventID, matchInfos[eventID]))
+
+    queue.enqueue(run, job_queue.EVENT_STATS, needed)
+
+
+def queueIncidents(scraper:st.Scraper, queue:JobQueue, run, matchInfos):
+    """
+    Queue an incidents job for the events whose fetched statistics show a card, or for
+    every event in lean mode where the statistics are mostly not fetched
+    """
+    if not scrape_config.INCIDENTS_ENABLED:
+        return
+
+    if scraper.lean:
+        queue.enqueue(run, job_queue.EVENT_INCIDENTS, matchInfos.items())
+        return
+
+    needed = []
+    for eventID, content in queue.results(run, job_queue.EVENT_STATS, decode=False).items():
+        try:
+            matchStats = scraper.parseMatchStat(matchInfos[eventID], content)
+        except Exception:
+            continue    # the match is dropped when its statistics cannot be parsed
+
+        if matchStats and scraper.hasCards(matchStats):
+            needed.append((eventID, matchInfos[eventID]))
+
+    queue.enqueue(run, job_queue.EVENT_INCIDENTS, needed)
+
+
+async def drainEventJobs(scraper:st.Scraper, asession, queue:JobQueue, run, matchInfos, shard=None):
+    """
+    Fetch the statistics, the lineups and the incidents of every queued event, the raw
+    bodies are the job results. The incidents are queued once the statistics are fetched
+    (see queueIncidents) while the lineups are still being fetched. In lean mode the
+    statistics are only fetched for the events that need them
+
+    Parameters:
+        - matchInfos: dict of event id -> match info, see queueEventJobs
+    """
+    async def fetchStatistics(job):
+        return (await scraper.getMatchStatistics(asession, job.key, finished=True)).content
+
+    async def fetchLineup(job):
+        return (await scraper.getMatchLineup(asession, job.key, finished=True)).content
+
+    async def fetchIncidents(job):
+        return (await scraper.getMatchIncidents(asession, job.key, finished=True)).content
+
+    def drain(kind, handler):
+        return queue.drain(run, kind, handler, scrape_config.JOB_BATCH_SIZE, scrape_config.JOB_POLL_SECONDS, shard)
+
+    if scraper.lean:
+        # the statistics jobs depend on the lineups
+        queueIncidents(scraper, queue, run, matchInfos)
+        await asyncio.gather(drain(job_queue.EVENT_LINEUP, fetchLineup), drain(job_queue.EVENT_INCIDENTS, fetchIncidents))
+        queueLeanStatistics(scraper, queue, run, matchInfos)
+        await drain(job_queue.EVENT_STATS, fetchStatistics)
+        return
+
+    async def drainStatisticsAndIncidents():
+        await drain(job_queue.EVENT_STATS, fetchStatistics)
+        queueIncidents(scraper, queue, run, matchInfos)
+        await drain(job_queue.EVENT_INCIDENTS, fetchIncidents)
+
+    await asyncio.gather(drainStatisticsAndIncidents(), drain(job_queue.EVENT_LINEUP, fetchLineup))
+
+
+async def scrapeRun(scraper:st.Scraper, queue:JobQueue, run, shard=None):
+    """
+    Drain every fetch job of a run: team pages first, then the events they found
+
+    Returns:
+        - matchInfos: dict of event id -> match info
+    """
+    asession = AsyncHTMLSession()
+    await drainTeamPages(scraper, asession, queue, run, shard)
+    matchInfos = queueEventJobs(queue, run, scraper.lean, scraper.knownEvents)
+    await drainEventJobs(scraper, asession, queue, run, matchInfos, shard)
+    await asession.close()
+    return matchInfos
+
+
+def collectMatchStats(scraper:st.Scraper, queue:JobQueue, run, matchInfos, batch, logger:logging.Logger):
+    """
+    Parse the stored payloads of the events whose statistics and lineups were both fetched,
+    with the players' cards of the fetched incidents
+
+    Parameters:
+        - matchInfos: dict of event id -> match info, see queueEventJobs
+        - batch: PlayerStatsBatch collecting the players of the run
+
+    Returns:
+        - pastMatchesStats: (list of MatchStats): match info, match stats, and player stats
+    """
+    statistics = queue.results(run, job_queue.EVENT_STATS, decode=False)
+    lineups = queue.results(run, job_queue.EVENT_LINEUP, decode=False)
+    incidents = queue.results(run, job_queue.EVENT_INCIDENTS, decode=False)
+
+    pastMatchesStats = []
+    for eventID, matchInfo in matchInfos.items():
+        if eventID not in lineups or (eventID not in statistics and not scraper.lean):
+            continue
+
+        try:
+            cards = scraper.parseMatchCards(incidents[eventID]) if eventID in incidents else None
+            if eventID in statistics:
+                matchStats = scraper.parseMatchStat(matchInfo, statistics[eventID])
+                if not matchStats:
+                    continue
+                matchStats.player_stats = scraper.parsePlayerMatchStat(matchInfo, lineups[eventID], batch)
+                if cards is not None:
+                    matchStats.player_stats.setCards(cards)
+            else:
+                # lean mode, the lineups (and incidents) were enough unless a statistics job was needed and failed
+                playerStats = scraper.parsePlayerMatchStat(matchInfo, lineups[eventID], batch)
+                matchStats, problems = scraper.deriveMatchStat(matchInfo, playerStats, cards)
+                if scraper.needsStatistics(problems, matchStats):
+                    continue
+                matchStats.player_stats = playerStats
+
+            pastMatchesStats.append(matchStats)
+        except Exception as e:
+            logger.error(f"failed to parse match {eventID} of {run}, removing it: {repr(e)}")
+
+    return pastMatchesStats
+
+
+def workerMain(run, shard=None, apiURL=None, overrides=None):
+    """
+    Entry point of a worker process
+
+    Parameters:
+        - run: job queue run name
+        - shard (or None): (index, count), only fetch that shard of the team and event ids.
+        Workers sharing a queue file do not need it, they claim jobs from each other
+        - apiURL (or None): upstream api url, eg a local fake upstream
+        - overrides (or None): dict of scrape_config attributes to set in the worker
+    """
+    for name, value in (overrides or {}).items():
+        setattr(scrape_config, name, value)
+
+    logger = logging.getLogger(__name__)
+    scraper = st.Scraper(logger)
+    if apiURL:
+        scraper.setAPIURL(apiURL)
+    # every worker queues the event jobs it finds, the stored events are left out there.
+    # No Bloom filter, each worker would read every stored event id to build its own
+    if scrape_config.KNOWN_EVENTS_FILTER:
+        scraper.knownEvents = KnownEvents(DBHelper.DBHelper(logger), logger)
+
+    queue = JobQueue.fromConfig(scrape_config, logger)
+    asyncio.run(scrapeRun(scraper, queue, run, shard))
+    queue.close()
+    scraper.session.close()
+
+
+def runWorkers(run, workers, apiURL=None, overrides=None):
+    """
+    Drain the fetch jobs of run with several worker processes sharing the job queue and
+    the global request budget (REQUEST_BUDGET_BACKEND), then wait for all of them
+
+    Parameters:
+        - run: job queue run name
+        - workers: number of worker processes
+        - apiURL, overrides: see workerMain
+    """
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=workerMain, args=(run, None, apiURL, overrides)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    failed = [process.exitcode for process in processes if process.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"{len(failed)} scrape workers of {run} failed, exit codes {failed}")
@@ -0,0 +1,76 @@
+import asyncio
+
+
+class SingleFlight():
+    """
+    Share one fetch between every request for the same key during a scrape run.
+    The first request for a key starts the fetch, concurrent and later requests
+    for that key await the same result instead of fetching it again.
+    """
+    def __init__(self) -> None:
+        self.flights    = {}    # key -> task of the fetch
+        self.requests   = 0     # number of times a key was asked for
+        self.shared     = 0     # requests answered by an existing fetch
+
+    async def do(self, key, fetch):
+        """
+        Run fetch() once per key and share its result
+
+        Parameters:
+            - key: identifier of the fetched item, eg the event ID
+            - fetch: function returning the coroutine that fetches the item
+
+        Returns:
+            - the result of the (shared) fetch
+        """
+        self.requests += 1
+        task = self.flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self.flights[key] = task
+        else:
+            self.shared += 1
+
+        # shield so a cancelled waiter does not cancel the fetch other waiters share
+        return await asyncio.shield(task)
+
+    def unique(self, items, key):
+        """
+        Drop repeated items before any fetch is scheduled, repeats count as shared requests
+
+        Parameters:
+            - items: list of items to fetch
+            - key: function returning the identifier of an item
+
+        Returns:
+            - list of the first occurrence of each identifier, in the original order
+        """
+        seen = set()
+        uniqueItems = []
+        for item in items:
+            itemKey = key(item)
+            if itemKey in seen:
+                self.requests += 1
+                self.shared += 1
+                continue
+            seen.add(itemKey)
+            uniqueItems.append(item)
+        return uniqueItems
+
+    def cancel(self):
+        """
+        Cancel every fetch still running, eg when the run hit its deadline
+        """
+        for task in self.flights.values():
+            task.cancel()
+
+    def summary(self):
+        """
+        Returns:
+            - dict with the number of requests, actual fetches and duplicate fetches avoided
+        """
+        return {
+            "requested": self.requests,
+            "fetched": len(self.flights),
+            "avoided": self.shared,
+        }
@@ -0,0 +1,219 @@
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+
+# span currently open in this thread / asyncio task, parent of the spans opened inside it
+currentSpan = contextvars.ContextVar("currentSpan", default=None)
+
+
+class NoSpan():
+    """
+    Span handed out while tracing is off, does nothing
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key, value):
+        pass
+
+
+NOSPAN = NoSpan()
+
+
+class Span():
+    """
+    One timed stage or request, nested under the span open when it started
+    """
+    __slots__ = ("tracer", "name", "attributes", "id", "parent", "lane", "start", "end", "error", "token")
+
+    def __init__(self, tracer, name, attributes) -> None:
+        self.tracer     = tracer
+        self.name       = name
+        self.attributes = attributes
+        self.id         = None
+        self.parent     = None
+        self.lane       = None
+        self.start      = None      # perf_counter_ns
+        self.end        = None
+        self.error      = None
+        self.token      = None
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        parent = currentSpan.get()
+        self.id = next(self.tracer.ids)
+        self.parent = parent.id if parent is not None else None
+        self.lane = self.tracer.lane()
+        self.token = currentSpan.set(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, excType, exc, traceback):
+        self.end = time.perf_counter_ns()
+        currentSpan.reset(self.token)
+        if exc is not None:
+            self.error = repr(exc)
+        self.tracer.spans.append(self)
+        return False
+
+
+class Tracer():
+    """
+    Span based tracing of a scrape. Spans nest through a context variable, so the spans of
+    the requests made by asyncio tasks nest under the stage that started the tasks. Finished
+    spans are kept in memory until flush writes them as a Chrome trace (chrome://tracing,
+    ui.perfetto.dev) and, optionally, exports them to an OpenTelemetry collector over OTLP.
+    While tracing is off, span returns a shared no-op span.
+    """
+    def __init__(self, enabled:bool, path:str, logger, otlpEndpoint=None) -> None:
+        """
+        Parameters:
+            - enabled: record spans, otherwise every span is a no-op
+            - path: Chrome trace json file written by flush
+            - logger: logger used to record export failures
+            - otlpEndpoint (or None): OTLP/HTTP traces endpoint the spans are also exported to,
+            needs the opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http packages
+        """
+        self.enabled        = enabled
+        self.path           = path
+        self.logger         = logger
+        self.otlpEndpoint   = otlpEndpoint
+
+        self.spans      = []
+        self.ids        = itertools.count(1)
+        self.lanes      = {}    # id of an asyncio task or thread -> (lane, name)
+        self.laneIDs    = itertools.count(1)
+        self.lock       = threading.Lock()
+        self.origin     = time.perf_counter_ns()
+        # perf_counter_ns + epochOffset = ns since the epoch, for OpenTelemetry
+        self.epochOffset = time.time_ns() - self.origin
+        self.otelTracer = None
+        self.otelProvider = None
+
+    @classmethod
+    def fromConfig(cls, config, logger):
+        return cls(config.TRACE_ENABLED, config.TRACE_PATH, logger, config.TRACE_OTLP_ENDPOINT)
+
+    def span(self, name, **attributes):
+        """
+        Returns:
+            - context manager timing the block as a span named name with the attributes,
+            NOSPAN while tracing is off
+        """
+        if not self.enabled:
+            return NOSPAN
+        return Span(self, name, attributes)
+
+    def lane(self):
+        """
+        Returns:
+            - trace lane of the running asyncio task, or of the thread outside of a task.
+            Concurrent tasks overlap in time so each one gets its own lane
+        """
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = id(task) if task is not None else threading.get_ident()
+        with self.lock:
+            lane = self.lanes.get(key)
+            if lane is None:
+                name = task.get_name() if task is not None else threading.current_thread().name
+                lane = self.lanes[key] = (next(self.laneIDs), name)
+        return lane[0]
+
+    def chromeTrace(self, spans, lanes):
+        """
+        Returns:
+            - spans in the Chrome trace event format, as complete ("X") events in microseconds
+        """
+        pid = os.getpid()
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": lane, "args": {"name": name}}
+                  for lane, name in lanes.values()]
+        for span in spans:
+            args = dict(span.attributes, span=span.id, parent=span.parent)
+            if span.error is not None:
+                args["error"] = span.error
+            events.append({
+                "name": span.name,
+                "cat": "scrape",
+                "ph": "X",
+                "ts": (span.start - self.origin) / 1000,
+                "dur": (span.end - span.start) / 1000,
+                "pid": pid,
+                "tid": span.lane,
+                "args": args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def exportOpenTelemetry(self, spans):
+        """
+        Replay the finished spans into OpenTelemetry with their recorded times and parents
+        """
+        if self.otelTracer is None:
+            try:
+                from opentelemetry.sdk.resources import Resource
+                from opentelemetry.sdk.trace import TracerProvider
+                from opentelemetry.sdk.trace.export import BatchSpanProcessor
+                from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+            except ImportError:
+                self.logger.error("TRACE_OTLP_ENDPOINT is set but opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http are not installed")
+                self.otlpEndpoint = None
+                return
+            self.otelProvider = TracerProvider(resource=Resource.create({"service.name": "sport-data-hub"}))
+            self.otelProvider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=self.otlpEndpoint)))
+            self.otelTracer = self.otelProvider.get_tracer(__name__)
+
+        from opentelemetry import trace
+        from opentelemetry.trace import Status, StatusCode
+
+        # parents start before their children
+        otelSpans = {}
+        for span in sorted(spans, key=lambda span: span.start):
+            parent = otelSpans.get(span.parent)
+            otelSpans[span.id] = otelSpan = self.otelTracer.start_span(
+                span.name,
+                context=trace.set_span_in_context(parent) if parent is not None else None,
+                start_time=span.start + self.epochOffset,
+                attributes={key: value for key, value in span.attributes.items() if value is not None},
+            )
+            if span.error is not None:
+                otelSpan.set_status(Status(StatusCode.ERROR, span.error))
+        for span in spans:
+            otelSpans[span.id].end(end_time=span.end + self.epochOffset)
+        self.otelProvider.force_flush()
+
+    def flush(self):
+        """
+        Write the spans finished so far to the trace file (replacing the previous one),
+        export them when an OTLP endpoint is set, then forget them
+        """
+        if not self.enabled or not self.spans:
+            return
+        with self.lock:
+            spans, self.spans = self.spans, []
+            lanes, self.lanes = self.lanes, {}
+
+        try:
+            with open(self.path, "w") as fp:
+                json.dump(self.chromeTrace(spans, lanes), fp)
+            print(f"trace of {len(spans)} spans written to {self.path}")
+        except OSError as e:
+            self.logger.error(f"cannot write trace {self.path}: {repr(e)}")
+
+        if self.otlpEndpoint:
+            try:
+                self.exportOpenTelemetry(spans)
+            except Exception as e:
+                self.logger.error(f"cannot export trace to {self.otlpEndpoint}: {repr(e)}")